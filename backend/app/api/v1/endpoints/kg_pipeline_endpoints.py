@@ -8,7 +8,7 @@ from app.crud import crud_kg_pipeline, crud_kg_pipeline_run
 from app.db.session import get_db
 from app.core.deps import get_current_active_user
 from app.db.models import user_models # For type hinting
-from app.services.kg_pipeline_execution_service import run_kg_pipeline_background # Import the service
+from app.services.kg_pipeline_execution_service import dispatch_kg_pipeline_run # Import the service
 
 router = APIRouter()
 
@@ -98,6 +98,9 @@ async def delete_kg_pipeline(
 async def trigger_kg_pipeline_run(
     pipeline_id: int,
     background_tasks: BackgroundTasks, # Inject BackgroundTasks
+    full_refresh: bool = Query(False, description="Ignore incremental watermarks and re-read all source rows"),
+    bulk_export: bool = Query(False, description="Write CSV files and a nebula-importer config instead of inserting into Nebula"),
+    rebuild: bool = Query(False, description="Load a shadow space, rebuild its indexes once, then switch the KG's space alias to it"),
     db: Session = Depends(get_db),
     current_user: user_models.User = Depends(get_current_active_user)
 ):
@@ -109,13 +112,26 @@ async def trigger_kg_pipeline_run(
     
     if db_pipeline.created_by_user_id != current_user.id and current_user.role not in ["admin", "editor"]:
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions to run this pipeline")
+    if bulk_export and rebuild:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="bulk_export and rebuild cannot be combined.")
+    if rebuild:
+        # The rebuilt space only holds this pipeline's data; switching to it would drop the other pipelines' data
+        others = crud_kg_pipeline.get_other_kg_pipelines_for_kg(db, db_pipeline.target_kg_name, pipeline_id)
+        if others:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot rebuild: pipelines {[p.id for p in others]} also write KG {db_pipeline.target_kg_name}."
+            )
 
     # Create a KGPipelineRun entry in the database.
-    run_create_schema = schemas.KGPipelineRunCreate(pipeline_id=pipeline_id, triggered_by_user_id=current_user.id)
+    run_create_schema = schemas.KGPipelineRunCreate(
+        pipeline_id=pipeline_id, triggered_by_user_id=current_user.id, full_refresh=full_refresh,
+        bulk_export=bulk_export, rebuild=rebuild
+    )
     db_run = crud_kg_pipeline_run.create_kg_pipeline_run(db, run_create=run_create_schema)
     
-    # Add the pipeline execution to background tasks
-    background_tasks.add_task(run_kg_pipeline_background, pipeline_id=db_pipeline.id, db_pipeline_run_id=db_run.id)
+    # Run it as a background task, or leave it to the pipeline workers (queue execution mode)
+    dispatch_kg_pipeline_run(background_tasks, pipeline_id=db_pipeline.id, db_pipeline_run_id=db_run.id)
     
     print(f"Queued KGPipelineRun record {db_run.id} for pipeline {pipeline_id} by user {current_user.username}. Status: {db_run.status}")
     
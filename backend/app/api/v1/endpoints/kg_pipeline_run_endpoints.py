@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.api.v1.schemas import kg_pipeline_schemas as schemas
-from app.crud import crud_kg_pipeline_run, crud_kg_pipeline
+from app.crud import crud_kg_pipeline_run, crud_kg_pipeline, crud_kg_pipeline_dead_letter
 from app.db.session import get_db
 from app.core.deps import get_current_active_user
 from app.db.models.user_models import User
+from app.services.kg_pipeline_execution_service import dispatch_kg_pipeline_run
+from app.services.kg_pipeline_event_service import stream_run_events
 
 router = APIRouter()
 
@@ -52,14 +55,14 @@ def read_kg_pipeline_runs(
             db, pipeline_ids=pipeline_ids, skip=skip, limit=limit
         )
 
-@router.get("/{run_id}", response_model=schemas.KGPipelineRun)
+@router.get("/{run_id}", response_model=schemas.KGPipelineRunDetail)
 def read_kg_pipeline_run(
     run_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    获取单个KG Pipeline Run的详细信息。
+    获取单个KG Pipeline Run的详细信息，包括各任务的执行状态和指标。
     """
     run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=run_id)
     if not run:
@@ -85,6 +88,130 @@ def read_kg_pipeline_run(
     
     return run
 
+@router.get("/{run_id}/events")
+async def stream_kg_pipeline_run_events(
+    run_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    以Server-Sent Events推送KG Pipeline Run的实时进度事件（任务开始/进度/吞吐/预计剩余时间/错误）。
+    先发送已有事件，运行结束（run_finished事件）后关闭连接；断线重连时浏览器会带上Last-Event-ID，从该事件之后继续。
+    """
+    run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=run_id)
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pipeline run with ID {run_id} not found"
+        )
+    
+    # 获取关联的pipeline以进行权限检查
+    pipeline = crud_kg_pipeline.get_kg_pipeline(db, pipeline_id=run.pipeline_id)
+    if not pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Associated pipeline not found"
+        )
+    
+    # 权限检查
+    if current_user.role != "admin" and pipeline.created_by_user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to access this pipeline run"
+        )
+    
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        stream_run_events(run_id, after_id=after_id, is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # No proxy buffering of the stream
+    )
+
+@router.get("/{run_id}/dead-letters", response_model=List[schemas.KGPipelineDeadLetter])
+def read_kg_pipeline_run_dead_letters(
+    run_id: int,
+    task_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    获取KG Pipeline Run中被Nebula拒绝写入的行（死信）。
+    可以选择按task_id筛选。
+    """
+    run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=run_id)
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pipeline run with ID {run_id} not found"
+        )
+    
+    # 获取关联的pipeline以进行权限检查
+    pipeline = crud_kg_pipeline.get_kg_pipeline(db, pipeline_id=run.pipeline_id)
+    if not pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Associated pipeline not found"
+        )
+    
+    # 权限检查
+    if current_user.role != "admin" and pipeline.created_by_user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to access this pipeline run"
+        )
+    
+    return crud_kg_pipeline_dead_letter.get_dead_letters_for_run(
+        db, pipeline_run_id=run_id, task_id=task_id, skip=skip, limit=limit
+    )
+
+@router.post("/{run_id}/resume", response_model=schemas.KGPipelineRun, status_code=status.HTTP_202_ACCEPTED)
+async def resume_kg_pipeline_run(
+    run_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    从检查点继续一个失败或已取消的KG Pipeline Run。
+    已成功的任务会被跳过，其余任务从最后一个已写入的检查点继续。
+    """
+    run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=run_id)
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Pipeline run with ID {run_id} not found"
+        )
+    
+    # 获取关联的pipeline以进行权限检查
+    pipeline = crud_kg_pipeline.get_kg_pipeline(db, pipeline_id=run.pipeline_id)
+    if not pipeline:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Associated pipeline not found"
+        )
+    
+    # 权限检查 - 只有admin或pipeline创建者可以继续run
+    if current_user.role != "admin" and pipeline.created_by_user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to resume this pipeline run"
+        )
+    
+    if run.status not in [schemas.KGPipelineRunStatus.FAILED, schemas.KGPipelineRunStatus.CANCELLED]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Only FAILED or CANCELLED runs can be resumed (current status: {run.status})"
+        )
+    
+    run = crud_kg_pipeline_run.reset_kg_pipeline_run_for_resume(db, db_run=run)
+    dispatch_kg_pipeline_run(background_tasks, pipeline_id=pipeline.id, db_pipeline_run_id=run.id)
+    print(f"Resuming KGPipelineRun record {run.id} for pipeline {pipeline.id} by user {current_user.username}.")
+    return run
+
 @router.delete("/{run_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_kg_pipeline_run(
     run_id: int,
@@ -7,9 +7,17 @@ from app.crud import crud_kg_pipeline_task, crud_kg_pipeline
 from app.db.session import get_db
 from app.core.deps import get_current_active_user
 from app.db.models import user_models # For type hinting
+from app.services.kg_pipeline_filter_service import FilterConditionError, compile_filter_conditions
 
 router = APIRouter()
 
+def _validate_filter_conditions(filter_conditions: Optional[str]):
+    # Checked on create/update only, so tasks stored before a rule change can still be read and fixed
+    try:
+        compile_filter_conditions(filter_conditions)
+    except FilterConditionError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid filter_conditions: {e}")
+
 @router.post("/", response_model=schemas.KGPipelineTask, status_code=status.HTTP_201_CREATED)
 async def create_kg_pipeline_task(
     pipeline_id: int, # Path parameter from the parent router
@@ -27,6 +35,7 @@ async def create_kg_pipeline_task(
     # Permission check: User must be owner of pipeline or admin/editor
     if pipeline.created_by_user_id != current_user.id and current_user.role not in ["admin", "editor"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions for this pipeline")
+    _validate_filter_conditions(task_in.filter_conditions)
 
     created_task = crud_kg_pipeline_task.create_kg_pipeline_task(db=db, task=task_in)
     if not created_task: # Should not happen if pipeline check passed, but for safety
@@ -87,6 +96,8 @@ async def update_kg_pipeline_task(
     pipeline = crud_kg_pipeline.get_kg_pipeline(db, pipeline_id=db_task.pipeline_id)
     if not pipeline or (pipeline.created_by_user_id != current_user.id and current_user.role not in ["admin", "editor"]):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    if task_in.filter_conditions is not None:
+        _validate_filter_conditions(task_in.filter_conditions)
 
     return crud_kg_pipeline_task.update_kg_pipeline_task(db=db, db_obj=db_task, obj_in=task_in)
 
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.services import kg_visualization_service
+from app.crud import crud_kg_space_alias
+from app.db.session import get_db
+from app.db.nebula_connector import NebulaBusyError
 from app.api.v1.schemas import kg_visualization_schemas as schemas
 from app.core.config import settings
 
@@ -16,7 +20,8 @@ async def get_node_neighbors(
     node_id: str = Path(..., title="Node ID", description="The ID of the node to get neighbors for (can be string or integer represented as string)."),
     hops: int = Query(1, ge=1, le=5, title="Hops", description="Number of hops to traverse."),
     limit_per_node: int = Query(settings.NEBULA_VIS_DEFAULT_NEIGHBOR_LIMIT, ge=5, le=100, title="Limit per Node", description="Approximate limit of neighbors/paths to fetch around the node."),
-    target_edge_types: Optional[str] = Query(None, title="Target Edge Types", description="Comma-separated list of edge types to focus on (e.g., 'follow,serve'). If None, all edge types are considered.")
+    target_edge_types: Optional[str] = Query(None, title="Target Edge Types", description="Comma-separated list of edge types to focus on (e.g., 'follow,serve'). If None, all edge types are considered."),
+    db: Session = Depends(get_db)
 ):
     """
     Fetches the neighbors of a given node up to a specified number of hops.
@@ -32,13 +37,15 @@ async def get_node_neighbors(
             hops=hops,
             limit_per_node=limit_per_node, # Changed from limit_per_hop to match service param
             target_edge_types=edge_types_list,
-            space_name=settings.NEBULA_SPACE_NAME
+            space_name=crud_kg_space_alias.resolve_space_name(db, settings.NEBULA_SPACE_NAME) # Switched by rebuild runs
         )
         if not graph_data.nodes and not graph_data.edges:
             # Distinguish between an empty result and an error if needed
             # For now, an empty graph is a valid response if the node has no neighbors or doesn't exist
             pass
         return graph_data
+    except NebulaBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Graph database is busy, please retry: {str(e)}")
     except Exception as e:
         # Log the exception e
         print(f"Error in get_node_neighbors endpoint: {e}")
@@ -53,7 +60,8 @@ async def get_node_neighbors(
 async def search_nodes(
     query_string: str = Query(..., min_length=1, title="Search Query", description="The string to search for in node properties (e.g., name)."),
     limit: int = Query(25, ge=1, le=100, title="Limit", description="Maximum number of nodes to return."),
-    target_tags: Optional[str] = Query(None, title="Target Tags", description="Comma-separated list of node tags to search within (e.g., 'player,team'). If None, search may be broader or follow service-defined behavior.")
+    target_tags: Optional[str] = Query(None, title="Target Tags", description="Comma-separated list of node tags to search within (e.g., 'player,team'). If None, search may be broader or follow service-defined behavior."),
+    db: Session = Depends(get_db)
 ):
     """
     Searches for nodes in the knowledge graph.
@@ -67,9 +75,11 @@ async def search_nodes(
             query_string=query_string,
             limit=limit,
             target_tags=tags_list,
-            space_name=settings.NEBULA_SPACE_NAME
+            space_name=crud_kg_space_alias.resolve_space_name(db, settings.NEBULA_SPACE_NAME) # Switched by rebuild runs
         )
         return graph_data
+    except NebulaBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Graph database is busy, please retry: {str(e)}")
     except Exception as e:
         # Log the exception e
         print(f"Error in search_nodes endpoint: {e}")
@@ -1,7 +1,13 @@
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
+from croniter import croniter
+
+def _validate_cron(v: Optional[str]) -> Optional[str]:
+    if v and not croniter.is_valid(v):
+        raise ValueError(f"Invalid cron expression: {v}")
+    return v or None
 
 class KGPipelineStatus(str, Enum):
     ACTIVE = "active"
@@ -13,21 +19,31 @@ class KGPipelineBase(BaseModel):
     description: Optional[str] = None
     target_kg_name: str # Name of the graph space in NebulaGraph, for example
     schedule: Optional[str] = None # Cron expression for scheduling
+    execution_options: Optional[Dict[str, Any]] = None # Run-level tuning, e.g. {"max_parallel_tasks": 4}
 
 class KGPipelineCreate(KGPipelineBase):
-    pass
+    # Validated on input only: reading a pipeline must not fail on a schedule stored earlier
+    @validator("schedule")
+    def validate_schedule(cls, v):
+        return _validate_cron(v)
 
 class KGPipelineUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     target_kg_name: Optional[str] = None
     schedule: Optional[str] = None
+    execution_options: Optional[Dict[str, Any]] = None
     status: Optional[KGPipelineStatus] = None
 
+    @validator("schedule")
+    def validate_schedule(cls, v):
+        return _validate_cron(v)
+
 class KGPipelineInDBBase(KGPipelineBase):
     id: int
     created_by_user_id: int
     status: KGPipelineStatus = KGPipelineStatus.DRAFT
+    next_scheduled_run_at: Optional[datetime] = None # Next (jittered) cron trigger, UTC
     created_at: datetime
     updated_at: datetime
 
@@ -45,9 +61,36 @@ class KGPipelineRunStatus(str, Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+class KGPipelineTaskRunStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class KGPipelineTaskRun(BaseModel):
+    id: int
+    pipeline_run_id: int
+    task_id: int
+    status: KGPipelineTaskRunStatus
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    input_record_count: int = 0 # Source rows committed so far
+    output_record_count: int = 0 # Rows written to Nebula so far
+    checkpoint_key: Optional[str] = None # Last committed value of the task's checkpoint key column
+    partition_checkpoints: Optional[List[Dict[str, Any]]] = None # Per key range resume positions of partitioned scans
+    metrics: Optional[Dict[str, Any]] = None # Rows, bytes, stage durations and Nebula latency percentiles
+    error_message: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
 class KGPipelineRunBase(BaseModel):
     pipeline_id: int
     triggered_by_user_id: Optional[int] = None # Can be system-triggered
+    full_refresh: bool = False # Ignore task watermarks and re-read full source tables
+    bulk_export: bool = False # Write CSV files for nebula-importer instead of inserting into Nebula
+    rebuild: bool = False # Load a shadow space, rebuild its indexes once, then switch the KG's space alias to it
     # remarks: Optional[str] = None
 
 class KGPipelineRunCreate(KGPipelineRunBase):
@@ -58,8 +101,23 @@ class KGPipelineRun(KGPipelineRunBase):
     status: KGPipelineRunStatus
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
-    # Add output or log summary if needed
-    # task_details: Optional[List[Any]] = None # For detailed task statuses in a run
+    metrics: Optional[Dict[str, Any]] = None # Totals over all task runs, set when the run finishes
+    worker_id: Optional[str] = None # Queue worker executing the run (queue execution mode)
+
+    class Config:
+        orm_mode = True
+
+class KGPipelineDeadLetter(BaseModel):
+    id: int
+    pipeline_run_id: int
+    task_id: int
+    statement_prefix: str # INSERT VERTEX / INSERT EDGE prefix the row was sent with
+    row_values: str # The rejected VALUES item
+    error_message: Optional[str] = None
+    created_at: datetime
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class KGPipelineRunDetail(KGPipelineRun):
+    task_runs: List[KGPipelineTaskRun] = [] # Per-task status, checkpoint and metrics 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from enum import Enum
 from datetime import datetime
@@ -17,7 +17,11 @@ class KGPipelineTaskBase(BaseModel):
     field_mappings: Dict[str, Any] # Defines how source fields map to KG properties
                                    # Example for Node: {"source_col1": {"target_property": "prop1", "is_id": True}, "source_col2": {"target_property": "prop2"}}
                                    # Example for Relationship: {"from_node_id_col": "src_id_col", "to_node_id_col": "dst_id_col", "rel_prop_col": "prop1"}
+                                   # Relationship VID mappings may declare the tag they point to, e.g. "source_vid_column": {"name": "user_id", "tag": "User"},
+                                   # so the task only waits for the NODE tasks loading that tag.
     filter_conditions: Optional[str] = None # e.g., SQL WHERE clause for source data
+    execution_options: Optional[Dict[str, Any]] = None # Per-task execution tuning, e.g. {"batch_max_rows": 500, "batch_max_bytes": 1048576}
+    watermark_column: Optional[str] = None # e.g. "updated_at" or an auto-increment id; enables incremental extraction
     is_enabled: bool = True
 
 class KGPipelineTaskCreate(KGPipelineTaskBase):
@@ -32,11 +36,15 @@ class KGPipelineTaskUpdate(BaseModel):
     target_label_or_type: Optional[str] = None
     field_mappings: Optional[Dict[str, Any]] = None
     filter_conditions: Optional[str] = None
+    execution_options: Optional[Dict[str, Any]] = None
+    watermark_column: Optional[str] = None
     is_enabled: Optional[bool] = None
 
 class KGPipelineTaskInDBBase(KGPipelineTaskBase):
     id: int
     pipeline_id: int
+    last_watermark_value: Optional[str] = None # Highest watermark committed by the last successful run
+    last_watermark_updated_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
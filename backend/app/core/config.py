@@ -92,7 +92,68 @@ class Settings(BaseSettings):
     NEBULA_USER: str = get_yaml_value('nebula_graph.user', "root")
     NEBULA_PASSWORD: str = get_yaml_value('nebula_graph.password', "nebula")
     NEBULA_SPACE_NAME: str = get_yaml_value('nebula_graph.space_name', "knowledge_graph")
+    NEBULA_MAX_CONNECTION_POOL_SIZE: int = get_yaml_value('nebula_graph.max_connection_pool_size', 32)
     NEBULA_VIS_DEFAULT_NEIGHBOR_LIMIT: int = get_yaml_value('nebula_graph.vis_default_neighbor_limit', 25)
+    NEBULA_QUERY_MAX_CONCURRENCY: int = get_yaml_value('nebula_graph.query_max_concurrency', 8) # 接口同时执行的Nebula查询数上限（独立线程池，不阻塞事件循环）
+    NEBULA_QUERY_QUEUE_TIMEOUT_SECONDS: float = get_yaml_value('nebula_graph.query_queue_timeout_seconds', 10) # 查询槽位全部占用时的最长等待秒数，超时返回503
+
+    # KG Pipeline execution
+    KG_PIPELINE_BATCH_MAX_ROWS: int = get_yaml_value('kg_pipeline.batch_max_rows', 500) # 每条INSERT语句最多包含的行数
+    KG_PIPELINE_BATCH_MAX_BYTES: int = get_yaml_value('kg_pipeline.batch_max_bytes', 1024 * 1024) # 每条INSERT语句的最大字节数
+    KG_PIPELINE_FETCH_CHUNK_SIZE: int = get_yaml_value('kg_pipeline.fetch_chunk_size', 5000) # 源表流式读取时每批的行数
+    KG_PIPELINE_WRITER_WORKERS: int = get_yaml_value('kg_pipeline.writer_workers', 4) # 每个任务并发写入Nebula的worker数
+    KG_PIPELINE_WRITER_QUEUE_SIZE: int = get_yaml_value('kg_pipeline.writer_queue_size', 16) # 待写入批次队列长度（满时反压抽取）
+    KG_PIPELINE_MAX_PARALLEL_TASKS: int = get_yaml_value('kg_pipeline.max_parallel_tasks', 4) # 单次运行中并发执行的任务数上限
+    KG_PIPELINE_ADAPTIVE_WRITES: bool = get_yaml_value('kg_pipeline.adaptive_writes.enabled', True) # 按graphd延迟自动调整批大小和并发语句数(AIMD)
+    KG_PIPELINE_ADAPTIVE_MIN_BATCH_ROWS: int = get_yaml_value('kg_pipeline.adaptive_writes.min_batch_rows', 50) # 自适应批大小下限（上限为batch_max_rows）
+    KG_PIPELINE_ADAPTIVE_TARGET_LATENCY_MS: float = get_yaml_value('kg_pipeline.adaptive_writes.target_latency_ms', 500) # 单条语句目标延迟（毫秒），超过则减半
+    KG_PIPELINE_MAX_ROWS_PER_SECOND: float = get_yaml_value('kg_pipeline.max_rows_per_second', 0) # 每次运行写入Nebula的行数/秒上限（0为不限制）
+    KG_PIPELINE_WRITE_MAX_RETRIES: int = get_yaml_value('kg_pipeline.write_errors.max_retries', 3) # 超时、leader切换等临时错误的重试次数
+    KG_PIPELINE_WRITE_RETRY_BACKOFF_SECONDS: float = get_yaml_value('kg_pipeline.write_errors.retry_backoff_seconds', 0.5) # 首次重试等待秒数，之后指数增长
+    KG_PIPELINE_MAX_ERROR_RATE: float = get_yaml_value('kg_pipeline.write_errors.max_error_rate', 0.01) # 允许写入死信表的行占比，超过则任务失败
+    KG_PIPELINE_ERROR_RATE_MIN_ROWS: int = get_yaml_value('kg_pipeline.write_errors.min_rows', 1000) # 计算错误率时的最少行数，避免开头几条脏数据直接导致失败
+    KG_PIPELINE_STATE_DIR: str = os.path.join(ROOT_DIR, get_yaml_value('kg_pipeline.state_dir', "data/kg_pipeline")) # 流程本地状态文件目录（行指纹等），相对路径基于backend目录
+    KG_PIPELINE_SKIP_UNCHANGED_ROWS: bool = get_yaml_value('kg_pipeline.skip_unchanged_rows', False) # 按行指纹跳过与上次写入相同的行
+    KG_PIPELINE_SYNC_DELETIONS: bool = get_yaml_value('kg_pipeline.deletion_sync.enabled', False) # 全量读取后删除源表中已不存在的点(标签)/边
+    KG_PIPELINE_MAX_DELETE_FRACTION: float = get_yaml_value('kg_pipeline.deletion_sync.max_delete_fraction', 0.5) # 单次最多删除上次键数的比例，超过则不删除并使任务失败
+    KG_PIPELINE_DELETION_SYNC_SORT_BUFFER_KEYS: int = get_yaml_value('kg_pipeline.deletion_sync.sort_buffer_keys', 1000000) # 外部排序时每段在内存中排序的键数
+    KG_PIPELINE_VID_INDEX: bool = get_yaml_value('kg_pipeline.vid_index.enabled', False) # 点任务记录已导入的VID，边任务写入前检查起点/终点是否存在
+    KG_PIPELINE_VID_INDEX_FALSE_POSITIVE_RATE: float = get_yaml_value('kg_pipeline.vid_index.false_positive_rate', 0.01) # VID索引布隆过滤器的误判率
+    KG_PIPELINE_SPOOL: bool = get_yaml_value('kg_pipeline.spool.enabled', False) # 转换后的批次先写入本地落盘队列，再由写入线程按graphd速度消费
+    KG_PIPELINE_SPOOL_SEGMENT_BYTES: int = get_yaml_value('kg_pipeline.spool.segment_bytes', 67108864) # 落盘队列单个段文件的大小（字节）
+    KG_PIPELINE_SPOOL_MAX_BYTES: int = get_yaml_value('kg_pipeline.spool.max_bytes', 4294967296) # 每个任务尚未交给写入线程的落盘数据上限（字节），超过时抽取等待
+    KG_PIPELINE_EXPORT_DIR: str = os.path.join(ROOT_DIR, get_yaml_value('kg_pipeline.bulk_export.output_dir', "data/kg_export")) # 批量导出模式的CSV文件和导入配置目录，相对路径基于backend目录
+    KG_PIPELINE_EXPORT_ROWS_PER_FILE: int = get_yaml_value('kg_pipeline.bulk_export.rows_per_file', 1000000) # 每个CSV文件的最大行数，超过后切换到下一个文件
+    KG_PIPELINE_REBUILD_SCHEMA_WAIT_SECONDS: float = get_yaml_value('kg_pipeline.rebuild.schema_wait_seconds', 20) # 影子图空间建表、删除/创建索引后等待schema同步到各graphd的秒数（约两个心跳周期）
+    KG_PIPELINE_REBUILD_POLL_SECONDS: float = get_yaml_value('kg_pipeline.rebuild.poll_seconds', 5) # 轮询REBUILD INDEX作业状态的间隔（秒）
+    KG_PIPELINE_REBUILD_DROP_PREVIOUS_SPACE: bool = get_yaml_value('kg_pipeline.rebuild.drop_previous_space', False) # 切换别名后删除之前提供服务的图空间（默认保留以便回退）
+    KG_PIPELINE_EXPORT_IMPORTER_BATCH: int = get_yaml_value('kg_pipeline.bulk_export.importer_batch', 512) # 生成的nebula-importer配置中每条INSERT的行数
+    KG_PIPELINE_SHARED_SCANS: bool = get_yaml_value('kg_pipeline.shared_scans.enabled', True) # 同一次运行中读取同一源表（过滤条件相同）的任务共用一次扫描
+    KG_PIPELINE_SHARED_SCAN_QUEUE_CHUNKS: int = get_yaml_value('kg_pipeline.shared_scans.queue_chunks', 2) # 共享扫描为每个任务缓存的数据块数，最慢的任务决定扫描速度
+    KG_PIPELINE_SHARED_SCAN_JOIN_TIMEOUT_SECONDS: float = get_yaml_value('kg_pipeline.shared_scans.join_timeout_seconds', 60) # 等待同组任务就绪的最长时间，超时未就绪的任务单独读取
+    KG_PIPELINE_PROJECT_COLUMNS: bool = get_yaml_value('kg_pipeline.project_columns', True) # 只读取字段映射用到的列（加检查点键和水位列），而不是SELECT *
+    KG_PIPELINE_EXTRACT_PARTITIONS: int = get_yaml_value('kg_pipeline.extract_partitions', 1) # 每个任务按主键范围并行抽取的分区数（1为不分区）
+    KG_PIPELINE_MAX_EXTRACT_PARTITIONS: int = get_yaml_value('kg_pipeline.max_extract_partitions', 16) # 分区数上限（每个分区占用一个源库连接）
+    KG_PIPELINE_TRANSFORM_PROCESSES: int = get_yaml_value('kg_pipeline.transform_processes', 0) # 生成nGQL的进程池大小（0为在抽取线程内转换）
+    KG_PIPELINE_COLUMNAR_TRANSFORM: bool = get_yaml_value('kg_pipeline.columnar_transform', False) # 按列批量读取并转换源数据
+    KG_PIPELINE_CANCEL_POLL_SECONDS: float = get_yaml_value('kg_pipeline.cancel_poll_seconds', 5) # 检查运行是否被取消的间隔（秒）
+    KG_PIPELINE_EVENT_FLUSH_SECONDS: float = get_yaml_value('kg_pipeline.events.flush_seconds', 1.0) # 运行事件批量写入MySQL的间隔（秒）
+    KG_PIPELINE_EVENT_FLUSH_BATCH_SIZE: int = get_yaml_value('kg_pipeline.events.flush_batch_size', 500) # 缓冲事件达到该数量时立即写入
+    KG_PIPELINE_EVENT_MAX_BUFFERED: int = get_yaml_value('kg_pipeline.events.max_buffered', 10000) # 内存中最多缓冲的事件数，超过则丢弃最早的
+    KG_PIPELINE_PROGRESS_EVENT_SECONDS: float = get_yaml_value('kg_pipeline.events.progress_seconds', 2.0) # 每个任务进度事件的最小间隔（秒）
+    KG_PIPELINE_EVENT_POLL_SECONDS: float = get_yaml_value('kg_pipeline.events.poll_seconds', 1.0) # SSE推送时查询新事件的间隔（秒）
+    KG_PIPELINE_EVENT_HEARTBEAT_SECONDS: float = get_yaml_value('kg_pipeline.events.heartbeat_seconds', 15.0) # SSE无新事件时发送心跳的间隔（秒）
+    KG_PIPELINE_EXECUTION_MODE: str = get_yaml_value('kg_pipeline.execution_mode', "background") # background: API进程内执行; queue: 由独立worker进程领取执行
+    KG_PIPELINE_WORKER_CONCURRENCY: int = get_yaml_value('kg_pipeline.worker_concurrency', 2) # 每个worker进程同时执行的运行数
+    KG_PIPELINE_WORKER_POLL_SECONDS: float = get_yaml_value('kg_pipeline.worker_poll_seconds', 2) # worker空闲时轮询待执行运行的间隔（秒）
+    KG_PIPELINE_SCHEDULER_ENABLED: bool = get_yaml_value('kg_pipeline.scheduler.enabled', True) # 是否按KGPipeline.schedule定时触发运行
+    KG_PIPELINE_SCHEDULER_POLL_SECONDS: float = get_yaml_value('kg_pipeline.scheduler.poll_seconds', 30) # 调度器检查到期流程的间隔（秒）
+    KG_PIPELINE_SCHEDULER_TIMEZONE: str = get_yaml_value('kg_pipeline.scheduler.timezone', "UTC") # 解释cron表达式使用的时区
+    KG_PIPELINE_SCHEDULER_JITTER_SECONDS: int = get_yaml_value('kg_pipeline.scheduler.jitter_seconds', 300) # 每次定时触发随机延后的最大秒数
+    KG_PIPELINE_SCHEDULER_MAX_CONCURRENT_RUNS: int = get_yaml_value('kg_pipeline.scheduler.max_concurrent_runs', 8) # 全局进行中运行数达到该值时推迟定时触发
+    KG_PIPELINE_SCHEDULER_STALE_RUN_SECONDS: float = get_yaml_value('kg_pipeline.scheduler.stale_run_seconds', 300) # 无有效租约且超过该秒数未更新的进行中运行视为已中断，不计入并发数
+    KG_PIPELINE_SCHEDULER_MAX_RUNS_PER_PIPELINE: int = get_yaml_value('kg_pipeline.scheduler.max_runs_per_pipeline', 1) # 单个流程进行中运行数达到该值时合并（跳过）定时触发
+    KG_PIPELINE_RUN_LEASE_SECONDS: int = get_yaml_value('kg_pipeline.run_lease_seconds', 60) # 运行租约时长（秒），worker失联超过该时长后运行可被其他worker接管
 
     # First Superuser
     FIRST_SUPERUSER_USERNAME: str = get_yaml_value('first_superuser.username', "admin")
@@ -16,6 +16,9 @@ def get_kg_pipelines(
         query = query.filter(models.KGPipeline.created_by_user_id == user_id)
     return query.offset(skip).limit(limit).all()
 
+def get_kg_pipelines_by_user(db: Session, user_id: int) -> List[Type[models.KGPipeline]]:
+    return db.query(models.KGPipeline).filter(models.KGPipeline.created_by_user_id == user_id).all()
+
 def create_kg_pipeline(
     db: Session, pipeline: schemas.KGPipelineCreate, user_id: int
 ) -> models.KGPipeline:
@@ -34,6 +37,8 @@ def update_kg_pipeline(
     db: Session, db_obj: models.KGPipeline, obj_in: schemas.KGPipelineUpdate
 ) -> models.KGPipeline:
     update_data = obj_in.dict(exclude_unset=True)
+    if update_data.get("schedule", db_obj.schedule) != db_obj.schedule:
+        db_obj.next_scheduled_run_at = None # The scheduler plans the next trigger from the new expression
     for field, value in update_data.items():
         setattr(db_obj, field, value)
     db_obj.updated_at = datetime.utcnow()
@@ -49,4 +54,40 @@ def delete_kg_pipeline(db: Session, pipeline_id: int) -> Optional[models.KGPipel
         # For now, direct delete. SQLAlchemy cascades can be set up in the model relationships.
         db.delete(db_obj)
         db.commit()
-    return db_obj 
\ No newline at end of file
+    return db_obj
+
+def get_other_kg_pipelines_for_kg(db: Session, target_kg_name: str, pipeline_id: int) -> List[Type[models.KGPipeline]]:
+    """Pipelines other than pipeline_id that write the same knowledge graph."""
+    return (
+        db.query(models.KGPipeline)
+        .filter(models.KGPipeline.target_kg_name == target_kg_name, models.KGPipeline.id != pipeline_id)
+        .all()
+    )
+
+def get_scheduled_kg_pipelines(db: Session) -> List[Type[models.KGPipeline]]:
+    """Active pipelines that have a cron schedule."""
+    return (
+        db.query(models.KGPipeline)
+        .filter(
+            models.KGPipeline.status == schemas.KGPipelineStatus.ACTIVE,
+            models.KGPipeline.schedule.isnot(None),
+            models.KGPipeline.schedule != ""
+        )
+        .all()
+    )
+
+def claim_kg_pipeline_schedule_slot(
+    db: Session, pipeline_id: int, expected_next_run_at: Optional[datetime], new_next_run_at: datetime
+) -> bool:
+    """
+    Moves a pipeline's next_scheduled_run_at from the value the caller read to new_next_run_at.
+    Compare-and-set: when several schedulers see the same trigger, only one of them gets True.
+    """
+    query = db.query(models.KGPipeline).filter(models.KGPipeline.id == pipeline_id)
+    if expected_next_run_at is None:
+        query = query.filter(models.KGPipeline.next_scheduled_run_at.is_(None))
+    else:
+        query = query.filter(models.KGPipeline.next_scheduled_run_at == expected_next_run_at)
+    claimed = query.update({models.KGPipeline.next_scheduled_run_at: new_next_run_at}, synchronize_session=False)
+    db.commit()
+    return claimed > 0
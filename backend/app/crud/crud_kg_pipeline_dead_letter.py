@@ -0,0 +1,30 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional, Type
+from datetime import datetime
+
+from app.db.models import kg_pipeline_models as models
+
+def create_dead_letters(db: Session, pipeline_run_id: int, task_id: int, dead_letters: List) -> int:
+    """Stores rows Nebula rejected (DeadLetter objects of the writer pool) in one commit."""
+    now = datetime.utcnow()
+    db.add_all([
+        models.KGPipelineDeadLetter(
+            pipeline_run_id=pipeline_run_id,
+            task_id=task_id,
+            statement_prefix=letter.prefix,
+            row_values=letter.item,
+            error_message=letter.error_message,
+            created_at=now
+        )
+        for letter in dead_letters
+    ])
+    db.commit()
+    return len(dead_letters)
+
+def get_dead_letters_for_run(
+    db: Session, pipeline_run_id: int, task_id: Optional[int] = None, skip: int = 0, limit: int = 100
+) -> List[Type[models.KGPipelineDeadLetter]]:
+    query = db.query(models.KGPipelineDeadLetter).filter(models.KGPipelineDeadLetter.pipeline_run_id == pipeline_run_id)
+    if task_id is not None:
+        query = query.filter(models.KGPipelineDeadLetter.task_id == task_id)
+    return query.order_by(models.KGPipelineDeadLetter.id).offset(skip).limit(limit).all()
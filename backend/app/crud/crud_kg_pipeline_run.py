@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional, Type
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Type
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
 
 from app.db.models import kg_pipeline_models as models # KGPipelineRun is in here
 from app.api.v1.schemas import kg_pipeline_schemas as schemas
@@ -26,6 +27,23 @@ def get_kg_pipeline_runs(
     
     return query.order_by(models.KGPipelineRun.created_at.desc()).offset(skip).limit(limit).all()
 
+def get_kg_pipeline_runs_for_pipeline(
+    db: Session, pipeline_id: int, skip: int = 0, limit: int = 100
+) -> List[Type[models.KGPipelineRun]]:
+    return get_kg_pipeline_runs(db, skip=skip, limit=limit, pipeline_id=pipeline_id)
+
+def get_kg_pipeline_runs_for_pipelines(
+    db: Session, pipeline_ids: List[int], skip: int = 0, limit: int = 100
+) -> List[Type[models.KGPipelineRun]]:
+    return (
+        db.query(models.KGPipelineRun)
+        .filter(models.KGPipelineRun.pipeline_id.in_(pipeline_ids))
+        .order_by(models.KGPipelineRun.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
 def create_kg_pipeline_run(
     db: Session, run_create: schemas.KGPipelineRunCreate
 ) -> models.KGPipelineRun:
@@ -45,7 +63,8 @@ def update_kg_pipeline_run_status(
     db: Session, 
     run_id: int, 
     new_status: schemas.KGPipelineRunStatus,
-    end_time: Optional[datetime] = None 
+    end_time: Optional[datetime] = None,
+    metrics: Optional[Dict[str, Any]] = None
 ) -> Optional[models.KGPipelineRun]:
     db_run = get_kg_pipeline_run(db, run_id=run_id)
     if not db_run:
@@ -55,10 +74,107 @@ def update_kg_pipeline_run_status(
     db_run.updated_at = datetime.utcnow()
     if new_status in [schemas.KGPipelineRunStatus.SUCCESS, schemas.KGPipelineRunStatus.FAILED, schemas.KGPipelineRunStatus.CANCELLED]:
         db_run.end_time = end_time if end_time else datetime.utcnow()
+        db_run.lease_expires_at = None
+    if metrics is not None:
+        db_run.metrics = metrics
         
     db.add(db_run)
     db.commit()
     db.refresh(db_run)
     return db_run
 
+def reset_kg_pipeline_run_for_resume(db: Session, db_run: models.KGPipelineRun) -> models.KGPipelineRun:
+    """Puts a FAILED/CANCELLED run back to PENDING; its task runs keep their checkpoints."""
+    db_run.status = schemas.KGPipelineRunStatus.PENDING
+    db_run.end_time = None
+    db_run.worker_id = None
+    db_run.lease_expires_at = None
+    db_run.updated_at = datetime.utcnow()
+    db.add(db_run)
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+def count_active_kg_pipeline_runs(
+    db: Session, pipeline_id: Optional[int] = None, stale_before: Optional[datetime] = None,
+    pending_never_stale: bool = False
+) -> int:
+    """
+    Number of PENDING or RUNNING runs, of one pipeline or of all pipelines. With stale_before, runs
+    without a valid lease that were not updated since stale_before are left out: their process is gone
+    (e.g. a background run of a restarted API process). pending_never_stale keeps counting PENDING runs,
+    which in queue mode wait for a worker without any lease.
+    """
+    query = db.query(models.KGPipelineRun).filter(models.KGPipelineRun.status.in_([
+        schemas.KGPipelineRunStatus.PENDING, schemas.KGPipelineRunStatus.RUNNING
+    ]))
+    if pipeline_id is not None:
+        query = query.filter(models.KGPipelineRun.pipeline_id == pipeline_id)
+    if stale_before is not None:
+        alive = or_(
+            models.KGPipelineRun.lease_expires_at >= datetime.utcnow(),
+            models.KGPipelineRun.updated_at >= stale_before
+        )
+        if pending_never_stale:
+            alive = or_(models.KGPipelineRun.status == schemas.KGPipelineRunStatus.PENDING, alive)
+        query = query.filter(alive)
+    return query.count()
+
+def touch_kg_pipeline_run(db: Session, run_id: int) -> bool:
+    """Heartbeat of a RUNNING run: bumps updated_at so the scheduler does not take it for abandoned."""
+    touched = (
+        db.query(models.KGPipelineRun)
+        .filter(models.KGPipelineRun.id == run_id, models.KGPipelineRun.status == schemas.KGPipelineRunStatus.RUNNING)
+        .update({models.KGPipelineRun.updated_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return touched > 0
+
+def claim_next_kg_pipeline_run(db: Session, worker_id: str, lease_seconds: int) -> Optional[models.KGPipelineRun]:
+    """
+    Claims the oldest PENDING run, or a RUNNING run whose worker let its lease expire, for worker_id.
+    FOR UPDATE SKIP LOCKED lets any number of workers poll concurrently without claiming the same row.
+    """
+    now = datetime.utcnow()
+    db_run = (
+        db.query(models.KGPipelineRun)
+        .filter(or_(
+            models.KGPipelineRun.status == schemas.KGPipelineRunStatus.PENDING,
+            and_(
+                models.KGPipelineRun.status == schemas.KGPipelineRunStatus.RUNNING,
+                models.KGPipelineRun.lease_expires_at < now
+            )
+        ))
+        .order_by(models.KGPipelineRun.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not db_run:
+        db.commit() # Release the (empty) locking read
+        return None
+    db_run.status = schemas.KGPipelineRunStatus.RUNNING # No longer PENDING, so no other worker claims it
+    db_run.worker_id = worker_id
+    db_run.lease_expires_at = now + timedelta(seconds=lease_seconds)
+    db_run.updated_at = now
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+def renew_kg_pipeline_run_lease(db: Session, run_id: int, worker_id: str, lease_seconds: int) -> bool:
+    """Extends the lease of a run still held by worker_id. Returns False if the run was taken over or finished."""
+    renewed = (
+        db.query(models.KGPipelineRun)
+        .filter(
+            models.KGPipelineRun.id == run_id,
+            models.KGPipelineRun.worker_id == worker_id,
+            models.KGPipelineRun.lease_expires_at.isnot(None)
+        )
+        .update(
+            {models.KGPipelineRun.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)},
+            synchronize_session=False
+        )
+    )
+    db.commit()
+    return renewed > 0
+
 # We might add more specific update functions later, e.g., to add logs. 
\ No newline at end of file
@@ -0,0 +1,26 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Type
+
+from app.db.models import kg_pipeline_models as models
+
+def create_run_events(db: Session, events: List[Dict[str, Any]]) -> int:
+    """Inserts a batch of buffered run events (dicts of KGPipelineRunEvent columns) in one statement."""
+    db.bulk_insert_mappings(models.KGPipelineRunEvent, events)
+    db.commit()
+    return len(events)
+
+def get_run_events(
+    db: Session, pipeline_run_id: int, after_id: int = 0, limit: Optional[int] = 1000
+) -> List[Type[models.KGPipelineRunEvent]]:
+    """Events of a run with an id greater than after_id, oldest first."""
+    query = (
+        db.query(models.KGPipelineRunEvent)
+        .filter(
+            models.KGPipelineRunEvent.pipeline_run_id == pipeline_run_id,
+            models.KGPipelineRunEvent.id > after_id
+        )
+        .order_by(models.KGPipelineRunEvent.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
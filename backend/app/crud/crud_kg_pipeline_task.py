@@ -1 +1,71 @@
- 
\ No newline at end of file
+from sqlalchemy.orm import Session
+from typing import List, Optional, Type
+from datetime import datetime
+
+from app.db.models import kg_pipeline_models as models
+from app.api.v1.schemas import kg_pipeline_task_schemas as schemas
+
+def get_kg_pipeline_task(db: Session, task_id: int) -> Optional[models.KGPipelineTask]:
+    return db.query(models.KGPipelineTask).filter(models.KGPipelineTask.id == task_id).first()
+
+def get_kg_pipeline_tasks_for_pipeline(
+    db: Session, pipeline_id: int, skip: int = 0, limit: int = 1000
+) -> List[Type[models.KGPipelineTask]]:
+    return (
+        db.query(models.KGPipelineTask)
+        .filter(models.KGPipelineTask.pipeline_id == pipeline_id)
+        .order_by(models.KGPipelineTask.task_order)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+def create_kg_pipeline_task(
+    db: Session, task: schemas.KGPipelineTaskCreate
+) -> models.KGPipelineTask:
+    db_task = models.KGPipelineTask(
+        **task.dict(),
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(db_task)
+    db.commit()
+    db.refresh(db_task)
+    return db_task
+
+def update_kg_pipeline_task(
+    db: Session, db_obj: models.KGPipelineTask, obj_in: schemas.KGPipelineTaskUpdate
+) -> models.KGPipelineTask:
+    update_data = obj_in.dict(exclude_unset=True)
+    if update_data.get("watermark_column", db_obj.watermark_column) != db_obj.watermark_column:
+        # A different watermark column makes the stored watermark meaningless
+        db_obj.last_watermark_value = None
+        db_obj.last_watermark_updated_at = None
+    for field, value in update_data.items():
+        setattr(db_obj, field, value)
+    db_obj.updated_at = datetime.utcnow()
+    db.add(db_obj)
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
+def delete_kg_pipeline_task(db: Session, task_id: int) -> Optional[models.KGPipelineTask]:
+    db_obj = db.query(models.KGPipelineTask).get(task_id)
+    if db_obj:
+        db.delete(db_obj)
+        db.commit()
+    return db_obj
+
+def update_kg_pipeline_task_watermark(
+    db: Session, task_id: int, watermark_value: Optional[str]
+) -> Optional[models.KGPipelineTask]:
+    """Stores the highest watermark committed by a successful incremental extraction."""
+    db_task = get_kg_pipeline_task(db, task_id=task_id)
+    if not db_task:
+        return None
+    db_task.last_watermark_value = watermark_value
+    db_task.last_watermark_updated_at = datetime.utcnow()
+    db.add(db_task)
+    db.commit()
+    db.refresh(db_task)
+    return db_task
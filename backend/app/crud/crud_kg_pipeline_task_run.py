@@ -0,0 +1,97 @@
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Type
+from datetime import datetime
+
+from app.db.models import kg_pipeline_models as models
+from app.api.v1.schemas import kg_pipeline_schemas as schemas
+
+def get_task_run(db: Session, pipeline_run_id: int, task_id: int) -> Optional[models.KGPipelineTaskRun]:
+    return (
+        db.query(models.KGPipelineTaskRun)
+        .filter(
+            models.KGPipelineTaskRun.pipeline_run_id == pipeline_run_id,
+            models.KGPipelineTaskRun.task_id == task_id
+        )
+        .first()
+    )
+
+def get_task_runs_for_run(db: Session, pipeline_run_id: int) -> List[Type[models.KGPipelineTaskRun]]:
+    return (
+        db.query(models.KGPipelineTaskRun)
+        .filter(models.KGPipelineTaskRun.pipeline_run_id == pipeline_run_id)
+        .order_by(models.KGPipelineTaskRun.id)
+        .all()
+    )
+
+def get_or_create_task_run(db: Session, pipeline_run_id: int, task_id: int) -> models.KGPipelineTaskRun:
+    db_task_run = get_task_run(db, pipeline_run_id=pipeline_run_id, task_id=task_id)
+    if db_task_run:
+        return db_task_run
+    db_task_run = models.KGPipelineTaskRun(
+        pipeline_run_id=pipeline_run_id,
+        task_id=task_id,
+        status=schemas.KGPipelineTaskRunStatus.PENDING,
+        input_record_count=0,
+        output_record_count=0,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(db_task_run)
+    db.commit()
+    db.refresh(db_task_run)
+    return db_task_run
+
+def update_task_run_status(
+    db: Session,
+    db_task_run: models.KGPipelineTaskRun,
+    new_status: schemas.KGPipelineTaskRunStatus,
+    error_message: Optional[str] = None,
+    metrics: Optional[Dict[str, Any]] = None
+) -> models.KGPipelineTaskRun:
+    db_task_run.status = new_status
+    if metrics is not None:
+        db_task_run.metrics = metrics
+    db_task_run.updated_at = datetime.utcnow()
+    if new_status == schemas.KGPipelineTaskRunStatus.RUNNING:
+        db_task_run.start_time = db_task_run.start_time or datetime.utcnow()
+        db_task_run.end_time = None
+        db_task_run.error_message = None
+    elif new_status in [
+        schemas.KGPipelineTaskRunStatus.SUCCESS,
+        schemas.KGPipelineTaskRunStatus.FAILED,
+        schemas.KGPipelineTaskRunStatus.CANCELLED,
+    ]:
+        db_task_run.end_time = datetime.utcnow()
+        db_task_run.error_message = error_message
+    db.add(db_task_run)
+    db.commit()
+    db.refresh(db_task_run)
+    return db_task_run
+
+def update_task_run_checkpoint(
+    db: Session,
+    db_task_run: models.KGPipelineTaskRun,
+    input_record_count: int,
+    output_record_count: int,
+    checkpoint_key: Optional[str] = None,
+    partition_checkpoints: Optional[List[Dict[str, Any]]] = None,
+    metrics: Optional[Dict[str, Any]] = None
+) -> models.KGPipelineTaskRun:
+    """
+    Records that every source row up to checkpoint_key (in key order) is in the graph.
+    Partitioned tasks record one resume position per key range in partition_checkpoints instead.
+    """
+    if metrics is not None:
+        db_task_run.metrics = metrics
+    db_task_run.input_record_count = input_record_count
+    db_task_run.output_record_count = output_record_count
+    db_task_run.checkpoint_key = checkpoint_key
+    db_task_run.partition_checkpoints = partition_checkpoints
+    db_task_run.updated_at = datetime.utcnow()
+    db.add(db_task_run)
+    db.commit()
+    return db_task_run
+
+def reset_task_run_checkpoint(db: Session, db_task_run: models.KGPipelineTaskRun) -> models.KGPipelineTaskRun:
+    """Forgets the progress of a task that cannot resume by key and has to start from row zero."""
+    return update_task_run_checkpoint(db, db_task_run, input_record_count=0, output_record_count=0, checkpoint_key=None)
@@ -0,0 +1,30 @@
+from datetime import datetime
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.db.models import kg_pipeline_models as models
+
+def get_space_alias(db: Session, alias: str) -> Optional[models.KGSpaceAlias]:
+    return db.query(models.KGSpaceAlias).filter(models.KGSpaceAlias.alias == alias).first()
+
+def resolve_space_name(db: Session, alias: str) -> str:
+    """The Nebula space serving alias; the alias itself until a rebuild run switched it."""
+    db_alias = get_space_alias(db, alias)
+    return db_alias.space_name if db_alias else alias
+
+def switch_space_alias(db: Session, alias: str, space_name: str, run_id: Optional[int] = None) -> models.KGSpaceAlias:
+    """Points alias at space_name in one transaction; readers see either the old or the new space."""
+    db_alias = (
+        db.query(models.KGSpaceAlias).filter(models.KGSpaceAlias.alias == alias).with_for_update().first()
+    )
+    if db_alias is None:
+        db_alias = models.KGSpaceAlias(alias=alias, previous_space_name=alias)
+        db.add(db_alias)
+    else:
+        db_alias.previous_space_name = db_alias.space_name
+    db_alias.space_name = space_name
+    db_alias.switched_by_run_id = run_id
+    db_alias.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_alias)
+    return db_alias
@@ -5,4 +5,4 @@ Base = declarative_base()
 # Import all models here to ensure they are registered with SQLAlchemy Base
 from app.db.models.user_models import User # Example
 from app.db.models.data_source_models import DataSource 
-from app.db.models.kg_pipeline_models import KGPipeline, KGPipelineTask, KGPipelineRun 
\ No newline at end of file
+from app.db.models.kg_pipeline_models import KGPipeline, KGPipelineTask, KGPipelineRun, KGPipelineTaskRun, KGPipelineDeadLetter, KGPipelineRunEvent, KGSpaceAlias 
\ No newline at end of file
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Enum as SQLEnum, DateTime, ForeignKey, func, JSON, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Enum as SQLEnum, DateTime, ForeignKey, func, JSON, Text, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
-from app.api.v1.schemas.kg_pipeline_schemas import KGPipelineStatus, KGPipelineRunStatus
+from app.api.v1.schemas.kg_pipeline_schemas import KGPipelineStatus, KGPipelineRunStatus, KGPipelineTaskRunStatus
 from app.api.v1.schemas.kg_pipeline_task_schemas import KGPipelineTaskMappingType
 
 class KGPipeline(Base):
@@ -13,7 +13,9 @@ class KGPipeline(Base):
     description = Column(String(1024))
     target_kg_name = Column(String(255), nullable=False)
     schedule = Column(String(100), nullable=True)
+    next_scheduled_run_at = Column(DateTime, nullable=True) # Next cron trigger (UTC, jitter applied); claimed by the scheduler
     status = Column(SQLEnum(KGPipelineStatus), nullable=False, default=KGPipelineStatus.DRAFT)
+    execution_options = Column(JSON, nullable=True) # Run-level tuning, e.g. {"max_parallel_tasks": 4}
     created_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
@@ -35,6 +37,11 @@ class KGPipelineTask(Base):
     target_label_or_type = Column(String(255), nullable=False)
     field_mappings = Column(JSON, nullable=False)
     filter_conditions = Column(String(1024), nullable=True)
+    execution_options = Column(JSON, nullable=True) # Per-task tuning, e.g. {"batch_max_rows": 500, "batch_max_bytes": 1048576}
+    # Incremental extraction: when watermark_column is set, runs only read rows with watermark_column > last_watermark_value
+    watermark_column = Column(String(255), nullable=True)
+    last_watermark_value = Column(String(255), nullable=True)
+    last_watermark_updated_at = Column(DateTime, nullable=True)
     is_enabled = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
@@ -49,13 +56,84 @@ class KGPipelineRun(Base):
     pipeline_id = Column(Integer, ForeignKey("kg_pipelines.id"), nullable=False)
     triggered_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True) # Nullable if system-triggered
     
-    status = Column(SQLEnum(KGPipelineRunStatus), nullable=False, default=KGPipelineRunStatus.PENDING)
+    status = Column(SQLEnum(KGPipelineRunStatus), nullable=False, default=KGPipelineRunStatus.PENDING, index=True)
+    # Run queue: the worker that claimed the run and until when its claim is valid (renewed while running)
+    worker_id = Column(String(255), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    full_refresh = Column(Boolean, default=False, nullable=False) # Ignore task watermarks and re-read full sources
+    bulk_export = Column(Boolean, default=False, nullable=False) # Write CSV files and a nebula-importer config instead of Nebula
+    rebuild = Column(Boolean, default=False, nullable=False) # Load a shadow space and switch the KG's space alias to it
     start_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
+    metrics = Column(JSON, nullable=True) # Totals over the task runs, written when the run finishes
     # Add columns for logs or output summary if needed, e.g., logs = Column(Text, nullable=True)
     
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
 
     pipeline = relationship("KGPipeline", back_populates="runs")
-    triggered_by = relationship("User") # User who triggered it 
\ No newline at end of file
+    triggered_by = relationship("User") # User who triggered it 
+    task_runs = relationship("KGPipelineTaskRun", back_populates="pipeline_run", cascade="all, delete-orphan")
+    dead_letters = relationship("KGPipelineDeadLetter", back_populates="pipeline_run", cascade="all, delete-orphan")
+    events = relationship("KGPipelineRunEvent", back_populates="pipeline_run", cascade="all, delete-orphan")
+
+class KGPipelineTaskRun(Base):
+    """Per-task progress of a pipeline run; the checkpoint a FAILED/CANCELLED run resumes from."""
+    __tablename__ = "kg_pipeline_task_runs"
+    __table_args__ = (UniqueConstraint("pipeline_run_id", "task_id", name="uq_task_run_run_task"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    pipeline_run_id = Column(Integer, ForeignKey("kg_pipeline_runs.id"), nullable=False, index=True)
+    task_id = Column(Integer, ForeignKey("kg_pipeline_tasks.id"), nullable=False)
+    status = Column(SQLEnum(KGPipelineTaskRunStatus), nullable=False, default=KGPipelineTaskRunStatus.PENDING)
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    input_record_count = Column(BigInteger, default=0, nullable=False) # Source rows committed to Nebula so far
+    output_record_count = Column(BigInteger, default=0, nullable=False) # VALUES rows written to Nebula so far
+    checkpoint_key = Column(String(255), nullable=True) # Last committed value of the checkpoint key column
+    partition_checkpoints = Column(JSON, nullable=True) # Partitioned scans: [{"start", "end", "after_key"}] per key range
+    metrics = Column(JSON, nullable=True) # Rows, bytes, stage durations and Nebula latency of the latest attempt
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+
+    pipeline_run = relationship("KGPipelineRun", back_populates="task_runs")
+    task = relationship("KGPipelineTask")
+
+class KGPipelineDeadLetter(Base):
+    """A row Nebula rejected during a pipeline run; stored instead of failing the whole task."""
+    __tablename__ = "kg_pipeline_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pipeline_run_id = Column(Integer, ForeignKey("kg_pipeline_runs.id"), nullable=False, index=True)
+    task_id = Column(Integer, ForeignKey("kg_pipeline_tasks.id"), nullable=False)
+    statement_prefix = Column(Text, nullable=False) # e.g. 'INSERT VERTEX `tag` (`p1`, `p2`) VALUES'
+    row_values = Column(Text, nullable=False) # The rejected VALUES item, e.g. '"v1":(1, "a")'
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    pipeline_run = relationship("KGPipelineRun", back_populates="dead_letters")
+
+class KGPipelineRunEvent(Base):
+    """A structured progress event of a pipeline run (task started, progress, finished, errors)."""
+    __tablename__ = "kg_pipeline_run_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pipeline_run_id = Column(Integer, ForeignKey("kg_pipeline_runs.id"), nullable=False, index=True)
+    task_id = Column(Integer, ForeignKey("kg_pipeline_tasks.id"), nullable=True) # Null for run-level events
+    event_type = Column(String(50), nullable=False) # e.g. task_started, task_progress, task_failed, run_finished
+    message = Column(Text, nullable=True)
+    data = Column(JSON, nullable=True) # Event-specific values, e.g. rows_per_second and eta_seconds
+    created_at = Column(DateTime, nullable=False) # When the event happened, not when it was flushed
+
+    pipeline_run = relationship("KGPipelineRun", back_populates="events")
+
+class KGSpaceAlias(Base):
+    """The Nebula space that currently serves a knowledge graph; switched in one UPDATE by rebuild runs."""
+    __tablename__ = "kg_space_aliases"
+
+    alias = Column(String(255), primary_key=True) # KG name: a pipeline's target_kg_name or nebula_graph.space_name
+    space_name = Column(String(255), nullable=False) # Space readers and pipeline runs use for this alias
+    previous_space_name = Column(String(255), nullable=True) # Served before the last switch; kept for rollback
+    switched_by_run_id = Column(Integer, ForeignKey("kg_pipeline_runs.id"), nullable=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
@@ -1,27 +1,50 @@
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
 from nebula3.gclient.net import ConnectionPool
 from nebula3.Config import Config as NebulaConfig
 from app.core.config import settings
 from contextlib import contextmanager
 
+T = TypeVar("T")
+
 # Global connection pool
 connection_pool = None
+_connection_pool_lock = threading.Lock() # Sessions are opened from many threads
+
+# nebula3 sessions are blocking, so async code never calls them on the event loop: run_in_nebula_session
+# runs the whole query (execute + result parsing) on a dedicated thread pool. A semaphore per event loop
+# bounds the queries in flight, and callers give up with NebulaBusyError instead of queueing forever.
+# Pipeline writes already run on their own threads (NebulaWriterPool) and use get_nebula_session directly.
+_query_executor: Optional[ThreadPoolExecutor] = None
+_query_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+class NebulaBusyError(Exception):
+    """Raised when no Nebula query slot frees up within NEBULA_QUERY_QUEUE_TIMEOUT_SECONDS."""
+
 
 def init_nebula_connection_pool():
     global connection_pool
-    if connection_pool:
-        return
+    with _connection_pool_lock:
+        if connection_pool:
+            return
 
-    nebula_config = NebulaConfig()
-    nebula_config.max_connection_pool_size = 10 # Configure as needed
-    try:
-        connection_pool = ConnectionPool()
-        # settings.NEBULA_GRAPH_HOST might be a comma-separated list of addresses
-        addresses = [(host.strip(), settings.NEBULA_GRAPH_PORT) for host in settings.NEBULA_GRAPH_HOST.split(',')]
-        connection_pool.init(addresses, nebula_config)
-        print("Nebula Graph connection pool initialized.")
-    except Exception as e:
-        print(f"Failed to initialize Nebula Graph connection pool: {e}")
-        connection_pool = None # Ensure it's None if init fails
+        nebula_config = NebulaConfig()
+        nebula_config.max_connection_pool_size = settings.NEBULA_MAX_CONNECTION_POOL_SIZE
+        try:
+            pool = ConnectionPool()
+            # settings.NEBULA_GRAPH_HOST might be a comma-separated list of addresses
+            addresses = [(host.strip(), settings.NEBULA_GRAPH_PORT) for host in settings.NEBULA_GRAPH_HOST.split(',')]
+            pool.init(addresses, nebula_config)
+            connection_pool = pool # Published only once usable
+            print("Nebula Graph connection pool initialized.")
+        except Exception as e:
+            print(f"Failed to initialize Nebula Graph connection pool: {e}")
+            connection_pool = None # Ensure it's None if init fails
 
 @contextmanager
 def get_nebula_session(space_name: str = settings.NEBULA_SPACE_NAME):
@@ -46,20 +69,67 @@ def get_nebula_session(space_name: str = settings.NEBULA_SPACE_NAME):
         if session:
             session.release()
 
+def _get_query_executor() -> ThreadPoolExecutor:
+    global _query_executor
+    with _connection_pool_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(
+                max_workers=settings.NEBULA_QUERY_MAX_CONCURRENCY, thread_name_prefix="nebula-query"
+            )
+        return _query_executor
+
+def _get_query_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _query_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.NEBULA_QUERY_MAX_CONCURRENCY)
+        _query_semaphores[loop] = semaphore
+    return semaphore
+
+async def run_in_nebula_session(fn: Callable[[Any], T], space_name: Optional[str] = settings.NEBULA_SPACE_NAME) -> T:
+    """
+    Awaits fn(session), run with a session of space_name on the Nebula query thread pool, so the
+    event loop keeps serving other requests while graphd works. fn does all blocking work (execute
+    and result parsing). Raises NebulaBusyError if every query slot stays busy for too long.
+    """
+    semaphore = _get_query_semaphore()
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.NEBULA_QUERY_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise NebulaBusyError(
+            f"All {settings.NEBULA_QUERY_MAX_CONCURRENCY} Nebula query slots busy for "
+            f"{settings.NEBULA_QUERY_QUEUE_TIMEOUT_SECONDS}s."
+        )
+
+    def call():
+        with get_nebula_session(space_name=space_name) as session:
+            return fn(session)
+
+    try:
+        future = asyncio.get_running_loop().run_in_executor(_get_query_executor(), call)
+    except BaseException:
+        semaphore.release()
+        raise
+    # The slot is freed when the query ends, not when the caller stops waiting (e.g. client disconnect)
+    future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.shield(future)
+
 async def close_nebula_connection_pool():
-    global connection_pool
+    global connection_pool, _query_executor
+    if _query_executor:
+        _query_executor.shutdown(wait=False)
+        _query_executor = None
     if connection_pool:
-        connection_pool.close()
+        await asyncio.to_thread(connection_pool.close)
         print("Nebula Graph connection pool closed.")
         connection_pool = None
 
 # Example usage (primarily for testing, actual queries will be in services)
 async def test_nebula_connection():
     try:
-        with get_nebula_session() as session:
-            resp = session.execute_json("SHOW SPACES;") # execute_json returns a JSON string
-            print(f"Nebula SHOW SPACES response: {resp}")
-            return True, resp
+        resp = await run_in_nebula_session(lambda session: session.execute_json("SHOW SPACES;")) # execute_json returns a JSON string
+        print(f"Nebula SHOW SPACES response: {resp}")
+        return True, resp
     except Exception as e:
         print(f"Nebula connection test failed: {e}")
         return False, str(e) 
\ No newline at end of file
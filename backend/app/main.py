@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, Depends
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +16,7 @@ from app.api.v1.endpoints import ( # Using parenthesis for multi-line import
     data_sources
 )
 from app.crud import crud_user
+from app.services.kg_pipeline_scheduler_service import KGPipelineScheduler
 from app.api.v1.schemas import user_schemas
 
 # Import the new router
@@ -58,12 +60,20 @@ async def on_startup():
             print("Admin user created")
         else:
             print("Admin user already exists")
-        init_nebula_connection_pool() # Initialize Nebula pool
     finally:
         db.close()
+    await asyncio.to_thread(init_nebula_connection_pool) # Initialize Nebula pool (connects to graphd)
+    if settings.KG_PIPELINE_SCHEDULER_ENABLED:
+        # Safe to run in every uvicorn worker: each cron trigger is claimed by exactly one scheduler
+        app.state.kg_pipeline_scheduler = KGPipelineScheduler()
+        app.state.kg_pipeline_scheduler_task = asyncio.create_task(app.state.kg_pipeline_scheduler.run())
 
 @app.on_event("shutdown")
 async def on_shutdown(): # Add shutdown event
+    scheduler = getattr(app.state, "kg_pipeline_scheduler", None)
+    if scheduler:
+        scheduler.stop()
+        await app.state.kg_pipeline_scheduler_task
     await close_nebula_connection_pool() # Close Nebula pool
 
 @app.get("/", tags=["Root"])
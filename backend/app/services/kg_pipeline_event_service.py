@@ -0,0 +1,254 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.api.v1.schemas import kg_pipeline_schemas
+from app.core.config import settings
+from app.crud import crud_kg_pipeline_run, crud_kg_pipeline_run_event
+from app.db.session import SessionLocal
+
+# Structured progress events of KG pipeline runs (task started, progress, throughput, ETA, errors).
+# Executors only append events to an in-memory buffer; a background thread per process inserts them
+# into kg_pipeline_run_events in batches, so a busy run costs one INSERT per flush interval instead of
+# one per event. Readers tail the table by event id, which works for runs executed in the API process
+# as well as for runs executed by standalone pipeline workers.
+
+RUN_FINISHED_EVENT = "run_finished" # Last event of a run; ends its event streams
+
+_TERMINAL_RUN_STATUSES = {
+    kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS,
+    kg_pipeline_schemas.KGPipelineRunStatus.FAILED,
+    kg_pipeline_schemas.KGPipelineRunStatus.CANCELLED,
+}
+
+
+class PipelineEventBuffer:
+    """Thread-safe buffer of pending run events, flushed to MySQL in batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # One flush at a time keeps event ids in emit order
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def emit(self, run_id: int, event_type: str, task_id: Optional[int] = None, message: Optional[str] = None, **data: Any):
+        event = {
+            "pipeline_run_id": run_id, "task_id": task_id, "event_type": event_type,
+            "message": message, "data": data or None, "created_at": datetime.utcnow(),
+        }
+        with self._lock:
+            if len(self._pending) >= settings.KG_PIPELINE_EVENT_MAX_BUFFERED:
+                # MySQL is not keeping up (or is down): drop the oldest event rather than grow without bound
+                self._pending.pop(0)
+                self.dropped += 1
+            self._pending.append(event)
+            full = len(self._pending) >= settings.KG_PIPELINE_EVENT_FLUSH_BATCH_SIZE
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="pipeline-event-flusher", daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Inserts all buffered events. Returns how many were written; on failure they stay buffered."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+            db: Session = SessionLocal()
+            try:
+                crud_kg_pipeline_run_event.create_run_events(db, events)
+            except Exception as e:
+                print(f"Failed to store {len(events)} pipeline run events: {e}")
+                with self._lock:
+                    keep = max(0, settings.KG_PIPELINE_EVENT_MAX_BUFFERED - len(self._pending))
+                    self.dropped += len(events) - min(keep, len(events))
+                    self._pending[:0] = events[-keep:] if keep else []
+                return 0
+            finally:
+                db.close()
+            return len(events)
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(timeout=settings.KG_PIPELINE_EVENT_FLUSH_SECONDS)
+            self._wakeup.clear()
+            self.flush()
+
+
+pipeline_events = PipelineEventBuffer()
+
+def emit_run_event(run_id: int, event_type: str, task_id: Optional[int] = None, message: Optional[str] = None, **data: Any):
+    """Queues a structured event of a pipeline run; it reaches MySQL with the next batch flush."""
+    pipeline_events.emit(run_id, event_type, task_id=task_id, message=message, **data)
+
+def flush_run_events() -> int:
+    return pipeline_events.flush()
+
+
+class ProgressReporter:
+    """Emits throttled task_progress events with throughput and, given a row estimate, an ETA."""
+
+    def __init__(self, run_id: int, task_id: int, rows_done: int = 0, estimated_rows: Optional[int] = None):
+        self.run_id = run_id
+        self.task_id = task_id
+        self.estimated_rows = estimated_rows
+        self._start_rows = rows_done # Rows loaded by earlier attempts don't count towards throughput
+        self._started = time.monotonic()
+        self._last_report = 0.0
+
+    def report(self, rows_extracted: int, rows_written: int, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < settings.KG_PIPELINE_PROGRESS_EVENT_SECONDS:
+            return
+        self._last_report = now
+        elapsed = now - self._started
+        rows_per_second = (rows_extracted - self._start_rows) / elapsed if elapsed > 0 else 0.0
+        percent = eta_seconds = None
+        if self.estimated_rows:
+            # The estimate comes from the optimizer, so clamp instead of reporting > 100% or negative ETAs
+            percent = round(min(99.9, 100.0 * rows_extracted / self.estimated_rows), 1)
+            if rows_per_second > 0:
+                eta_seconds = round(max(0, self.estimated_rows - rows_extracted) / rows_per_second, 1)
+        emit_run_event(
+            self.run_id, "task_progress", task_id=self.task_id,
+            rows_extracted=rows_extracted, rows_written=rows_written, rows_per_second=round(rows_per_second, 1),
+            estimated_rows=self.estimated_rows, percent=percent, eta_seconds=eta_seconds,
+        )
+
+
+def _format_sse(event) -> str:
+    payload = {
+        "id": event.id, "task_id": event.task_id, "event_type": event.event_type, "message": event.message,
+        "data": event.data, "created_at": event.created_at.isoformat() if event.created_at else None,
+    }
+    return f"id: {event.id}\nevent: {event.event_type}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+
+class _RunEventTail:
+    """
+    Polls kg_pipeline_run_events of one run and fans new events out to every subscriber in this
+    process, so N open dashboards cost one query per poll interval instead of N.
+    """
+
+    def __init__(self, run_id: int, after_id: int):
+        self.run_id = run_id
+        self.after_id = after_id
+        self.subscribers: Set["asyncio.Queue"] = set()
+        self.finished = False
+
+    def _poll(self):
+        db: Session = SessionLocal()
+        try:
+            events = crud_kg_pipeline_run_event.get_run_events(db, pipeline_run_id=self.run_id, after_id=self.after_id)
+            run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=self.run_id)
+            return events, run is None or run.status in _TERMINAL_RUN_STATUSES
+        finally:
+            db.close()
+
+    async def run(self):
+        terminal_since: Optional[float] = None
+        while self.subscribers:
+            try:
+                events, terminal = await asyncio.to_thread(self._poll)
+            except Exception as e:
+                print(f"Failed to poll events of pipeline run {self.run_id}: {e}")
+                events, terminal = [], False
+            if events:
+                self.after_id = events[-1].id
+                for subscriber in list(self.subscribers):
+                    try:
+                        subscriber.put_nowait(events)
+                    except asyncio.QueueFull:
+                        self.subscribers.discard(subscriber) # Too slow; it ends and reconnects with Last-Event-ID
+            # Without a run_finished event (e.g. the executor died), stop once the run has been terminal
+            # for longer than the executors take to flush their last events.
+            if terminal and not events:
+                terminal_since = terminal_since or time.monotonic()
+                if time.monotonic() - terminal_since > 2 * settings.KG_PIPELINE_EVENT_FLUSH_SECONDS + settings.KG_PIPELINE_EVENT_POLL_SECONDS:
+                    break
+            elif not terminal:
+                terminal_since = None
+            if any(e.event_type == RUN_FINISHED_EVENT for e in events):
+                break
+            await asyncio.sleep(settings.KG_PIPELINE_EVENT_POLL_SECONDS)
+        self.finished = True
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+
+_run_tails: Dict[int, _RunEventTail] = {}
+
+def _subscribe(run_id: int, after_id: int) -> "asyncio.Queue":
+    tail = _run_tails.get(run_id)
+    queue: "asyncio.Queue" = asyncio.Queue(maxsize=100)
+    if tail is None or tail.finished:
+        tail = _RunEventTail(run_id, after_id)
+        _run_tails[run_id] = tail
+        tail.subscribers.add(queue)
+        task = asyncio.get_running_loop().create_task(tail.run())
+        task.add_done_callback(lambda _: _run_tails.pop(run_id, None) if _run_tails.get(run_id) is tail else None)
+    else:
+        tail.subscribers.add(queue)
+    return queue
+
+def _is_subscribed(run_id: int, queue: "asyncio.Queue") -> bool:
+    tail = _run_tails.get(run_id)
+    return tail is not None and queue in tail.subscribers
+
+def _unsubscribe(run_id: int, queue: "asyncio.Queue"):
+    tail = _run_tails.get(run_id)
+    if tail is not None:
+        tail.subscribers.discard(queue)
+
+async def stream_run_events(
+    run_id: int, after_id: int = 0, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events of a run: first the stored events after after_id (the client's Last-Event-ID),
+    then new events as they are flushed, until the run finishes or the client disconnects.
+    """
+    queue = _subscribe(run_id, after_id)
+    last_sent = after_id
+    try:
+        # Catch up from the table; the shared tail may already be past this client's position.
+        def load_backlog():
+            db: Session = SessionLocal()
+            try:
+                return crud_kg_pipeline_run_event.get_run_events(db, pipeline_run_id=run_id, after_id=after_id, limit=None)
+            finally:
+                db.close()
+
+        for event in await asyncio.to_thread(load_backlog):
+            last_sent = event.id
+            yield _format_sse(event)
+            if event.event_type == RUN_FINISHED_EVENT:
+                return
+        while True:
+            try:
+                events = await asyncio.wait_for(queue.get(), timeout=settings.KG_PIPELINE_EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if not _is_subscribed(run_id, queue) or (is_disconnected is not None and await is_disconnected()):
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            if events is None:
+                return
+            for event in events:
+                if event.id <= last_sent:
+                    continue # Already sent from the backlog
+                last_sent = event.id
+                yield _format_sse(event)
+    finally:
+        _unsubscribe(run_id, queue)
@@ -1,294 +1,841 @@
 import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
 from sqlalchemy.orm import Session
-from sqlalchemy import text as sqlalchemy_text # For raw SQL
-from app.db.session import SessionLocal, engine as main_app_engine # To create new sessions
-from typing import Any, Optional # Import Any and Optional
-from datetime import date, datetime, timezone # For date/datetime conversions
+from app.db.session import SessionLocal # To create new sessions
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
 
-from app.crud import crud_kg_pipeline, crud_kg_pipeline_task, crud_kg_pipeline_run, crud_data_source
+from app.crud import crud_kg_pipeline, crud_kg_pipeline_task, crud_kg_pipeline_run, crud_kg_pipeline_task_run, crud_kg_pipeline_dead_letter, crud_data_source, crud_kg_space_alias
 from app.api.v1.schemas import kg_pipeline_schemas, kg_pipeline_task_schemas, data_source_schemas as ds_schemas
-from app.db.nebula_connector import get_nebula_session
 from app.core.config import settings
+from app.services.kg_pipeline_extract_service import (
+    KeyRange, SourceExtractionError, get_primary_key_column,
+    iter_partitioned_row_chunks, plan_key_range_partitions, serialize_watermark, source_partition_capacity
+)
+from app.services.kg_pipeline_plan_service import ExtractionPlanError, plan_extraction
+from app.services.kg_pipeline_fingerprint_service import open_fingerprint_store
+from app.services.kg_pipeline_spool_service import BatchSpool
+from app.services.kg_pipeline_export_service import TaskCsvExporter, export_column_types, write_import_config
+from app.services.kg_pipeline_rebuild_service import (
+    SpaceRebuildError, drop_space, prepare_shadow_space, rebuild_shadow_indexes, shadow_space_name
+)
+from app.services.kg_pipeline_shared_scan_service import ScanSpec, SharedScan, plan_shared_scans
+from app.services.kg_pipeline_reconcile_service import DeletionSyncError, SeenKeyRecorder, sync_task_deletions
+from app.services.kg_pipeline_vid_index_service import VidIndexRecorder, get_referenced_vid_tag, open_dangling_edge_filter
+from app.services.kg_pipeline_event_service import ProgressReporter, RUN_FINISHED_EVENT, emit_run_event, flush_run_events
+from app.services.kg_pipeline_metrics_service import TaskRunMetrics, summarize_run_metrics
+from app.services.kg_pipeline_transform_service import (
+    TransformSpec, chunk_column, compile_row_transformer, discard_transform_executor, get_transform_executor,
+    iter_transformed, transform_rows_to_batches
+)
+from app.services.kg_pipeline_write_service import (
+    ChunkCommitTracker, NebulaInsertBatcher, NebulaWriteError, NebulaWriterPool, RowRateLimiter, get_task_option
+)
 
-# Helper to get a SQLAlchemy engine for a given DataSource
-# This is a simplified version; production might need more robust engine caching/management
-def get_dynamic_engine(ds: ds_schemas.DataSource):
-    if ds.type == ds_schemas.DataSourceType.MYSQL:
-        # Construct connection URL from ds.connection_params
-        # Ensure params like user, password, host, port, database exist
-        conn_params = ds.connection_params
-        db_url = (
-            f"mysql+mysqlclient://{conn_params.get('user')}:{conn_params.get('password')}"
-            f"@{conn_params.get('host')}:{conn_params.get('port', 3306)}"
-            f"/{conn_params.get('database')}"
-        )
-        return main_app_engine.execution_options().create_engine(db_url) # Use main engine options for consistency
-    # TODO: Add handlers for other DB types (PostgreSQL, etc.)
-    raise NotImplementedError(f"Data source type {ds.type} not supported for dynamic engine yet.")
-
-def format_nebula_value(value: Any, target_nebula_type: Optional[str] = None) -> str:
-    """Formats a Python value for nGQL, considering the target Nebula data type."""
-    if value is None:
-        return "NULL"
-
-    if target_nebula_type:
-        if target_nebula_type == "STRING":
-            # 修复反斜杠语法错误，拆分为多个部分
-            escaped_str = str(value).replace('\\', '\\\\').replace('"', '\\"')
-            return f"\"{escaped_str}\""
-        elif target_nebula_type in ["INT", "INT8", "INT16", "INT32", "INT64"]:
-            try:
-                return str(int(value))
-            except (ValueError, TypeError):
-                # print(f"Warning: Could not convert '{value}' to int for type {target_nebula_type}. Returning NULL.")
-                return "NULL" # Or raise error, or attempt string conversion
-        elif target_nebula_type in ["FLOAT", "DOUBLE"]:
-            try:
-                return str(float(value))
-            except (ValueError, TypeError):
-                # print(f"Warning: Could not convert '{value}' to float for type {target_nebula_type}. Returning NULL.")
-                return "NULL"
-        elif target_nebula_type == "BOOL":
-            if isinstance(value, bool):
-                return "true" if value else "false"
-            # Attempt to infer bool from common string/int representations
-            val_lower = str(value).lower()
-            if val_lower in ["true", "1", "yes", "t"]:
-                return "true"
-            elif val_lower in ["false", "0", "no", "f"]:
-                return "false"
-            # print(f"Warning: Could not convert '{value}' to bool for type {target_nebula_type}. Returning NULL.")
-            return "NULL"
-        elif target_nebula_type == "DATE":
-            # Expects Python date object or ISO format string "YYYY-MM-DD"
-            if isinstance(value, date):
-                return f"date(\"{value.isoformat()}\")"
-            try: # Attempt to parse from string if not already date object
-                parsed_date = datetime.strptime(str(value).split(' ')[0], '%Y-%m-%d').date()
-                return f"date(\"{parsed_date.isoformat()}\")"
-            except ValueError:
-                # print(f"Warning: Could not convert '{value}' to DATE. Expected YYYY-MM-DD or date object. Returning NULL.")
-                return "NULL"
-        elif target_nebula_type == "DATETIME":
-            # Expects Python datetime object or ISO format string "YYYY-MM-DDThh:mm:ss.ffffffZ"
-            if isinstance(value, datetime):
-                # Nebula typically wants UTC. Ensure datetime is timezone-aware or assume UTC.
-                dt_utc = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
-                return f"datetime(\"{dt_utc.isoformat(timespec='microseconds')}\")"
-            try:
-                # A more robust parser might be needed here for various datetime string formats
-                dt_obj = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
-                dt_utc = dt_obj if dt_obj.tzinfo else dt_obj.replace(tzinfo=timezone.utc)
-                return f"datetime(\"{dt_utc.isoformat(timespec='microseconds')}\")"
-            except ValueError:
-                # print(f"Warning: Could not convert '{value}' to DATETIME. Expected ISO format or datetime object. Returning NULL.")
-                return "NULL"
-        elif target_nebula_type == "TIMESTAMP":
-             # Expects an integer (Unix timestamp in seconds)
-            try:
-                ts = int(value)
-                return str(ts) # Nebula timestamps are just integers
-            except (ValueError, TypeError):
-                # print(f"Warning: Could not convert '{value}' to TIMESTAMP (integer seconds). Returning NULL.")
-                return "NULL"
-        # Add other types like DURATION, TIME if needed
-
-    # Default/Fallback (if no specific type or type not handled above, treat as string)
-    if isinstance(value, str):
-        escaped_str = value.replace('\\', '\\\\').replace('"', '\\"')
-        return f"\"{escaped_str}\""
-    elif isinstance(value, (int, float, bool)):
-        return str(value)
-    
-    # 最后的fallback
-    escaped_str = str(value).replace('\\', '\\\\').replace('"', '\\"')
-    return f"\"{escaped_str}\"" # Fallback: quote as string
+class PipelineRunContext:
+    """Run-wide settings and signals shared by all tasks of one pipeline run."""
+
+    def __init__(
+        self, run_id: int, target_kg_name: str, full_refresh: bool = False, bulk_export: bool = False,
+        stop_event: Optional[threading.Event] = None, rate_limiter: Optional[RowRateLimiter] = None
+    ):
+        self.run_id = run_id
+        self.target_kg_name = target_kg_name
+        self.full_refresh = full_refresh # Ignore task watermarks and re-read full sources
+        self.bulk_export = bulk_export # Write CSV files for nebula-importer instead of inserting into Nebula
+        self.stop_event = stop_event or threading.Event() # Set on cancellation or when another task failed
+        self.rate_limiter = rate_limiter # Pipeline-wide rows/sec cap shared by all task writers
+        self.shared_scans: Dict[int, SharedScan] = {} # Task ID -> scan group the task reads its source with
+        self.max_parallel_tasks = settings.KG_PIPELINE_MAX_PARALLEL_TASKS # Set by the run's task graph
 
-async def execute_pipeline_task(task_id: int, db_pipeline_run_id: int, target_kg_name: str, db: Session):
+class PipelineTaskError(Exception):
+    """A pipeline task failed; the message is recorded on the task run."""
+
+def _resolve_checkpoint_key_column(task, source_ds: ds_schemas.DataSource) -> Optional[str]:
+    """Unique column used to order the scan and checkpoint progress: execution option or the table's primary key."""
+    key_column = get_task_option(task, "checkpoint_key_column")
+    if key_column:
+        return key_column
+    return get_primary_key_column(source_ds, task.source_entity_identifier)
+
+def _execute_pipeline_task_sync(task_id: int, run_ctx: PipelineRunContext, db: Session) -> bool:
+    db_pipeline_run_id = run_ctx.run_id
     task = crud_kg_pipeline_task.get_kg_pipeline_task(db, task_id=task_id)
     if not task or not task.is_enabled:
         print(f"Task {task_id} not found or not enabled. Skipping.")
         return False
 
+    task_run = crud_kg_pipeline_task_run.get_or_create_task_run(db, pipeline_run_id=db_pipeline_run_id, task_id=task.id)
+    if task_run.status == kg_pipeline_schemas.KGPipelineTaskRunStatus.SUCCESS:
+        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name} already completed in this run. Skipping.")
+        emit_run_event(db_pipeline_run_id, "task_skipped", task_id=task.id, message="Task already completed in this run.")
+        return True
+
     print(f"[Run ID: {db_pipeline_run_id}] Starting Task: {task.task_name} (Order: {task.task_order})")
-    
+    crud_kg_pipeline_task_run.update_task_run_status(db, task_run, kg_pipeline_schemas.KGPipelineTaskRunStatus.RUNNING)
+    emit_run_event(
+        db_pipeline_run_id, "task_started", task_id=task.id, task_name=task.task_name,
+        target=task.target_label_or_type, resumed_rows=task_run.input_record_count
+    )
+    log_prefix = f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}:"
+    metrics = TaskRunMetrics() # Metrics of this attempt; stored on the task run
+    try:
+        if run_ctx.bulk_export:
+            _export_pipeline_task(task, task_run, run_ctx, db, log_prefix, metrics)
+        else:
+            _run_pipeline_task(task, task_run, run_ctx, db, log_prefix, metrics)
+    except PipelineTaskError as e:
+        print(f"{log_prefix} {e}")
+        metrics.finish()
+        crud_kg_pipeline_task_run.update_task_run_status(
+            db, task_run, kg_pipeline_schemas.KGPipelineTaskRunStatus.FAILED, error_message=str(e),
+            metrics=metrics.snapshot()
+        )
+        emit_run_event(db_pipeline_run_id, "task_failed", task_id=task.id, message=str(e))
+        return False
+    except Exception as e:
+        print(f"{log_prefix} Pipeline task failed: {e}")
+        metrics.finish()
+        crud_kg_pipeline_task_run.update_task_run_status(
+            db, task_run, kg_pipeline_schemas.KGPipelineTaskRunStatus.FAILED, error_message=str(e),
+            metrics=metrics.snapshot()
+        )
+        emit_run_event(db_pipeline_run_id, "task_failed", task_id=task.id, message=str(e))
+        return False
+
+    metrics.finish()
+    if run_ctx.stop_event.is_set():
+        crud_kg_pipeline_task_run.update_task_run_status(
+            db, task_run, kg_pipeline_schemas.KGPipelineTaskRunStatus.CANCELLED, metrics=metrics.snapshot()
+        )
+        emit_run_event(db_pipeline_run_id, "task_cancelled", task_id=task.id)
+        return False
+    task_metrics = metrics.snapshot()
+    crud_kg_pipeline_task_run.update_task_run_status(
+        db, task_run, kg_pipeline_schemas.KGPipelineTaskRunStatus.SUCCESS, metrics=task_metrics
+    )
+    emit_run_event(
+        db_pipeline_run_id, "task_succeeded", task_id=task.id,
+        rows_extracted=task_run.input_record_count, rows_written=task_run.output_record_count,
+        rows_dead_lettered=task_metrics["rows_dead_lettered"], elapsed_seconds=task_metrics["elapsed_seconds"],
+        rows_per_second=task_metrics["rows_per_second"]
+    )
+    print(
+        f"[Run ID: {db_pipeline_run_id}] Finished Task: {task.task_name} successfully in {task_metrics['elapsed_seconds']}s "
+        f"(extract {task_metrics['extract_seconds']}s, transform {task_metrics['transform_seconds']}s, "
+        f"waiting on writers {task_metrics['write_wait_seconds']}s, Nebula p99 {task_metrics['nebula_latency_ms']['p99']}ms)."
+    )
+    return True
+
+def _get_task_source(task, db: Session) -> ds_schemas.DataSource:
     source_ds_model = crud_data_source.get_data_source(db, task.source_data_source_id)
     if not source_ds_model:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Source DS {task.source_data_source_id} not found. Failing.")
-        return False
+        raise PipelineTaskError(f"Source DS {task.source_data_source_id} not found. Failing.")
     
     # Convert SQLAlchemy model to Pydantic schema for easier dict access if needed
     source_ds = ds_schemas.DataSource.from_orm(source_ds_model)
+    if source_ds.type != ds_schemas.DataSourceType.MYSQL:
+        raise PipelineTaskError(f"Data source type {source_ds.type} not yet supported for extraction.")
+    return source_ds
 
-    extracted_data = []
-    # 1. Data Extraction
-    if source_ds.type == ds_schemas.DataSourceType.MYSQL:
-        try:
-            dynamic_engine = get_dynamic_engine(source_ds)
-            with dynamic_engine.connect() as connection:
-                query = f"SELECT * FROM {task.source_entity_identifier}"
-                if task.filter_conditions:
-                    query += f" WHERE {task.filter_conditions}"
-                query += ";"
-                
-                print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Executing query: {query}")
-                result = connection.execute(sqlalchemy_text(query))
-                extracted_data = [dict(row) for row in result.mappings()] # Fetch as list of dicts
-                print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Extracted {len(extracted_data)} records.")
-        except Exception as e:
-            print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: MySQL data extraction failed: {e}")
-            return False
+def _compile_task_transformer(task, log_prefix: str):
+    # field_mappings are compiled once per task: converters and property headers are resolved up front.
+    try:
+        return compile_row_transformer(task, log_prefix=log_prefix)
+    except ValueError as e:
+        raise PipelineTaskError(f"{e} Failing.")
+
+def _plan_task_extraction(
+    task, source_ds: ds_schemas.DataSource, transform_row, key_column: Optional[str], watermark_from: Optional[str],
+    run_ctx: PipelineRunContext, log_prefix: str, metrics: TaskRunMetrics
+):
+    # Extraction plan: select only the mapped columns, validate the filter, and check the access path
+    # with EXPLAIN so filtered/incremental reads that scan the whole table get flagged.
+    try:
+        extraction_plan = plan_extraction(
+            source_ds, task, transform_row.source_columns, key_column, watermark_value=watermark_from,
+            project_columns=get_task_option(task, "project_columns", settings.KG_PIPELINE_PROJECT_COLUMNS),
+            index_option=get_task_option(task, "force_index"),
+        )
+    except ExtractionPlanError as e:
+        raise PipelineTaskError(f"{e} Failing.")
+    for warning in extraction_plan.warnings:
+        print(f"{log_prefix} Warning: {warning}")
+    if extraction_plan.full_scan or extraction_plan.filesort:
+        print(
+            f"{log_prefix} Warning: source scan is a {'full table scan' if extraction_plan.full_scan else 'filesort'} "
+            f"(~{extraction_plan.estimated_rows} rows). {extraction_plan.recommendation or ''}"
+        )
+    elif extraction_plan.recommendation:
+        print(f"{log_prefix} {extraction_plan.recommendation}")
+    metrics.set_info("extraction_plan", extraction_plan.summary())
+    emit_run_event(run_ctx.run_id, "extraction_plan", task_id=task.id, message=extraction_plan.recommendation, **extraction_plan.summary())
+    return extraction_plan
+
+def _plan_fresh_partitions(
+    task, source_ds: ds_schemas.DataSource, key_column: Optional[str], watermark_from: Optional[str],
+    run_ctx: PipelineRunContext, log_prefix: str
+) -> List[KeyRange]:
+    # The source engine's pool holds max_parallel_tasks x max_extract_partitions partition connections;
+    # a pipeline running more tasks in parallel gets fewer partitions per task instead of pool timeouts.
+    num_partitions = min(
+        int(get_task_option(task, "extract_partitions", settings.KG_PIPELINE_EXTRACT_PARTITIONS)),
+        settings.KG_PIPELINE_MAX_EXTRACT_PARTITIONS,
+        max(1, source_partition_capacity() // max(1, run_ctx.max_parallel_tasks)),
+    )
+    partitions = [KeyRange()]
+    if key_column and num_partitions > 1:
+        partitions = plan_key_range_partitions(source_ds, task, key_column, num_partitions, watermark_value=watermark_from)
+        print(f"{log_prefix} Reading {len(partitions)} key ranges of {key_column} in parallel: {partitions}")
+    return partitions
+
+def _run_pipeline_task(task, task_run, run_ctx: PipelineRunContext, db: Session, log_prefix: str, metrics: TaskRunMetrics):
+    """Extracts, transforms and writes one task. Raises PipelineTaskError on failure; returns early if the run is stopped."""
+    stop_event = run_ctx.stop_event
+    source_ds = _get_task_source(task, db)
+    transform_row = _compile_task_transformer(task, log_prefix)
+
+    # Rows sharing the same tag/edge and property list are packed into multi-value INSERT statements.
+    batch_max_rows = get_task_option(task, "batch_max_rows")
+    batch_max_bytes = get_task_option(task, "batch_max_bytes")
+    batcher = NebulaInsertBatcher(max_rows=batch_max_rows, max_bytes=batch_max_bytes)
+    # With a transform process pool, whole chunks are turned into batches by worker processes.
+    transform_executor = get_transform_executor() if get_task_option(task, "process_transform", True) else None
+    transform_spec = TransformSpec(task, log_prefix=log_prefix) if transform_executor else None
+    chunk_size = get_task_option(task, "fetch_chunk_size", settings.KG_PIPELINE_FETCH_CHUNK_SIZE)
+    # Columnar chunks are converted one column at a time instead of one cell at a time
+    columnar = bool(get_task_option(task, "columnar_transform", settings.KG_PIPELINE_COLUMNAR_TRANSFORM))
+
+    # Incremental mode: only rows past the last committed watermark, unless a full refresh was requested.
+    watermark_column = task.watermark_column
+    watermark_from = None if run_ctx.full_refresh else task.last_watermark_value
+    max_watermark = None
+
+    # Checkpointing: the scan is ordered by a unique key so a resumed run can continue after the
+    # last key whose rows are all in the graph. Without such a key the task restarts from row zero.
+    # With an integer key the scan can also be split into key ranges read in parallel; each range
+    # keeps its own resume position.
+    key_column = _resolve_checkpoint_key_column(task, source_ds)
+    extraction_plan = _plan_task_extraction(task, source_ds, transform_row, key_column, watermark_from, run_ctx, log_prefix, metrics)
+
+    if key_column and task_run.partition_checkpoints:
+        partitions = [KeyRange.from_dict(p) for p in task_run.partition_checkpoints]
+        print(f"{log_prefix} Resuming {len(partitions)} key ranges of {key_column} ({task_run.input_record_count} rows already loaded).")
+    elif key_column and task_run.checkpoint_key is not None:
+        partitions = [KeyRange(after_key=task_run.checkpoint_key)]
+        print(f"{log_prefix} Resuming after {key_column} = {task_run.checkpoint_key} ({task_run.input_record_count} rows already loaded).")
     else:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Data source type {source_ds.type} not yet supported for extraction.")
-        return False
+        if task_run.input_record_count:
+            print(f"{log_prefix} No checkpoint key column available; restarting task from the beginning.")
+        task_run = crud_kg_pipeline_task_run.reset_task_run_checkpoint(db, task_run)
+        partitions = _plan_fresh_partitions(task, source_ds, key_column, watermark_from, run_ctx, log_prefix)
+    # Fingerprints: rows whose VALUES are unchanged since they were last written are not sent again
+    # (for sources without a reliable watermark column). A full refresh writes every row and rebuilds the store.
+    fingerprint_store = None
+    if get_task_option(task, "skip_unchanged_rows", settings.KG_PIPELINE_SKIP_UNCHANGED_ROWS):
+        fingerprint_store = open_fingerprint_store(task, run_ctx.target_kg_name)
+    skip_unchanged = not run_ctx.full_refresh
+    # Deletion sync: record the key of every row read, to delete what disappeared from the source at the end.
+    # Only a complete read of the source tells which rows are gone, so incremental reads don't sync.
+    key_recorder = None
+    if get_task_option(task, "sync_deletions", settings.KG_PIPELINE_SYNC_DELETIONS):
+        if watermark_from is not None:
+            print(f"{log_prefix} Incremental read: skipping deletion sync (run with full_refresh to sync deletions).")
+        else:
+            key_recorder = SeenKeyRecorder(task, run_ctx.target_kg_name, run_ctx.run_id, fresh=not task_run.input_record_count)
+    # VID index: NODE tasks log the VIDs they load per tag; RELATIONSHIP tasks check both ends of their
+    # edges against it and record edges to vertices that were never loaded as dead letters.
+    vid_recorder = dangling_filter = None
+    if get_task_option(task, "vid_index", settings.KG_PIPELINE_VID_INDEX):
+        if task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            vid_recorder = VidIndexRecorder(task, run_ctx.target_kg_name, run_ctx.run_id, fresh=not task_run.input_record_count)
+        else:
+            dangling_filter = open_dangling_edge_filter(task, run_ctx.target_kg_name, log_prefix)
+    # Spool: transformed batches are appended to local spool files and a feeder thread passes them to the
+    # writers at graphd's pace, so a slow graphd does not hold the source scan open. Chunks spooled by an
+    # earlier attempt of this run but not written yet are replayed instead of being read again; not when
+    # the task records keys or VIDs, which the spool does not keep for rows it does not write.
+    spool = replay = None
+    if get_task_option(task, "spool", settings.KG_PIPELINE_SPOOL):
+        spool = BatchSpool(task, run_ctx.run_id, log_prefix)
+        if key_column and key_recorder is None and vid_recorder is None:
+            replay = spool.recover(task_run.input_record_count)
+        else:
+            spool.reset()
+        if replay is not None:
+            partitions = [KeyRange.from_dict(r) for r in replay.checkpoint["ranges"]]
+            print(
+                f"{log_prefix} Replaying {replay.batches} spooled batches ({replay.rows} rows); "
+                f"reading the source again after them."
+            )
+    # Shared scan: tasks reading the same source table in this run receive the chunks of one scan.
+    subscription = None
+    shared_scan = run_ctx.shared_scans.get(task.id)
+    if shared_scan is not None:
+        subscription = shared_scan.join(task.id, ScanSpec(
+            task, source_ds, key_column, partitions, watermark_from, columnar, chunk_size,
+            extraction_plan.columns, extraction_plan.index_hint, resuming=bool(task_run.input_record_count) or replay is not None
+        ), stop_event)
+        if subscription is not None:
+            partitions = subscription.partitions # Checkpoints follow the key ranges of the shared scan
+            metrics.set_info("shared_scan_tasks", subscription.members)
+    rows_extracted = task_run.input_record_count
+    rows_written_before = task_run.output_record_count # Written by earlier attempts of this run
+    rows_transformed = task_run.input_record_count # Rows of chunks whose batches were all submitted
+    rows_submitted = task_run.output_record_count
+    if replay is not None:
+        rows_extracted = rows_transformed = replay.checkpoint["rows_transformed"]
+        rows_submitted = replay.checkpoint["rows_submitted"]
+        max_watermark = replay.checkpoint["max_watermark"]
+        metrics.incr("rows_replayed", replay.rows)
+    partition_positions = [p.after_key for p in partitions] # Last key read per range
+    sealed_max_watermark = max_watermark # Newest watermark of the chunks sealed so far (kept in the spool)
+    progress = ProgressReporter(
+        run_ctx.run_id, task.id, rows_done=rows_extracted,
+        estimated_rows=extraction_plan.estimated_rows
+    )
 
-    if not extracted_data:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: No data extracted. Task considered successful but did nothing.")
-        return True
+    commit_tracker = ChunkCommitTracker(first_seq=replay.first_chunk_seq if replay is not None else 0)
+    if replay is not None:
+        replay.prime(commit_tracker)
 
-    # 2. Data Transformation and nGQL Generation (simplified)
-    # For batching, collect nGQL queries and execute in chunks.
-    ngql_queries = []
-    print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Generating nGQL queries...")
-
-    if task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
-        tag_name = task.target_label_or_type
-        vid_col_mapping = task.field_mappings.get("vertex_id_column") # This might be just a string or a dict with type too
-        # Assuming vid_col_mapping is just the column name string for now for VID.
-        # Nebula Vertex IDs can be string or INT64. If INT64, it should be handled by format_nebula_value.
-        vid_col = vid_col_mapping if isinstance(vid_col_mapping, str) else vid_col_mapping.get("name")
-        vid_nebula_type = "INT64" if isinstance(vid_col_mapping, dict) and vid_col_mapping.get("type") == "INT64" else "STRING"
-
-        prop_map_config = task.field_mappings.get("properties", {})
-        if not vid_col:
-            print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: 'vertex_id_column' not in field_mappings. Failing.")
-            return False
+    def batch_written(batch):
+        if fingerprint_store is not None:
+            fingerprint_store.stage(batch.accepted_fingerprints())
+        commit_tracker.batch_written(batch)
 
-        for row in extracted_data:
-            raw_vid = row.get(vid_col)
-            if raw_vid is None:
-                continue
-            
-            formatted_vid = format_nebula_value(raw_vid, vid_nebula_type)
-            if formatted_vid == "NULL": # Cannot have NULL Vertex ID
-                print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: NULL Vertex ID from column '{vid_col}' for value '{raw_vid}'. Skipping.")
-                continue
-
-            props_to_insert = {}
-            prop_names_ordered = []
-            prop_values_ordered = []
-            for src_col, target_mapping in prop_map_config.items():
-                if src_col in row:
-                    target_prop_name = target_mapping.get("target_property")
-                    target_prop_type = target_mapping.get("type") # Nebula type from mapping
-                    formatted_val = format_nebula_value(row[src_col], target_prop_type)
-                    # Only include non-NULL properties, or handle as per schema requirements
-                    if formatted_val != "NULL": 
-                        props_to_insert[target_prop_name] = formatted_val 
-                        prop_names_ordered.append(f"`{target_prop_name}`")
-                        prop_values_ordered.append(formatted_val)
-            
-            if not prop_names_ordered: # No properties to insert
-                ngql = f"INSERT VERTEX `{tag_name}` () VALUES {formatted_vid}:();"
+    def save_checkpoint():
+        # Dead letters are stored before the checkpoint that covers their chunks
+        if dangling_filter is not None:
+            dangling = dangling_filter.pop_dead_letters()
+            if dangling:
+                crud_kg_pipeline_dead_letter.create_dead_letters(
+                    db, pipeline_run_id=run_ctx.run_id, task_id=task.id, dead_letters=dangling
+                )
+                emit_run_event(
+                    run_ctx.run_id, "dangling_edges", task_id=task.id, message=dangling[-1].error_message,
+                    rows=len(dangling), total_rows=dangling_filter.rows_dangling
+                )
+        dead_letters = writer_pool.pop_dead_letters()
+        if dead_letters:
+            crud_kg_pipeline_dead_letter.create_dead_letters(
+                db, pipeline_run_id=run_ctx.run_id, task_id=task.id, dead_letters=dead_letters
+            )
+            emit_run_event(
+                run_ctx.run_id, "rows_dead_lettered", task_id=task.id, message=dead_letters[-1].error_message,
+                rows=len(dead_letters), total_rows=writer_pool.rows_dead_lettered
+            )
+        if fingerprint_store is not None:
+            fingerprint_store.commit() # Before the checkpoint that covers the rows
+        if key_recorder is not None:
+            key_recorder.sync()
+        if vid_recorder is not None:
+            vid_recorder.sync()
+        committed = commit_tracker.pop_committed()
+        if committed is not None:
+            input_count, output_count, positions = committed
+            if spool is not None:
+                spool.release(input_count)
+            if len(partitions) == 1:
+                checkpoint_key, partition_checkpoints = positions[0], None
             else:
-                prop_names_str = ", ".join(prop_names_ordered)
-                prop_values_str = ", ".join(prop_values_ordered)
-                ngql = f"INSERT VERTEX `{tag_name}` ({prop_names_str}) VALUES {formatted_vid}:({prop_values_str});"
-            ngql_queries.append(ngql)
-
-    elif task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.RELATIONSHIP:
-        edge_name = task.target_label_or_type
-        # Assume src/dst VID columns also specify their type (STRING or INT64)
-        src_vid_col_map = task.field_mappings.get("source_vid_column")
-        dst_vid_col_map = task.field_mappings.get("destination_vid_column")
-        
-        src_vid_col = src_vid_col_map if isinstance(src_vid_col_map, str) else src_vid_col_map.get("name")
-        src_vid_type = "INT64" if isinstance(src_vid_col_map, dict) and src_vid_col_map.get("type") == "INT64" else "STRING"
-        dst_vid_col = dst_vid_col_map if isinstance(dst_vid_col_map, str) else dst_vid_col_map.get("name")
-        dst_vid_type = "INT64" if isinstance(dst_vid_col_map, dict) and dst_vid_col_map.get("type") == "INT64" else "STRING"
+                checkpoint_key = None
+                partition_checkpoints = [
+                    KeyRange(p.start, p.end, after_key=position).to_dict() for p, position in zip(partitions, positions)
+                ]
+            crud_kg_pipeline_task_run.update_task_run_checkpoint(
+                db, task_run, input_record_count=input_count, output_record_count=output_count,
+                checkpoint_key=checkpoint_key, partition_checkpoints=partition_checkpoints,
+                metrics=metrics.snapshot()
+            )
 
-        rank_col_map = task.field_mappings.get("rank_column") # rank is always INT64
-        rank_col = rank_col_map if isinstance(rank_col_map, str) else rank_col_map.get("name") if rank_col_map else None
-        
-        prop_map_config = task.field_mappings.get("properties", {})
+    # Extraction, transformation and writes run as one streaming pipeline:
+    # source chunk -> nGQL VALUES items -> full batches go onto a bounded queue drained by
+    # N writer workers, each with its own Nebula session. A full queue blocks the extractor.
+    writer_pool = NebulaWriterPool(
+        space_name=run_ctx.target_kg_name,
+        num_workers=get_task_option(task, "writer_workers"),
+        queue_size=get_task_option(task, "writer_queue_size"),
+        log_prefix=log_prefix,
+        on_batch_written=batch_written,
+        metrics=metrics,
+        rate_limiter=run_ctx.rate_limiter,
+        max_retries=get_task_option(task, "write_max_retries"),
+        max_error_rate=get_task_option(task, "max_error_rate"),
+    )
+    # Adaptive writes: batch size and in-flight statements follow graphd latency (AIMD) within the configured ceilings
+    write_controller = None
+    if get_task_option(task, "adaptive_writes", settings.KG_PIPELINE_ADAPTIVE_WRITES):
+        write_controller = writer_pool.enable_adaptive(max_batch_rows=batcher.max_rows)
+        batcher.controller = write_controller
+    write_wait = 0.0 # Time the current chunk spent blocked on a full writer queue
 
-        if not src_vid_col or not dst_vid_col:
-            print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Missing source/destination VID column. Failing.")
+    def submit(batch, chunk_seq: int) -> bool:
+        nonlocal rows_submitted, write_wait
+        batch.chunk_seq = chunk_seq
+        commit_tracker.batch_submitted(chunk_seq)
+        started = time.perf_counter()
+        if spool is not None:
+            spool.append_batch(batch)
+            submitted = not writer_pool.failed
+        else:
+            submitted = writer_pool.submit(batch)
+        write_wait += time.perf_counter() - started
+        if not submitted:
             return False
+        rows_submitted += batch.row_count
+        return True
 
-        for row in extracted_data:
-            raw_src_vid = row.get(src_vid_col)
-            raw_dst_vid = row.get(dst_vid_col)
-            
-            if raw_src_vid is None or raw_dst_vid is None:
-                continue
-
-            src_vid = format_nebula_value(raw_src_vid, src_vid_type)
-            dst_vid = format_nebula_value(raw_dst_vid, dst_vid_type)
-
-            if src_vid == "NULL" or dst_vid == "NULL":
-                print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: NULL source or destination Vertex ID after formatting. Skipping.")
-                continue
-
-            rank_str = ""
-            if rank_col and row.get(rank_col) is not None:
-                rank_val = format_nebula_value(row.get(rank_col), "INT64") # Nebula rank is int
-                if rank_val != "NULL":
-                    rank_str = f"@{rank_val}"
-
-            props_to_insert = {}
-            prop_names_ordered = []
-            prop_values_ordered = []
-
-            for src_col, target_mapping in prop_map_config.items():
-                if src_col in row:
-                    target_prop_name = target_mapping.get("target_property")
-                    target_prop_type = target_mapping.get("type")
-                    formatted_val = format_nebula_value(row[src_col], target_prop_type)
-                    if formatted_val != "NULL":
-                        props_to_insert[target_prop_name] = formatted_val
-                        prop_names_ordered.append(f"`{target_prop_name}`")
-                        prop_values_ordered.append(formatted_val)
-            
-            if not prop_names_ordered:
-                ngql = f"INSERT EDGE `{edge_name}` () VALUES {src_vid} -> {dst_vid}{rank_str}:();"
+    def seal_chunk(chunk_seq: int, partition_index: int, row_count: int, last_key: Any, chunk_max: Any):
+        """All batches of a chunk are submitted; its checkpoint commits once they are written."""
+        nonlocal rows_transformed, sealed_max_watermark
+        rows_transformed += row_count
+        if last_key is not None:
+            partition_positions[partition_index] = serialize_watermark(last_key)
+        if chunk_max is not None and (sealed_max_watermark is None or chunk_max > sealed_max_watermark):
+            sealed_max_watermark = chunk_max
+        if spool is not None:
+            spool.append_seal(chunk_seq, {
+                "rows_transformed": rows_transformed, "rows_submitted": rows_submitted, "chunk_rows": row_count,
+                "positions": list(partition_positions), "max_watermark": sealed_max_watermark,
+                "ranges": [KeyRange(p.start, p.end, after_key=position).to_dict() for p, position in zip(partitions, partition_positions)],
+            })
+        commit_tracker.seal(chunk_seq, (rows_transformed, rows_submitted, list(partition_positions)))
+        save_checkpoint()
+
+    # Chunks sent to the transform pool: (seq, partition, row count, last key, future, max watermark), in seq order
+    pending_transforms: Deque[Tuple[int, int, int, Any, Any, Any]] = deque()
+    max_pending_transforms = 2 * settings.KG_PIPELINE_TRANSFORM_PROCESSES
+
+    def finish_oldest_transform():
+        nonlocal write_wait
+        chunk_seq, partition_index, row_count, last_key, future, chunk_max = pending_transforms.popleft()
+        started = time.perf_counter()
+        batches, rows_skipped = future.result()
+        metrics.add_stage_time("transform", time.perf_counter() - started) # Time blocked on the pool
+        metrics.incr("rows_skipped", rows_skipped)
+        if key_recorder is not None:
+            key_recorder.record(item for batch in batches for item in batch.items)
+        if vid_recorder is not None:
+            vid_recorder.record(item for batch in batches for item in batch.items)
+        if dangling_filter is not None or fingerprint_store is not None:
+            # Drop dangling edges / unchanged rows and re-batch the rest, so statements stay full
+            transformed_rows = ((batch.prefix, item) for batch in batches for item in batch.items)
+            if dangling_filter is not None:
+                transformed_rows = dangling_filter.filter(transformed_rows)
+            if fingerprint_store is not None:
+                transformed_rows = fingerprint_store.filter_changed(transformed_rows, skip_unchanged=skip_unchanged)
+            batches = [batch for transformed in transformed_rows for batch in batcher.add(*transformed)] + batcher.flush()
+        write_wait = 0.0
+        for batch in batches:
+            submit(batch, chunk_seq)
+        metrics.add_stage_time("write_wait", write_wait)
+        seal_chunk(chunk_seq, partition_index, row_count, last_key, chunk_max)
+
+    print(
+        f"{log_prefix} Reading {task.source_entity_identifier} (chunk size {chunk_size}, {writer_pool.num_workers} writers"
+        f"{', process transform' if transform_executor else ''})"
+    )
+    writer_pool.start()
+    if spool is not None:
+        spool.start_feeding(writer_pool.submit) # Replayed batches first
+    if subscription is not None:
+        source_chunks = subscription
+    else:
+        source_chunks = iter_partitioned_row_chunks(
+            source_ds, task, key_column, partitions, chunk_size, watermark_value=watermark_from, columnar=columnar,
+            columns=extraction_plan.columns, index_hint=extraction_plan.index_hint
+        )
+    try:
+        try:
+            first_chunk_seq = replay.next_chunk_seq if replay is not None else 0
+            for chunk_seq, (partition_index, chunk) in enumerate(metrics.timed_iter("extract", source_chunks), first_chunk_seq):
+                chunk_started = time.perf_counter()
+                write_wait = 0.0
+                rows_extracted += len(chunk)
+                metrics.incr("rows_extracted", len(chunk))
+                metrics.incr("chunks_extracted")
+                chunk_max = None
+                if watermark_column:
+                    chunk_max = max((v for v in chunk_column(chunk, watermark_column) if v is not None), default=None)
+                    if chunk_max is not None and (max_watermark is None or chunk_max > max_watermark):
+                        max_watermark = chunk_max
+                last_key = chunk_column(chunk, key_column)[-1] if key_column else None
+                if transform_executor:
+                    future = transform_executor.submit(
+                        transform_rows_to_batches, transform_spec, chunk,
+                        write_controller.batch_rows if write_controller else batch_max_rows, batch_max_bytes
+                    )
+                    pending_transforms.append((chunk_seq, partition_index, len(chunk), last_key, future, chunk_max))
+                    # Results are consumed in chunk order, keeping a bounded number of chunks in flight
+                    while pending_transforms and (
+                        len(pending_transforms) > max_pending_transforms or pending_transforms[0][4].done()
+                    ):
+                        finish_oldest_transform()
+                else:
+                    transformed_rows = iter_transformed(transform_row, chunk)
+                    if key_recorder is not None:
+                        transformed_rows = key_recorder.tap(transformed_rows)
+                    if vid_recorder is not None:
+                        transformed_rows = vid_recorder.tap(transformed_rows)
+                    if dangling_filter is not None:
+                        transformed_rows = dangling_filter.filter(transformed_rows)
+                    if fingerprint_store is not None:
+                        transformed_rows = fingerprint_store.filter_changed(transformed_rows, skip_unchanged=skip_unchanged)
+                    for transformed in transformed_rows:
+                        for batch in batcher.add(*transformed):
+                            submit(batch, chunk_seq)
+                    # Close the chunk's partial batches so each checkpoint covers whole chunks.
+                    for batch in batcher.flush():
+                        submit(batch, chunk_seq)
+                    metrics.add_stage_time("transform", time.perf_counter() - chunk_started - write_wait)
+                    metrics.add_stage_time("write_wait", write_wait)
+                    seal_chunk(chunk_seq, partition_index, len(chunk), last_key, chunk_max)
+                if writer_pool.failed:
+                    # One failed batch fails the whole task; stop reading the source.
+                    break
+                if stop_event.is_set():
+                    print(f"{log_prefix} Run cancelled or aborted. Stopping task.")
+                    break
+                print(f"{log_prefix} Extracted {rows_extracted} records so far, {writer_pool.rows_written} written in this attempt.")
+                progress.report(rows_extracted, rows_written_before + writer_pool.rows_written)
             else:
-                prop_names_str = ", ".join(prop_names_ordered)
-                prop_values_str = ", ".join(prop_values_ordered)
-                ngql = f"INSERT EDGE `{edge_name}` ({prop_names_str}) VALUES {src_vid} -> {dst_vid}{rank_str}:({prop_values_str});"
-            ngql_queries.append(ngql)
+                while pending_transforms:
+                    finish_oldest_transform()
+                if spool is not None:
+                    # The source is read; keep checkpointing while the writers catch up with the spool
+                    source_chunks.close()
+                    spool.finish()
+                    while not spool.wait(timeout=settings.KG_PIPELINE_PROGRESS_EVENT_SECONDS) and not stop_event.is_set():
+                        save_checkpoint()
+                        progress.report(rows_extracted, rows_written_before + writer_pool.rows_written)
+        finally:
+            for pending in pending_transforms:
+                pending[4].cancel() # Leaving early: drop chunks not yet transformed
+            source_chunks.close() # Stops partition readers (or leaves the shared scan) when leaving early
+            metrics.incr("rows_skipped", transform_row.rows_skipped)
+            if fingerprint_store is not None:
+                metrics.incr("rows_unchanged", fingerprint_store.rows_unchanged)
+            if dangling_filter is not None:
+                metrics.incr("rows_dangling", dangling_filter.rows_dangling)
+            if spool is not None:
+                spool.close()
+            writer_pool.close()
+            if write_controller is not None:
+                metrics.set_info("adaptive_writes", write_controller.snapshot())
+    except SourceExtractionError as e:
+        metrics.incr("extraction_errors")
+        raise PipelineTaskError(f"MySQL data extraction failed: {e}")
+    except NebulaWriteError as e:
+        raise PipelineTaskError(f"Nebula Graph write failed ({len(e.errors)} writer error(s)): {e}")
+    except BrokenProcessPool as e:
+        discard_transform_executor(transform_executor)
+        raise PipelineTaskError(f"Transform worker process died: {e}")
+    finally:
+        save_checkpoint() # Persist whatever became fully written, also when the task failed
+        if fingerprint_store is not None:
+            fingerprint_store.close()
+        if key_recorder is not None:
+            key_recorder.close()
+        if vid_recorder is not None:
+            vid_recorder.close()
+    if stop_event.is_set():
+        return
+    if spool is not None:
+        spool.discard()
+
+    if not rows_extracted:
+        print(f"{log_prefix} No data extracted. Task considered successful but did nothing.")
+    elif not writer_pool.statements_sent:
+        print(f"{log_prefix} No nGQL queries generated.")
     else:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Unsupported mapping type: {task.mapping_type}")
-        return False
+        print(f"{log_prefix} Successfully executed {writer_pool.statements_sent} nGQL statements ({writer_pool.rows_written} rows written in this attempt, {rows_extracted} extracted in total).")
+    if writer_pool.rows_dead_lettered:
+        print(f"{log_prefix} {writer_pool.rows_dead_lettered} rows were rejected by Nebula and recorded as dead letters.")
+    if dangling_filter is not None and dangling_filter.rows_dangling:
+        print(f"{log_prefix} {dangling_filter.rows_dangling} edges point to vertices that were never loaded; recorded as dead letters.")
+
+    if key_recorder is not None:
+        # Deleted rows lose their fingerprints, so a row re-inserted with the same values is written again
+        forget_store = open_fingerprint_store(task, run_ctx.target_kg_name) if fingerprint_store is not None else None
+        try:
+            rows_deleted = sync_task_deletions(
+                task, key_recorder, run_ctx.target_kg_name, log_prefix=log_prefix, rate_limiter=run_ctx.rate_limiter,
+                fingerprint_store=forget_store
+            )
+        except DeletionSyncError as e:
+            raise PipelineTaskError(f"Deletion sync failed: {e}")
+        finally:
+            if forget_store is not None:
+                forget_store.close()
+        metrics.incr("rows_deleted", rows_deleted)
+        if rows_deleted:
+            emit_run_event(run_ctx.run_id, "rows_deleted", task_id=task.id, rows=rows_deleted)
+    if vid_recorder is not None:
+        indexed = vid_recorder.commit(replace=watermark_from is None)
+        print(f"{log_prefix} VID index of tag `{task.target_label_or_type}` updated ({indexed} VIDs logged by this task).")
+
+    if watermark_column and max_watermark is not None:
+        # Every row up to max_watermark is now in the graph; the next run starts after it.
+        new_watermark = serialize_watermark(max_watermark)
+        crud_kg_pipeline_task.update_kg_pipeline_task_watermark(db, task_id=task.id, watermark_value=new_watermark)
+        print(f"{log_prefix} Committed watermark {watermark_column} = {new_watermark}.")
+
+def _export_pipeline_task(task, task_run, run_ctx: PipelineRunContext, db: Session, log_prefix: str, metrics: TaskRunMetrics):
+    """
+    Bulk export mode: extracts and transforms one task like _run_pipeline_task, but writes the rows to CSV
+    files for nebula-importer (see kg_pipeline_export_service) instead of Nebula. An interrupted export
+    starts over, since the files are only complete once the task finished.
+    """
+    stop_event = run_ctx.stop_event
+    source_ds = _get_task_source(task, db)
+    transform_row = _compile_task_transformer(task, log_prefix)
+    try:
+        column_types = export_column_types(task)
+    except ValueError as e:
+        raise PipelineTaskError(f"{e} Failing.")
+    chunk_size = get_task_option(task, "fetch_chunk_size", settings.KG_PIPELINE_FETCH_CHUNK_SIZE)
+    columnar = bool(get_task_option(task, "columnar_transform", settings.KG_PIPELINE_COLUMNAR_TRANSFORM))
+    watermark_column = task.watermark_column
+    watermark_from = None if run_ctx.full_refresh else task.last_watermark_value
+    max_watermark = None
+    key_column = _resolve_checkpoint_key_column(task, source_ds)
+    extraction_plan = _plan_task_extraction(task, source_ds, transform_row, key_column, watermark_from, run_ctx, log_prefix, metrics)
+    task_run = crud_kg_pipeline_task_run.reset_task_run_checkpoint(db, task_run)
+    partitions = _plan_fresh_partitions(task, source_ds, key_column, watermark_from, run_ctx, log_prefix)
+
+    exporter = TaskCsvExporter(task, run_ctx.run_id, transform_row.export_header, log_prefix)
+    progress = ProgressReporter(run_ctx.run_id, task.id, rows_done=0, estimated_rows=extraction_plan.estimated_rows)
+    rows_extracted = 0
+    print(f"{log_prefix} Exporting {task.source_entity_identifier} to {exporter.directory} (chunk size {chunk_size})")
+    source_chunks = iter_partitioned_row_chunks(
+        source_ds, task, key_column, partitions, chunk_size, watermark_value=watermark_from, columnar=columnar,
+        columns=extraction_plan.columns, index_hint=extraction_plan.index_hint
+    )
+    try:
+        for _, chunk in metrics.timed_iter("extract", source_chunks):
+            chunk_started = time.perf_counter()
+            rows_extracted += len(chunk)
+            metrics.incr("rows_extracted", len(chunk))
+            metrics.incr("chunks_extracted")
+            if watermark_column:
+                chunk_max = max((v for v in chunk_column(chunk, watermark_column) if v is not None), default=None)
+                if chunk_max is not None and (max_watermark is None or chunk_max > max_watermark):
+                    max_watermark = chunk_max
+            metrics.incr("rows_exported", exporter.write_rows(transform_row.iter_export_rows(chunk)))
+            metrics.add_stage_time("transform", time.perf_counter() - chunk_started)
+            if stop_event.is_set():
+                print(f"{log_prefix} Run cancelled or aborted. Stopping task.")
+                return
+            progress.report(rows_extracted, exporter.rows_written)
+    except SourceExtractionError as e:
+        metrics.incr("extraction_errors")
+        raise PipelineTaskError(f"MySQL data extraction failed: {e}")
+    finally:
+        source_chunks.close()
+        exporter.close()
+        metrics.incr("rows_skipped", transform_row.rows_skipped)
+
+    exporter.write_manifest(column_types)
+    crud_kg_pipeline_task_run.update_task_run_checkpoint(
+        db, task_run, input_record_count=rows_extracted, output_record_count=exporter.rows_written,
+        checkpoint_key=None, partition_checkpoints=None, metrics=metrics.snapshot()
+    )
+    print(f"{log_prefix} Exported {exporter.rows_written} rows ({rows_extracted} extracted) to {len(exporter.files)} CSV files.")
+    if watermark_column and max_watermark is not None:
+        # The next run (exported or written) starts after the rows in these files
+        new_watermark = serialize_watermark(max_watermark)
+        crud_kg_pipeline_task.update_kg_pipeline_task_watermark(db, task_id=task.id, watermark_value=new_watermark)
+        print(f"{log_prefix} Committed watermark {watermark_column} = {new_watermark}.")
+
+async def execute_pipeline_task(
+    task_id: int, db_pipeline_run_id: int, target_kg_name: str, db: Session,
+    stop_event: Optional[threading.Event] = None, full_refresh: bool = False
+):
+    """Runs a pipeline task in a worker thread so extraction and Nebula writes never block the event loop."""
+    run_ctx = PipelineRunContext(db_pipeline_run_id, target_kg_name, full_refresh=full_refresh, stop_event=stop_event)
+    return await asyncio.to_thread(_execute_pipeline_task_sync, task_id, run_ctx, db)
+
+def _execute_pipeline_task_in_new_session(task_id: int, run_ctx: PipelineRunContext) -> bool:
+    """Worker-thread entry point for tasks run concurrently: each one gets its own DB session."""
+    task_db: Session = SessionLocal()
+    try:
+        return _execute_pipeline_task_sync(task_id, run_ctx, task_db)
+    finally:
+        task_db.close()
+
+def build_task_dependency_graph(tasks: List[Any]) -> Dict[int, Set[int]]:
+    """
+    Builds the dependency DAG of a pipeline's tasks, as {task_id: {ids of tasks it must wait for}}.
+    - NODE tasks writing the same tag keep their task_order; NODE tasks on different tags are independent.
+    - RELATIONSHIP tasks wait for the NODE tasks of the tags their source/destination VID mappings
+      reference ("tag" key). If a side does not declare its tag, the task waits for all NODE tasks.
+    - RELATIONSHIP tasks writing the same edge type keep their task_order.
+    NODE tasks never wait for RELATIONSHIP tasks, and same-type edges only point backwards in
+    task_order, so the graph is acyclic.
+    """
+    ordered = sorted(tasks, key=lambda t: t.task_order)
+    node_tasks = [t for t in ordered if t.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE]
+    deps: Dict[int, Set[int]] = {t.id: set() for t in ordered}
 
-    # 3. Connect to Nebula Graph and write data (batch execution recommended for large data)
-    if ngql_queries:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Executing {len(ngql_queries)} nGQL queries...")
-        # For actual batching, group queries into larger statements or send in chunks
-        # E.g., INSERT VERTEX tag1(p1,p2) VALUES "v1":(val1,val2), "v2":(val3,val4);
-        # This simplified version executes one by one.
+    for index, task in enumerate(ordered):
+        earlier_same_target = [
+            t.id for t in ordered[:index]
+            if t.mapping_type == task.mapping_type and t.target_label_or_type == task.target_label_or_type
+        ]
+        deps[task.id].update(earlier_same_target)
+
+        if task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.RELATIONSHIP:
+            field_mappings = task.field_mappings or {}
+            referenced_tags = {
+                get_referenced_vid_tag(field_mappings.get("source_vid_column")),
+                get_referenced_vid_tag(field_mappings.get("destination_vid_column")),
+            }
+            if None in referenced_tags:
+                deps[task.id].update(t.id for t in node_tasks)
+            else:
+                deps[task.id].update(t.id for t in node_tasks if t.target_label_or_type in referenced_tags)
+    return deps
+
+async def _watch_run_cancellation(db_pipeline_run_id: int, stop_event: threading.Event, done_event: asyncio.Event):
+    """
+    Polls the run row on a fixed interval and sets stop_event once the run has been CANCELLED. Each poll
+    also bumps the row's updated_at, the heartbeat the scheduler uses to tell live runs from abandoned ones.
+    """
+    def is_cancelled() -> bool:
+        watch_db: Session = SessionLocal()
+        try:
+            crud_kg_pipeline_run.touch_kg_pipeline_run(watch_db, run_id=db_pipeline_run_id)
+            run = crud_kg_pipeline_run.get_kg_pipeline_run(watch_db, run_id=db_pipeline_run_id)
+            return bool(run and run.status == kg_pipeline_schemas.KGPipelineRunStatus.CANCELLED)
+        finally:
+            watch_db.close()
+
+    while not done_event.is_set():
+        try:
+            await asyncio.wait_for(done_event.wait(), timeout=settings.KG_PIPELINE_CANCEL_POLL_SECONDS)
+            return
+        except asyncio.TimeoutError:
+            pass
         try:
-            with get_nebula_session(space_name=target_kg_name) as nebula_session:
-                for i, query in enumerate(ngql_queries):
-                    # print(f"Executing nGQL ({i+1}/{len(ngql_queries)}): {query}") # Can be too verbose
-                    resp = nebula_session.execute(query)
-                    if not resp.is_succeeded():
-                        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: nGQL query failed: {query}. Error: {resp.error_msg()}")
-                        # Decide if one failed query should fail the whole task
-                        # For now, let's assume it does.
-                        return False 
-                print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Successfully executed {len(ngql_queries)} nGQL queries.")
+            if await asyncio.to_thread(is_cancelled):
+                print(f"Run {db_pipeline_run_id} was cancelled. Stopping task execution.")
+                stop_event.set()
+                return
         except Exception as e:
-            print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: Nebula Graph operation failed: {e}")
-            return False
-    else:
-        print(f"[Run ID: {db_pipeline_run_id}] Task {task.task_name}: No nGQL queries generated.")
+            print(f"Failed to check cancellation status of run {db_pipeline_run_id}: {e}")
 
-    print(f"[Run ID: {db_pipeline_run_id}] Finished Task: {task.task_name} successfully.")
-    return True
+async def _run_task_graph(pipeline, tasks: List[Any], run_ctx: PipelineRunContext) -> bool:
+    """
+    Runs the enabled tasks of a pipeline as a DAG (see build_task_dependency_graph): a task starts as soon
+    as all its dependencies succeeded, with at most max_parallel_tasks tasks running at once.
+    Tasks sharing a source scan (see plan_shared_scans) run as one unit: they wait for the dependencies
+    of all members and together take one of the max_parallel_tasks slots.
+    The first failure sets stop_event, which stops running tasks and keeps new ones from starting.
+    """
+    db_pipeline_run_id = run_ctx.run_id
+    stop_event = run_ctx.stop_event
+    deps = build_task_dependency_graph(tasks)
+    pipeline_options = pipeline.execution_options or {}
+    max_parallel = max(1, int(pipeline_options.get("max_parallel_tasks") or settings.KG_PIPELINE_MAX_PARALLEL_TASKS))
+    run_ctx.max_parallel_tasks = max_parallel
+    semaphore = asyncio.Semaphore(max_parallel)
+    task_futures: Dict[int, "asyncio.Task"] = {}
+
+    # Exports read their sources on their own
+    scan_groups = [] if run_ctx.bulk_export else plan_shared_scans(tasks, deps, run_ctx.full_refresh)
+    group_of: Dict[int, int] = {}
+    for index, group in enumerate(scan_groups):
+        shared_scan = SharedScan(group, log_prefix=f"[Run ID: {db_pipeline_run_id}]")
+        group_deps = set().union(*(deps[task_id] for task_id in group)) - set(group)
+        for task_id in group:
+            run_ctx.shared_scans[task_id] = shared_scan
+            deps[task_id] = set(group_deps)
+            group_of[task_id] = index
+    group_locks = [asyncio.Lock() for _ in scan_groups]
+    group_slot_holders = [0] * len(scan_groups)
+
+    async def acquire_slot(task_id: int):
+        index = group_of.get(task_id)
+        if index is None:
+            await semaphore.acquire()
+            return
+        async with group_locks[index]:
+            if not group_slot_holders[index]:
+                await semaphore.acquire()
+            group_slot_holders[index] += 1
+
+    def release_slot(task_id: int):
+        index = group_of.get(task_id)
+        if index is not None:
+            group_slot_holders[index] -= 1
+            if group_slot_holders[index]:
+                return
+        semaphore.release()
+
+    async def run_one(task_model) -> bool:
+        try:
+            for dep_id in deps[task_model.id]:
+                if not await task_futures[dep_id]:
+                    return False # A dependency failed or was stopped
+            await acquire_slot(task_model.id)
+            try:
+                if stop_event.is_set():
+                    return False
+                task_successful = await asyncio.to_thread(_execute_pipeline_task_in_new_session, task_model.id, run_ctx)
+            finally:
+                release_slot(task_model.id)
+        finally:
+            shared_scan = run_ctx.shared_scans.get(task_model.id)
+            if shared_scan is not None:
+                shared_scan.leave(task_model.id) # Members that never joined must not hold up the others
+        if not task_successful and not stop_event.is_set():
+            print(f"Task {task_model.task_name} (ID: {task_model.id}) failed. Aborting pipeline run {db_pipeline_run_id}.")
+            stop_event.set()
+        return task_successful
+
+    print(f"[Run ID: {db_pipeline_run_id}] Running {len(tasks)} tasks with up to {max_parallel} in parallel.")
+    for group in scan_groups:
+        print(f"[Run ID: {db_pipeline_run_id}] Tasks {group} read the same source and run with a shared scan.")
+    for task_model in sorted(tasks, key=lambda t: t.task_order):
+        task_futures[task_model.id] = asyncio.create_task(run_one(task_model))
+    results = await asyncio.gather(*task_futures.values())
+    return all(results)
+
+async def _switch_to_shadow_space(db: Session, pipeline, run_ctx: PipelineRunContext, deferred_indexes) -> kg_pipeline_schemas.KGPipelineRunStatus:
+    """
+    Ends a successful rebuild run: builds the shadow space's deferred indexes, then points the KG's space
+    alias at it. The run fails, and readers stay on the old space, if the indexes cannot be built.
+    """
+    log_prefix = f"[Run ID: {run_ctx.run_id}]"
+    shadow_space = run_ctx.target_kg_name
+    try:
+        await asyncio.to_thread(rebuild_shadow_indexes, shadow_space, deferred_indexes, run_ctx.stop_event, log_prefix)
+    except SpaceRebuildError as e:
+        print(f"{log_prefix} {e} Not switching to shadow space {shadow_space}.")
+        emit_run_event(run_ctx.run_id, "space_switch_failed", message=str(e), space=shadow_space)
+        return kg_pipeline_schemas.KGPipelineRunStatus.FAILED
+    db_alias = crud_kg_space_alias.switch_space_alias(db, pipeline.target_kg_name, shadow_space, run_id=run_ctx.run_id)
+    print(f"{log_prefix} KG {pipeline.target_kg_name} now served by space {shadow_space} (was {db_alias.previous_space_name}).")
+    emit_run_event(
+        run_ctx.run_id, "space_switched", message=shadow_space,
+        alias=pipeline.target_kg_name, previous_space=db_alias.previous_space_name
+    )
+    if settings.KG_PIPELINE_REBUILD_DROP_PREVIOUS_SPACE and db_alias.previous_space_name not in (None, shadow_space):
+        await asyncio.to_thread(drop_space, db_alias.previous_space_name, log_prefix)
+    return kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS
 
-async def run_kg_pipeline_background(pipeline_id: int, db_pipeline_run_id: int):
-    """Background task to execute a KG pipeline."""
+async def run_kg_pipeline_background(
+    pipeline_id: int, db_pipeline_run_id: int,
+    stop_event: Optional[threading.Event] = None, lease_lost: Optional[threading.Event] = None
+):
+    """
+    Background task to execute a KG pipeline. Pipeline workers pass the run's stop_event and set
+    lease_lost with it when they lose the run's lease: the run then stops without recording a final
+    status, leaving the row to the worker that takes it over.
+    """
     db: Session = SessionLocal()
     try:
         print(f"Background task started for Pipeline ID: {pipeline_id}, Run ID: {db_pipeline_run_id}")
@@ -301,6 +848,10 @@ async def run_kg_pipeline_background(pipeline_id: int, db_pipeline_run_id: int):
             crud_kg_pipeline_run.update_kg_pipeline_run_status(
                 db, run_id=db_pipeline_run_id, new_status=kg_pipeline_schemas.KGPipelineRunStatus.FAILED
             )
+            emit_run_event(
+                db_pipeline_run_id, RUN_FINISHED_EVENT, message=f"Pipeline {pipeline_id} not found.",
+                status=kg_pipeline_schemas.KGPipelineRunStatus.FAILED.value
+            )
             return
 
         tasks = crud_kg_pipeline_task.get_kg_pipeline_tasks_for_pipeline(db, pipeline_id=pipeline_id)
@@ -309,39 +860,88 @@ async def run_kg_pipeline_background(pipeline_id: int, db_pipeline_run_id: int):
             crud_kg_pipeline_run.update_kg_pipeline_run_status(
                 db, run_id=db_pipeline_run_id, new_status=kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS
             )
+            emit_run_event(
+                db_pipeline_run_id, RUN_FINISHED_EVENT, message="Pipeline has no tasks.",
+                status=kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS.value
+            )
             return
         
-        all_tasks_successful = True
-        for task_model in sorted(tasks, key=lambda t: t.task_order):
-            current_run_status_obj = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=db_pipeline_run_id)
-            if current_run_status_obj and current_run_status_obj.status == kg_pipeline_schemas.KGPipelineRunStatus.CANCELLED:
-                print(f"Run {db_pipeline_run_id} was cancelled. Stopping task execution.")
-                all_tasks_successful = False
-                break 
-            
-            task_successful = await execute_pipeline_task(
-                task_id=task_model.id, 
-                db_pipeline_run_id=db_pipeline_run_id, 
-                target_kg_name=pipeline.target_kg_name,
-                db=db
+        enabled_tasks = [t for t in tasks if t.is_enabled]
+        for task_model in tasks:
+            if not task_model.is_enabled:
+                print(f"Task {task_model.task_name} (ID: {task_model.id}) is not enabled. Skipping.")
+
+        emit_run_event(db_pipeline_run_id, "run_started", pipeline_id=pipeline_id, tasks=len(enabled_tasks))
+
+        # Cancellation is detected by one watcher polling the run row instead of a query before every task.
+        db_run = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=db_pipeline_run_id)
+        bulk_export = bool(db_run and db_run.bulk_export)
+        # Runs write into the space the KG's alias points at; a rebuild loads a shadow space instead
+        live_space = crud_kg_space_alias.resolve_space_name(db, pipeline.target_kg_name)
+        target_space = live_space
+        rebuild = bool(db_run and db_run.rebuild) and not bulk_export
+        deferred_indexes = []
+        if rebuild:
+            # Checked again here for scheduled/queued runs: the alias switch must not drop other pipelines' data
+            others = crud_kg_pipeline.get_other_kg_pipelines_for_kg(db, pipeline.target_kg_name, pipeline.id)
+            if others:
+                raise SpaceRebuildError(
+                    f"Cannot rebuild: pipelines {[p.id for p in others]} also write KG {pipeline.target_kg_name}."
+                )
+            target_space = shadow_space_name(pipeline.target_kg_name, db_pipeline_run_id)
+            deferred_indexes = await asyncio.to_thread(
+                prepare_shadow_space, live_space, target_space, f"[Run ID: {db_pipeline_run_id}]"
+            )
+            emit_run_event(
+                db_pipeline_run_id, "shadow_space_ready", message=target_space,
+                live_space=live_space, deferred_indexes=len(deferred_indexes)
             )
-            if not task_successful:
-                all_tasks_successful = False
-                print(f"Task {task_model.task_name} (ID: {task_model.id}) failed. Aborting pipeline run {db_pipeline_run_id}.")
-                break
+        max_rows_per_second = (pipeline.execution_options or {}).get("max_rows_per_second") or settings.KG_PIPELINE_MAX_ROWS_PER_SECOND
+        run_ctx = PipelineRunContext(
+            db_pipeline_run_id, target_space, full_refresh=bool(db_run and db_run.full_refresh) or rebuild,
+            bulk_export=bulk_export, stop_event=stop_event,
+            rate_limiter=RowRateLimiter(max_rows_per_second) if max_rows_per_second else None
+        )
+        graph_done = asyncio.Event()
+        cancel_watcher = asyncio.create_task(_watch_run_cancellation(db_pipeline_run_id, run_ctx.stop_event, graph_done))
+        try:
+            all_tasks_successful = await _run_task_graph(pipeline, enabled_tasks, run_ctx)
+        finally:
+            graph_done.set()
+            await cancel_watcher
         
+        if lease_lost is not None and lease_lost.is_set():
+            print(f"Pipeline run {db_pipeline_run_id} stopped after losing its lease; not recording a final status.")
+            return
         final_status = kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS if all_tasks_successful else kg_pipeline_schemas.KGPipelineRunStatus.FAILED
+        db.expire_all() # The run row may have been cancelled from another session meanwhile
         current_run_status_obj = crud_kg_pipeline_run.get_kg_pipeline_run(db, run_id=db_pipeline_run_id)
         if current_run_status_obj and current_run_status_obj.status == kg_pipeline_schemas.KGPipelineRunStatus.CANCELLED:
             final_status = kg_pipeline_schemas.KGPipelineRunStatus.CANCELLED
+        if rebuild and final_status == kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS:
+            final_status = await _switch_to_shadow_space(db, pipeline, run_ctx, deferred_indexes)
+        if run_ctx.bulk_export and final_status == kg_pipeline_schemas.KGPipelineRunStatus.SUCCESS:
+            config_path = write_import_config(db_pipeline_run_id, live_space)
+            if config_path:
+                print(f"Pipeline run {db_pipeline_run_id}: nebula-importer config written to {config_path}")
+                emit_run_event(db_pipeline_run_id, "bulk_export_ready", message=config_path)
             
+        run_metrics = summarize_run_metrics(
+            task_run.metrics for task_run in crud_kg_pipeline_task_run.get_task_runs_for_run(db, pipeline_run_id=db_pipeline_run_id)
+        )
         crud_kg_pipeline_run.update_kg_pipeline_run_status(
-            db, run_id=db_pipeline_run_id, new_status=final_status
+            db, run_id=db_pipeline_run_id, new_status=final_status, metrics=run_metrics
         )
+        emit_run_event(db_pipeline_run_id, RUN_FINISHED_EVENT, status=final_status.value, metrics=run_metrics)
         print(f"Pipeline run {db_pipeline_run_id} finished with status: {final_status}")
 
     except Exception as e:
         print(f"Error during pipeline run {db_pipeline_run_id}: {e}")
+        if lease_lost is not None and lease_lost.is_set():
+            return # The run belongs to another worker now
+        emit_run_event(
+            db_pipeline_run_id, RUN_FINISHED_EVENT, message=str(e), status=kg_pipeline_schemas.KGPipelineRunStatus.FAILED.value
+        )
         try:
             crud_kg_pipeline_run.update_kg_pipeline_run_status(
                 db, run_id=db_pipeline_run_id, new_status=kg_pipeline_schemas.KGPipelineRunStatus.FAILED
@@ -349,4 +949,15 @@ async def run_kg_pipeline_background(pipeline_id: int, db_pipeline_run_id: int):
         except Exception as db_err:
             print(f"Failed to update run status to FAILED for run {db_pipeline_run_id} after error: {db_err}")
     finally:
-        db.close() 
\ No newline at end of file
+        flush_run_events() # Don't leave the run's last events waiting for the next flush interval
+        db.close()
+
+def dispatch_kg_pipeline_run(background_tasks: Any, pipeline_id: int, db_pipeline_run_id: int):
+    """
+    Hands a PENDING run over for execution: in "queue" execution mode it stays in kg_pipeline_runs for a
+    pipeline worker (worker.py) to claim, otherwise it runs as a FastAPI background task of this process.
+    """
+    if settings.KG_PIPELINE_EXECUTION_MODE == "queue":
+        print(f"Run {db_pipeline_run_id} of pipeline {pipeline_id} queued for pipeline workers.")
+        return
+    background_tasks.add_task(run_kg_pipeline_background, pipeline_id=pipeline_id, db_pipeline_run_id=db_pipeline_run_id)
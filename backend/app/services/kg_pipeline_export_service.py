@@ -0,0 +1,186 @@
+import csv
+import glob
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+import yaml
+
+from app.api.v1.schemas import kg_pipeline_task_schemas
+from app.core.config import settings
+
+# Bulk export mode of KG pipeline runs: instead of INSERT statements, every task writes its rows to
+# CSV files for an offline load with nebula-importer (v4 config format).
+# Rows go through the task's compiled transformer, so VIDs, ranks and property values are the nGQL
+# literals the INSERT path would send; a literal is written as the value nebula-importer turns back
+# into the same literal (strings unquoted, date("...")/datetime("...") as their text).
+# Files are grouped by tag / edge type and split every rows_per_file rows; each has a header row
+# from field_mappings. Each task leaves a manifest, and the run ends by writing nebula-importer.yaml
+# with one source per file.
+
+NULL_VALUE = "__NULL__" # Written for NULL properties; declared as nullValue in the import config
+IMPORT_CONFIG_FILE = "nebula-importer.yaml"
+
+_FUNCTION_LITERAL_RE = re.compile(r'(?:date|datetime|time)\("(.*)"\)', re.DOTALL)
+_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+
+
+def _unescape(text: str) -> str:
+    return _ESCAPE_RE.sub(r"\1", text) if "\\" in text else text
+
+def csv_value(literal: Optional[str]) -> str:
+    """The CSV cell for an nGQL literal produced by the transformer."""
+    if literal is None:
+        return NULL_VALUE
+    if literal.startswith('"'):
+        return _unescape(literal[1:-1])
+    match = _FUNCTION_LITERAL_RE.fullmatch(literal)
+    if match:
+        return _unescape(match.group(1))
+    return literal
+
+
+def export_run_dir(run_id: int) -> str:
+    return os.path.join(settings.KG_PIPELINE_EXPORT_DIR, f"run_{run_id}")
+
+def _manifest_path(run_id: int, task_id: int) -> str:
+    return os.path.join(export_run_dir(run_id), "manifests", f"task_{task_id}.json")
+
+
+def _importer_id_type(vid_col_mapping: Any) -> str:
+    return "INT" if isinstance(vid_col_mapping, dict) and vid_col_mapping.get("type") == "INT64" else "STRING"
+
+def export_column_types(task) -> Dict[str, Any]:
+    """
+    nebula-importer types of a task's VID columns and properties. Raises ValueError for a property
+    without a "type": the INSERT path picks its literal per value, a CSV column needs one type.
+    """
+    field_mappings = task.field_mappings or {}
+    if task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+        id_types = [_importer_id_type(field_mappings.get("vertex_id_column"))]
+    else:
+        id_types = [
+            _importer_id_type(field_mappings.get("source_vid_column")),
+            _importer_id_type(field_mappings.get("destination_vid_column")),
+        ]
+    property_types = []
+    for src_col, target_mapping in (field_mappings.get("properties") or {}).items():
+        if not target_mapping.get("type"):
+            raise ValueError(f"Property mapping of column '{src_col}' has no 'type', which bulk export requires.")
+        property_types.append(target_mapping["type"])
+    return {"id_types": id_types, "property_types": property_types}
+
+
+class TaskCsvExporter:
+    """Writes one task's transformed rows to CSV files under the run's tag / edge type directory."""
+
+    def __init__(self, task, run_id: int, header: List[str], log_prefix: str = ""):
+        is_node = task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE
+        self.task = task
+        self.run_id = run_id
+        self.header = header
+        self.log_prefix = log_prefix
+        self.directory = os.path.join(export_run_dir(run_id), f"{'vertex' if is_node else 'edge'}_{task.target_label_or_type}")
+        os.makedirs(self.directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(self.directory, f"task_{task.id}_*.csv")):
+            os.remove(stale) # Written by an earlier attempt; export restarts from the first row
+        self.rows_per_file = max(1, int(settings.KG_PIPELINE_EXPORT_ROWS_PER_FILE))
+        self.files: List[str] = []
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+        self._rows_in_file = 0
+
+    def _open_next_file(self):
+        self.close()
+        path = os.path.join(self.directory, f"task_{self.task.id}_{len(self.files):05d}.csv")
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+        self._rows_in_file = 0
+        self.files.append(path)
+
+    def write_rows(self, rows: Iterable[List[Optional[str]]]) -> int:
+        """Writes rows of literals (see CompiledRowTransformer.iter_export_rows); returns how many."""
+        written = 0
+        for literals in rows:
+            if self._writer is None or self._rows_in_file >= self.rows_per_file:
+                self._open_next_file()
+            self._writer.writerow([csv_value(literal) for literal in literals])
+            self._rows_in_file += 1
+            written += 1
+        self.rows_written += written
+        return written
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def write_manifest(self, column_types: Dict[str, Any]):
+        """Records the task's files and columns for write_import_config()."""
+        self.close()
+        path = _manifest_path(self.run_id, self.task.id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        manifest = {
+            "task_id": self.task.id, "task_name": self.task.task_name,
+            "node": self.task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE,
+            "target": self.task.target_label_or_type, "header": self.header,
+            "rows": self.rows_written, "files": [os.path.abspath(f) for f in self.files], **column_types,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def _importer_schema(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    header = manifest["header"]
+    id_count = len(header) - len(manifest["property_types"]) # VID columns, plus the rank of an edge
+    props = [
+        {"name": name, "type": prop_type, "index": id_count + i, "nullable": True, "nullValue": NULL_VALUE}
+        for i, (name, prop_type) in enumerate(zip(header[id_count:], manifest["property_types"]))
+    ]
+    if manifest["node"]:
+        return {"tags": [{"name": manifest["target"], "id": {"type": manifest["id_types"][0], "index": 0}, "props": props}]}
+    edge: Dict[str, Any] = {
+        "name": manifest["target"],
+        "src": {"id": {"type": manifest["id_types"][0], "index": 0}},
+        "dst": {"id": {"type": manifest["id_types"][1], "index": 1}},
+    }
+    if id_count == 3:
+        edge["rank"] = {"index": 2}
+    edge["props"] = props
+    return {"edges": [edge]}
+
+def write_import_config(run_id: int, space_name: str) -> Optional[str]:
+    """Writes the nebula-importer config for the files the run's tasks exported; None if none did."""
+    run_dir = export_run_dir(run_id)
+    manifests = []
+    for path in sorted(glob.glob(os.path.join(run_dir, "manifests", "task_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            manifests.append(json.load(f))
+    if not manifests:
+        return None
+    sources = []
+    # Vertices first, so edges are loaded after the vertices they connect
+    for manifest in sorted(manifests, key=lambda m: (not m["node"], m["task_id"])):
+        for file_path in manifest["files"]:
+            # A schema dict per source, so the YAML has no anchors/aliases
+            sources.append({"path": file_path, "csv": {"delimiter": ",", "withHeader": True, "lazyQuotes": False}, **_importer_schema(manifest)})
+    config = {
+        "client": {
+            "version": "v3",
+            # settings.NEBULA_GRAPH_HOST might be a comma-separated list of addresses, as in nebula_connector
+            "address": ",".join(f"{host.strip()}:{settings.NEBULA_GRAPH_PORT}" for host in settings.NEBULA_GRAPH_HOST.split(",")),
+            "user": settings.NEBULA_USER,
+            "password": settings.NEBULA_PASSWORD,
+        },
+        "manager": {"spaceName": space_name, "batch": settings.KG_PIPELINE_EXPORT_IMPORTER_BATCH},
+        "log": {"level": "INFO", "console": True, "files": [os.path.join(os.path.abspath(run_dir), "nebula-importer.log")]},
+        "sources": sources,
+    }
+    config_path = os.path.join(run_dir, IMPORT_CONFIG_FILE)
+    with open(config_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    return config_path
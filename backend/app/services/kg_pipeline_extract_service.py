@@ -0,0 +1,286 @@
+import queue
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy import text as sqlalchemy_text
+from sqlalchemy.engine import Engine
+
+from app.api.v1.schemas import data_source_schemas as ds_schemas
+from app.core.config import settings
+from app.services.kg_pipeline_filter_service import compile_filter_conditions
+from app.services.kg_pipeline_transform_service import ColumnChunk
+
+# Source-side extraction for KG pipeline tasks.
+# Rows are streamed from the source database with a server-side (unbuffered) cursor and
+# handed out in fixed-size chunks, so memory depends on the chunk size, not the table size.
+# Large tables can be split into key ranges that are read in parallel, one connection each.
+# Queries select only the columns the extraction plan asks for (see kg_pipeline_plan_service) and
+# send the task filter's literals as bind parameters.
+
+class SourceExtractionError(Exception):
+    """Raised when reading rows from a pipeline task's source data source fails."""
+
+
+# Engines are cached per data source so repeated tasks/runs reuse the connection pool.
+_engine_cache: Dict[Any, Engine] = {}
+_engine_cache_lock = threading.Lock()
+_SOURCE_POOL_SIZE = 5 # Kept-open connections: planner, primary key and partition boundary lookups
+
+def source_partition_capacity() -> int:
+    """
+    Connections an engine opens on demand for partitioned reads: one per key range of every task a
+    run executes in parallel (max_parallel_tasks x max_extract_partitions).
+    """
+    return max(1, settings.KG_PIPELINE_MAX_PARALLEL_TASKS) * max(1, settings.KG_PIPELINE_MAX_EXTRACT_PARTITIONS)
+
+def get_dynamic_engine(ds: ds_schemas.DataSource) -> Engine:
+    """Returns a (cached) SQLAlchemy engine for a DataSource."""
+    if ds.type == ds_schemas.DataSourceType.MYSQL:
+        # Construct connection URL from ds.connection_params
+        # Ensure params like user, password, host, port, database exist
+        conn_params = ds.connection_params
+        db_url = (
+            f"mysql+pymysql://{conn_params.get('user') or conn_params.get('username')}:{conn_params.get('password')}"
+            f"@{conn_params.get('host')}:{conn_params.get('port', 3306)}"
+            f"/{conn_params.get('database')}"
+        )
+        cache_key = (ds.id, db_url)
+        with _engine_cache_lock:
+            engine = _engine_cache.get(cache_key)
+            if engine is None:
+                # Partitioned extraction holds one connection per key range, in every task running in parallel
+                engine = create_engine(
+                    db_url, pool_pre_ping=True, pool_size=_SOURCE_POOL_SIZE, max_overflow=source_partition_capacity()
+                )
+                _engine_cache[cache_key] = engine
+        return engine
+    # TODO: Add handlers for other DB types (PostgreSQL, etc.)
+    raise NotImplementedError(f"Data source type {ds.type} not supported for dynamic engine yet.")
+
+def serialize_watermark(value: Any) -> str:
+    """Renders a watermark value so MySQL compares it correctly when bound back as a parameter."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def get_primary_key_column(source_ds: ds_schemas.DataSource, table_identifier: str) -> Optional[str]:
+    """Returns the single-column primary key of a source table, or None (no PK, composite PK, or lookup failure)."""
+    table_name = table_identifier.split('.')[-1].strip('`')
+    try:
+        with get_dynamic_engine(source_ds).connect() as connection:
+            rows = connection.execute(sqlalchemy_text(
+                "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND CONSTRAINT_NAME = 'PRIMARY'"
+            ), {"table_name": table_name}).fetchall()
+    except Exception as e:
+        print(f"Could not look up primary key of {table_identifier}: {e}")
+        return None
+    return rows[0][0] if len(rows) == 1 else None
+
+class KeyRange:
+    """
+    A slice of a task's checkpoint key: start <= key < end, where a None bound is open.
+    after_key is the last key already written to the graph (the resume position) or None.
+    """
+
+    def __init__(self, start: Optional[int] = None, end: Optional[int] = None, after_key: Optional[str] = None):
+        self.start = start
+        self.end = end
+        self.after_key = after_key
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"start": self.start, "end": self.end, "after_key": self.after_key}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KeyRange":
+        return cls(start=data.get("start"), end=data.get("end"), after_key=data.get("after_key"))
+
+    def __repr__(self):
+        return f"[{self.start}, {self.end})"
+
+
+def _build_conditions(task, watermark_value: Optional[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """WHERE conditions of a task's scan; raises FilterConditionError for an invalid filter_conditions."""
+    conditions = []
+    params: Dict[str, Any] = {}
+    compiled_filter = compile_filter_conditions(task.filter_conditions)
+    if compiled_filter is not None:
+        conditions.append(f"({compiled_filter.sql})")
+        params.update(compiled_filter.params)
+    if task.watermark_column and watermark_value is not None:
+        conditions.append(f"`{task.watermark_column}` > :watermark_value")
+        params["watermark_value"] = watermark_value
+    return conditions, params
+
+def _select_from(task, columns: Optional[List[str]], index_hint: Optional[str]) -> str:
+    select_list = ", ".join(f"`{column}`" for column in columns) if columns else "*"
+    query = f"SELECT {select_list} FROM {task.source_entity_identifier}"
+    if index_hint:
+        query += f" FORCE INDEX (`{index_hint}`)"
+    return query
+
+def build_extraction_query(
+    task, watermark_value: Optional[str] = None,
+    order_key_column: Optional[str] = None, after_key: Optional[str] = None,
+    key_range: Optional[KeyRange] = None, columns: Optional[List[str]] = None, index_hint: Optional[str] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Builds the source query of a task and its bind parameters.
+    - With a watermark_value, only rows with task.watermark_column > watermark_value are read.
+    - With an order_key_column, rows are read in key order (so progress can be checkpointed by key),
+      starting after after_key when resuming, and limited to key_range when given.
+    - columns limits the select list (None reads every column); index_hint forces an index.
+    """
+    conditions, params = _build_conditions(task, watermark_value)
+    if order_key_column and key_range is not None:
+        if key_range.start is not None:
+            conditions.append(f"`{order_key_column}` >= :range_start")
+            params["range_start"] = key_range.start
+        if key_range.end is not None:
+            conditions.append(f"`{order_key_column}` < :range_end")
+            params["range_end"] = key_range.end
+    if order_key_column and after_key is not None:
+        conditions.append(f"`{order_key_column}` > :checkpoint_key")
+        params["checkpoint_key"] = after_key
+    query = _select_from(task, columns, index_hint)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if order_key_column:
+        query += f" ORDER BY `{order_key_column}`"
+    return query, params
+
+def iter_source_row_chunks(
+    source_ds: ds_schemas.DataSource, query: str, chunk_size: int, params: Optional[Dict[str, Any]] = None,
+    columnar: bool = False
+) -> Iterator[Any]:
+    """
+    Streams the result of `query` as lists of at most `chunk_size` row dicts, or as ColumnChunks when columnar.
+    Uses stream_results so the driver fetches rows incrementally instead of buffering the whole result set.
+    """
+    chunk_size = max(1, int(chunk_size))
+    try:
+        dynamic_engine = get_dynamic_engine(source_ds)
+        with dynamic_engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, max_row_buffer=chunk_size
+            ).execute(sqlalchemy_text(query), params or {})
+            if columnar:
+                column_names = list(result.keys())
+                while True:
+                    rows = result.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield ColumnChunk(dict(zip(column_names, zip(*rows))), len(rows))
+                return
+            mappings = result.mappings()
+            while True:
+                rows = mappings.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+    except NotImplementedError:
+        raise
+    except Exception as e:
+        raise SourceExtractionError(str(e)) from e
+
+def plan_key_range_partitions(
+    source_ds: ds_schemas.DataSource, task, key_column: str, num_partitions: int,
+    watermark_value: Optional[str] = None
+) -> List[KeyRange]:
+    """
+    Splits the rows a task reads into up to num_partitions ranges of an integer key, using MIN/MAX of
+    the key over the filtered rows. The outer ranges are open-ended, so rows inserted after planning are
+    still covered. Falls back to a single range for non-integer keys or if the lookup fails.
+    """
+    if num_partitions <= 1:
+        return [KeyRange()]
+    conditions, params = _build_conditions(task, watermark_value)
+    query = f"SELECT MIN(`{key_column}`), MAX(`{key_column}`) FROM {task.source_entity_identifier}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    try:
+        with get_dynamic_engine(source_ds).connect() as connection:
+            min_key, max_key = connection.execute(sqlalchemy_text(query), params).fetchone()
+    except Exception as e:
+        print(f"Could not plan key ranges for {task.source_entity_identifier}: {e}. Reading it as one range.")
+        return [KeyRange()]
+    if not isinstance(min_key, int) or not isinstance(max_key, int) or isinstance(min_key, bool):
+        return [KeyRange()] # Empty table or a key that cannot be split arithmetically
+    span = max_key - min_key + 1
+    num_partitions = min(num_partitions, span)
+    bounds = [min_key + span * i // num_partitions for i in range(1, num_partitions)]
+    starts = [None] + bounds
+    ends = bounds + [None]
+    return [KeyRange(start, end) for start, end in zip(starts, ends)]
+
+
+_PARTITION_DONE = object() # Marks the end of one partition on the merge queue
+
+def iter_partitioned_row_chunks(
+    source_ds: ds_schemas.DataSource, task, key_column: Optional[str], partitions: List[KeyRange],
+    chunk_size: int, watermark_value: Optional[str] = None, columnar: bool = False,
+    columns: Optional[List[str]] = None, index_hint: Optional[str] = None
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Streams (partition index, row chunk) pairs. Every partition is read in key order on its own
+    connection and thread; chunks are merged through a bounded queue in arrival order, so a slow
+    consumer pushes back on all readers. Closing the iterator stops the readers.
+    """
+    queries = [
+        build_extraction_query(
+            task, watermark_value=watermark_value, order_key_column=key_column,
+            after_key=partition.after_key, key_range=partition, columns=columns, index_hint=index_hint
+        )
+        for partition in partitions
+    ]
+    if len(queries) == 1:
+        query, params = queries[0]
+        for chunk in iter_source_row_chunks(source_ds, query, chunk_size, params, columnar=columnar):
+            yield 0, chunk
+        return
+
+    merged: "queue.Queue" = queue.Queue(maxsize=2 * len(queries))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                merged.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_partition(index: int, query: str, params: Dict[str, Any]):
+        try:
+            for chunk in iter_source_row_chunks(source_ds, query, chunk_size, params, columnar=columnar):
+                if not put((index, chunk)):
+                    return
+            put((index, _PARTITION_DONE))
+        except Exception as e:
+            put((index, e))
+
+    threads = [
+        threading.Thread(target=read_partition, args=(i, query, params), name=f"source-partition-{i}", daemon=True)
+        for i, (query, params) in enumerate(queries)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            index, item = merged.get()
+            if item is _PARTITION_DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item if isinstance(item, SourceExtractionError) else SourceExtractionError(str(item))
+            else:
+                yield index, item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,148 @@
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Validation and parameterization of KG pipeline task filter_conditions (a MySQL WHERE fragment).
+# The fragment is tokenized: literals become bind parameters, so values travel separately from the
+# statement text (a ':' or a quote inside a value can no longer break the query), and statement
+# separators, comments, subqueries, user variables and server-side side-effect functions are rejected.
+# The column names the filter references are collected for the extraction planner.
+
+class FilterConditionError(ValueError):
+    """Raised when a task's filter_conditions is not an acceptable WHERE expression."""
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)+`)
+  | (?P<number>(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)(?![\w$]))
+  | (?P<word>[\w$]+)
+  | (?P<comment>--|\#|/\*|\*/)
+  | (?P<operator><=>|<=|>=|<>|!=|:=|\|\||&&|[=<>+\-*/%!~^&|])
+  | (?P<punct>[(),.])
+""", re.VERBOSE | re.DOTALL)
+
+# Allowed in a WHERE clause in MySQL but able to read other tables, write files or stall the server
+_FORBIDDEN_WORDS = frozenset([
+    "SELECT", "UNION", "INTO", "OUTFILE", "DUMPFILE", "SLEEP", "BENCHMARK", "LOAD_FILE",
+    "GET_LOCK", "RELEASE_LOCK", "RELEASE_ALL_LOCKS", "IS_FREE_LOCK", "IS_USED_LOCK",
+    "MASTER_POS_WAIT", "SOURCE_POS_WAIT", "WAIT_FOR_EXECUTED_GTID_SET",
+])
+
+# Words that are not column references when they appear bare
+_KEYWORDS = frozenset([
+    "AND", "OR", "NOT", "XOR", "IN", "IS", "NULL", "LIKE", "RLIKE", "REGEXP", "BETWEEN", "TRUE", "FALSE",
+    "UNKNOWN", "ESCAPE", "DIV", "MOD", "CASE", "WHEN", "THEN", "ELSE", "END", "INTERVAL", "BINARY",
+    "COLLATE", "SOUNDS", "AS", "FROM", "USING", "ALL", "ANY", "SOME", "DISTINCT",
+    "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP",
+    "CHAR", "SIGNED", "UNSIGNED", "INTEGER", "DECIMAL", "DATE", "DATETIME", "TIME", "JSON", "DOUBLE", "FLOAT",
+    "MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR",
+    "SECOND_MICROSECOND", "MINUTE_MICROSECOND", "MINUTE_SECOND", "HOUR_MICROSECOND", "HOUR_SECOND",
+    "HOUR_MINUTE", "DAY_MICROSECOND", "DAY_SECOND", "DAY_MINUTE", "DAY_HOUR", "YEAR_MONTH",
+])
+
+_STRING_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+
+
+class CompiledFilter:
+    """A validated filter: SQL with :filter_<n> placeholders, their values, and the referenced columns."""
+
+    def __init__(self, sql: str, params: Dict[str, Any], columns: Tuple[str, ...]):
+        self.sql = sql
+        self.params = params
+        self.columns = columns
+
+
+def _unquote_string(literal: str) -> str:
+    quote, body = literal[0], literal[1:-1]
+    chars: List[str] = []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == "\\" and i + 1 < len(body):
+            chars.append(_STRING_ESCAPES.get(body[i + 1], body[i + 1]))
+            i += 2
+        elif char == quote and body[i + 1:i + 2] == quote:
+            chars.append(quote)
+            i += 2
+        else:
+            chars.append(char)
+            i += 1
+    return "".join(chars)
+
+def _number_value(text: str) -> Any:
+    return int(text) if text.isdigit() else Decimal(text) # Decimal keeps the literal exact
+
+
+@lru_cache(maxsize=256)
+def compile_filter_conditions(filter_conditions: str) -> Optional[CompiledFilter]:
+    """
+    Validates a filter_conditions fragment and replaces its literals with bind parameters.
+    Returns None for an empty filter; raises FilterConditionError for anything that is not a
+    plain boolean expression over the source row.
+    """
+    if not filter_conditions or not filter_conditions.strip():
+        return None
+    tokens: List[Tuple[str, str, int]] = [] # (kind, text, start)
+    position = 0
+    while position < len(filter_conditions):
+        match = _TOKEN_RE.match(filter_conditions, position)
+        if match is None:
+            raise FilterConditionError(
+                f"Unexpected character {filter_conditions[position]!r} at position {position} of filter_conditions."
+            )
+        kind = match.lastgroup
+        if kind == "comment":
+            raise FilterConditionError("Comments are not allowed in filter_conditions.")
+        if kind == "operator" and match.group() == ":=":
+            raise FilterConditionError("Assignments are not allowed in filter_conditions.")
+        if kind != "space":
+            tokens.append((kind, match.group(), position))
+        position = match.end()
+
+    depth = 0
+    pieces: List[str] = []
+    params: Dict[str, Any] = {}
+    columns: List[str] = []
+    cursor = 0
+    for index, (kind, text, start) in enumerate(tokens):
+        next_text = tokens[index + 1][1] if index + 1 < len(tokens) else None
+        previous = tokens[index - 1] if index else None
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if depth < 0:
+                raise FilterConditionError("Unbalanced parentheses in filter_conditions.")
+        elif kind == "word" and text.upper() in _FORBIDDEN_WORDS:
+            raise FilterConditionError(f"'{text}' is not allowed in filter_conditions.")
+        elif kind == "quoted" and ":" in text:
+            raise FilterConditionError("Column names containing ':' are not supported in filter_conditions.")
+
+        is_qualifier = next_text == "."
+        after_dot = previous is not None and previous[1] == "."
+        is_introducer = next_text is not None and tokens[index + 1][0] == "string" and tokens[index + 1][2] == start + len(text)
+        after_collate = previous is not None and previous[1].upper() == "COLLATE"
+        if kind in ("word", "quoted") and not (is_qualifier or is_introducer or after_collate) and next_text != "(":
+            name = text[1:-1].replace("``", "`") if kind == "quoted" else text
+            if kind == "quoted" or (not text[0].isdigit() and text.upper() not in _KEYWORDS) or after_dot:
+                if name not in columns:
+                    columns.append(name)
+        literal = None
+        if kind == "number" and not after_dot:
+            literal = _number_value(text)
+        elif kind == "string" and not (previous is not None and previous[0] == "word" and previous[2] + len(previous[1]) == start):
+            literal = _unquote_string(text) # Charset introducers (_utf8mb4'...') keep their literal
+        if literal is not None:
+            name = f"filter_{len(params)}"
+            params[name] = literal
+            pieces.append(filter_conditions[cursor:start])
+            pieces.append(f":{name}")
+            cursor = start + len(text)
+    if depth:
+        raise FilterConditionError("Unbalanced parentheses in filter_conditions.")
+    pieces.append(filter_conditions[cursor:])
+    return CompiledFilter("".join(pieces), params, tuple(columns))
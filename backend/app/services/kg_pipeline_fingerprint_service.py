@@ -0,0 +1,138 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator, List, Tuple
+
+from app.core.config import settings
+
+# Row fingerprints for KG pipeline tasks whose sources have no reliable updated_at column.
+# For every row written, a task's fingerprint store keeps key -> hash of the whole VALUES row,
+# where the key is the VID (or "src -> dst@rank") and the hash covers the statement prefix (the
+# property names) and the converted property literals. On the next run, rows whose hash did not change
+# are not sent to Nebula again. The store is a SQLite file per task on local disk, so it holds tens of
+# millions of rows without keeping them in memory; keys and hashes are stored as 8-byte digests.
+
+Fingerprint = Tuple[bytes, bytes] # (key digest, row digest)
+
+_LOOKUP_BATCH_SIZE = 500 # Keys per SELECT ... IN (...), below SQLite's bound parameter limit
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+def values_item_key(item: str) -> str:
+    """The key part of a VALUES item ('"v1":(...)' -> '"v1"', '"a" -> "b"@0:(...)' -> '"a" -> "b"@0')."""
+    end = item.find(":(")
+    if item.find('"', 0, end) == -1:
+        return item[:end] # Integer VIDs: no string literal can hide a ':('
+    in_string = escaped = False
+    for i, char in enumerate(item):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ":" and item.startswith("(", i + 1):
+            return item[:i]
+    return item
+
+
+class RowFingerprintStore:
+    """
+    Disk-backed key -> row hash map of one task. Lookups and updates run on the task's thread;
+    fingerprints of written batches are staged from the writer threads and stored by commit().
+    """
+
+    def __init__(self, path: str, scope: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS fingerprints (key BLOB PRIMARY KEY, hash BLOB NOT NULL) WITHOUT ROWID")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        # Fingerprints describe what is in one graph space; written elsewhere they say nothing
+        row = self._connection.execute("SELECT value FROM meta WHERE name = 'scope'").fetchone()
+        if row is None or row[0] != scope:
+            if row is not None:
+                print(f"Fingerprint store {path} was built for {row[0]}, not {scope}. Starting over.")
+            self._connection.execute("DELETE FROM fingerprints")
+            self._connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('scope', ?)", (scope,))
+        self._connection.commit()
+        self._staged: List[Fingerprint] = []
+        self._lock = threading.Lock()
+        self.rows_unchanged = 0
+
+    def filter_changed(
+        self, transformed: Iterable[Tuple[str, str]], skip_unchanged: bool = True
+    ) -> Iterator[Tuple[str, str, Fingerprint]]:
+        """
+        Yields (prefix, item, fingerprint) for every row that is new or changed since it was last written.
+        With skip_unchanged=False (full refresh) every row is yielded, so the store is rebuilt.
+        Rows are looked up in groups, one SELECT per group.
+        """
+        group: List[Tuple[str, str, Fingerprint]] = []
+        for prefix, item in transformed:
+            group.append((prefix, item, (_digest(values_item_key(item)), _digest(f"{prefix} {item}"))))
+            if len(group) >= _LOOKUP_BATCH_SIZE:
+                yield from self._changed(group, skip_unchanged)
+                group = []
+        if group:
+            yield from self._changed(group, skip_unchanged)
+
+    def _changed(self, group: List[Tuple[str, str, Fingerprint]], skip_unchanged: bool) -> List[Tuple[str, str, Fingerprint]]:
+        if not skip_unchanged:
+            return group
+        keys = list({fingerprint[0] for _, _, fingerprint in group})
+        placeholders = ", ".join("?" * len(keys))
+        stored = dict(self._connection.execute(
+            f"SELECT key, hash FROM fingerprints WHERE key IN ({placeholders})", keys
+        ).fetchall())
+        changed = [row for row in group if stored.get(row[2][0]) != row[2][1]]
+        self.rows_unchanged += len(group) - len(changed)
+        return changed
+
+    def stage(self, fingerprints: Iterable[Fingerprint]):
+        """Records fingerprints of rows Nebula accepted; thread-safe, persisted by the next commit()."""
+        with self._lock:
+            self._staged.extend(fingerprints)
+
+    def commit(self) -> int:
+        with self._lock:
+            staged, self._staged = self._staged, []
+        if staged:
+            self._connection.executemany("INSERT OR REPLACE INTO fingerprints (key, hash) VALUES (?, ?)", staged)
+            self._connection.commit()
+        return len(staged)
+
+    def forget(self, keys: Iterable[str]) -> int:
+        """Removes the fingerprints of keys deleted from Nebula, so the rows are written again if they return."""
+        forgotten = 0
+        keys = iter(keys)
+        while True:
+            digests = list({_digest(key) for key in itertools.islice(keys, _LOOKUP_BATCH_SIZE)})
+            if not digests:
+                break
+            placeholders = ", ".join("?" * len(digests))
+            forgotten += self._connection.execute(
+                f"DELETE FROM fingerprints WHERE key IN ({placeholders})", digests
+            ).rowcount
+        self._connection.commit()
+        return forgotten
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+
+def open_fingerprint_store(task, space_name: str) -> RowFingerprintStore:
+    """Opens (or creates) the fingerprint store of a task for the given target graph space."""
+    path = os.path.join(settings.KG_PIPELINE_STATE_DIR, "fingerprints", f"task_{task.id}.sqlite")
+    return RowFingerprintStore(path, scope=f"{space_name}/{task.target_label_or_type}")
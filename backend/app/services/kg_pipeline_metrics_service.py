@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+# Execution metrics of KG pipeline tasks.
+# Each task attempt owns a TaskRunMetrics; the extractor thread and the Nebula writer threads
+# update it concurrently, and snapshot() renders it as the JSON stored in kg_pipeline_task_runs.metrics.
+# Stage timings tell whether a slow run waits on the source DB (extract), on the CPU (transform)
+# or on graphd (write / write_wait). write_seconds is Nebula busy time summed over all writer
+# workers, so with several workers it can exceed the elapsed time.
+
+# Nebula latencies are kept in a bounded reservoir sample, so percentiles cost O(1) memory per task.
+LATENCY_SAMPLE_SIZE = 4096
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TaskRunMetrics:
+    """Thread-safe counters and stage timers for one attempt of a pipeline task."""
+
+    COUNTERS = (
+        "rows_extracted", "rows_skipped", "rows_written", "statements_sent", "bytes_sent",
+        "chunks_extracted", "nebula_errors", "extraction_errors", "write_retries", "rows_dead_lettered",
+        "rows_unchanged", "rows_deleted", "rows_dangling", "rows_replayed", "rows_exported",
+    )
+    STAGES = ("extract", "transform", "write_wait", "write")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {name: 0 for name in self.COUNTERS}
+        self._stage_seconds: Dict[str, float] = {name: 0.0 for name in self.STAGES}
+        self._latencies_ms: List[float] = []
+        self._latency_count = 0
+        self._latency_max_ms = 0.0
+        self._info: Dict[str, Any] = {} # Extra JSON values reported as-is (e.g. final adaptive write settings)
+        self._started = time.monotonic()
+        self._finished: Optional[float] = None
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def set_info(self, name: str, value: Any):
+        with self._lock:
+            self._info[name] = value
+
+    def add_stage_time(self, stage: str, seconds: float):
+        with self._lock:
+            self._stage_seconds[stage] += seconds
+
+    def timed_iter(self, stage: str, iterable: Iterable[Any]) -> Iterable[Any]:
+        """Yields from iterable, charging the time spent waiting for each item to a stage."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_stage_time(stage, time.perf_counter() - started)
+                return
+            self.add_stage_time(stage, time.perf_counter() - started)
+            yield item
+
+    def record_nebula_write(self, latency_seconds: float, rows: int, size_bytes: int):
+        latency_ms = latency_seconds * 1000
+        with self._lock:
+            self._counters["rows_written"] += rows
+            self._counters["statements_sent"] += 1
+            self._counters["bytes_sent"] += size_bytes
+            self._stage_seconds["write"] += latency_seconds
+            self._record_latency(latency_ms)
+
+    def record_nebula_error(self, latency_seconds: Optional[float] = None):
+        with self._lock:
+            self._counters["nebula_errors"] += 1
+            if latency_seconds is not None:
+                self._stage_seconds["write"] += latency_seconds
+                self._record_latency(latency_seconds * 1000)
+
+    def _record_latency(self, latency_ms: float):
+        # Reservoir sampling (Algorithm R) keeps a uniform sample of all latencies
+        self._latency_count += 1
+        self._latency_max_ms = max(self._latency_max_ms, latency_ms)
+        if len(self._latencies_ms) < LATENCY_SAMPLE_SIZE:
+            self._latencies_ms.append(latency_ms)
+        else:
+            slot = random.randrange(self._latency_count)
+            if slot < LATENCY_SAMPLE_SIZE:
+                self._latencies_ms[slot] = latency_ms
+
+    def finish(self):
+        with self._lock:
+            if self._finished is None:
+                self._finished = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable view of the metrics; rates use the elapsed wall time of the attempt."""
+        with self._lock:
+            elapsed = (self._finished or time.monotonic()) - self._started
+            latencies = sorted(self._latencies_ms)
+            snapshot: Dict[str, Any] = dict(self._counters)
+            snapshot["elapsed_seconds"] = round(elapsed, 3)
+            snapshot.update({f"{name}_seconds": round(seconds, 3) for name, seconds in self._stage_seconds.items()})
+            snapshot["rows_per_second"] = round(self._counters["rows_extracted"] / elapsed, 1) if elapsed > 0 else None
+            snapshot["nebula_latency_ms"] = {
+                "count": self._latency_count,
+                "p50": _round_or_none(_percentile(latencies, 0.50)),
+                "p90": _round_or_none(_percentile(latencies, 0.90)),
+                "p99": _round_or_none(_percentile(latencies, 0.99)),
+                "max": round(self._latency_max_ms, 2) if self._latency_count else None,
+            }
+            snapshot.update(self._info)
+        return snapshot
+
+
+def _round_or_none(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def summarize_run_metrics(task_metrics: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Adds up the task metric snapshots of a run (latency percentiles stay per task)."""
+    summary: Dict[str, Any] = {name: 0 for name in TaskRunMetrics.COUNTERS}
+    summary.update({f"{name}_seconds": 0.0 for name in TaskRunMetrics.STAGES})
+    summary["tasks_reported"] = 0
+    for metrics in task_metrics:
+        if not metrics:
+            continue
+        summary["tasks_reported"] += 1
+        for key in summary:
+            if key != "tasks_reported" and isinstance(metrics.get(key), (int, float)):
+                summary[key] += metrics[key]
+    for name in TaskRunMetrics.STAGES:
+        summary[f"{name}_seconds"] = round(summary[f"{name}_seconds"], 3)
+    return summary
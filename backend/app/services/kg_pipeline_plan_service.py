@@ -0,0 +1,175 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text as sqlalchemy_text
+
+from app.api.v1.schemas import data_source_schemas as ds_schemas
+from app.services.kg_pipeline_extract_service import build_extraction_query, get_dynamic_engine
+from app.services.kg_pipeline_filter_service import FilterConditionError, compile_filter_conditions
+
+# Extraction planning for KG pipeline tasks, done once before a task reads its source:
+# - projection: only the columns the field_mappings use (VIDs, rank, properties) plus the checkpoint
+#   key and the watermark column are selected, instead of SELECT * over wide tables;
+# - validation: mapped columns must exist in the source table and the filter must compile;
+# - EXPLAIN of the task's query: a filtered or incremental read that scans the whole table, or a full
+#   read that has to sort the table for the checkpoint order, is flagged with an index recommendation.
+#   execution_options.force_index names an index to use, or "auto" to use an existing index on the
+#   filtered column when MySQL chose a full scan.
+
+AUTO_INDEX = "auto"
+
+
+class ExtractionPlanError(Exception):
+    """Raised when a task's source query cannot be planned (unknown columns, invalid filter)."""
+
+
+class ExtractionPlan:
+    """What a task selects and how MySQL reads it, according to EXPLAIN."""
+
+    def __init__(self, columns: Optional[List[str]], index_hint: Optional[str] = None):
+        self.columns = columns # None selects every column
+        self.index_hint = index_hint
+        self.table_column_count: Optional[int] = None
+        self.access_type: Optional[str] = None # EXPLAIN type: ALL, index, range, ref, ...
+        self.index_used: Optional[str] = None
+        self.estimated_rows: Optional[int] = None
+        self.full_scan = False
+        self.filesort = False
+        self.recommendation: Optional[str] = None
+        self.warnings: List[str] = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "columns": len(self.columns) if self.columns else None, "table_columns": self.table_column_count,
+            "access_type": self.access_type, "index": self.index_used, "forced_index": self.index_hint,
+            "estimated_rows": self.estimated_rows, "full_scan": self.full_scan, "filesort": self.filesort,
+            "recommendation": self.recommendation, "warnings": self.warnings or None,
+        }
+
+
+def _table_name(table_identifier: str) -> str:
+    return table_identifier.split('.')[-1].strip('`')
+
+def get_table_columns(source_ds: ds_schemas.DataSource, table_identifier: str) -> Optional[List[str]]:
+    """Column names of a source table in ordinal order, or None if the lookup fails."""
+    try:
+        with get_dynamic_engine(source_ds).connect() as connection:
+            rows = connection.execute(sqlalchemy_text(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name ORDER BY ORDINAL_POSITION"
+            ), {"table_name": _table_name(table_identifier)}).fetchall()
+    except Exception as e:
+        print(f"Could not look up columns of {table_identifier}: {e}")
+        return None
+    return [row[0] for row in rows] or None
+
+def get_table_indexes(source_ds: ds_schemas.DataSource, table_identifier: str) -> Dict[str, List[str]]:
+    """Index name -> indexed columns in index order ({} if the lookup fails)."""
+    indexes: Dict[str, List[str]] = {}
+    try:
+        with get_dynamic_engine(source_ds).connect() as connection:
+            rows = connection.execute(sqlalchemy_text(
+                "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+            ), {"table_name": _table_name(table_identifier)}).fetchall()
+    except Exception as e:
+        print(f"Could not look up indexes of {table_identifier}: {e}")
+        return indexes
+    for index_name, column_name in rows:
+        indexes.setdefault(index_name, []).append(column_name)
+    return indexes
+
+
+def _explain(source_ds: ds_schemas.DataSource, query: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        with get_dynamic_engine(source_ds).connect() as connection:
+            row = connection.execute(sqlalchemy_text(f"EXPLAIN {query}"), params).mappings().first()
+    except Exception as e:
+        print(f"Could not EXPLAIN extraction query: {e}")
+        return None
+    return dict(row) if row else None
+
+def _recommend_index(
+    plan: ExtractionPlan, task, columns: List[str], indexes: Dict[str, List[str]], index_option: Optional[str]
+):
+    lowered = [column.lower() for column in columns]
+    for index_name, index_columns in indexes.items():
+        if index_columns and index_columns[0].lower() == lowered[0]:
+            if index_option == AUTO_INDEX:
+                plan.index_hint = index_name
+                plan.recommendation = f"Using index `{index_name}` ({', '.join(index_columns)}) instead of the full scan MySQL chose."
+            else:
+                plan.recommendation = (
+                    f"Index `{index_name}` ({', '.join(index_columns)}) exists but MySQL chose a full scan; "
+                    f"set execution_options.force_index to \"{index_name}\" (or \"auto\") to use it."
+                )
+            return
+    index_name = "idx_kg_" + "_".join(lowered)[:50]
+    plan.recommendation = (
+        f"CREATE INDEX `{index_name}` ON {task.source_entity_identifier} ({', '.join(f'`{c}`' for c in columns)})"
+    )
+
+def plan_extraction(
+    source_ds: ds_schemas.DataSource, task, source_columns: List[str], key_column: Optional[str],
+    watermark_value: Optional[str] = None, project_columns: bool = True, index_option: Optional[str] = None
+) -> ExtractionPlan:
+    """
+    Plans a task's source scan: the projected columns, and MySQL's access path for the task's query.
+    source_columns are the columns the transformer reads. Raises ExtractionPlanError if the filter is
+    invalid or a mapped column is not in the table.
+    """
+    try:
+        compiled_filter = compile_filter_conditions(task.filter_conditions)
+    except FilterConditionError as e:
+        raise ExtractionPlanError(str(e))
+    wanted = list(dict.fromkeys(c for c in list(source_columns) + [key_column, task.watermark_column] if c))
+    plan = ExtractionPlan(wanted if project_columns else None, None if index_option == AUTO_INDEX else index_option)
+
+    table_columns = get_table_columns(source_ds, task.source_entity_identifier)
+    known = None
+    if table_columns is not None:
+        plan.table_column_count = len(table_columns)
+        known = {column.lower() for column in table_columns}
+        missing = [column for column in wanted if column.lower() not in known]
+        if missing:
+            raise ExtractionPlanError(f"Column(s) {', '.join(missing)} used by the task are not in {task.source_entity_identifier}.")
+        if compiled_filter is not None:
+            plan.warnings.extend(
+                f"filter_conditions references {column}, which is not a column of {task.source_entity_identifier}."
+                for column in compiled_filter.columns if column.lower() not in known
+            )
+
+    query, params = build_extraction_query(
+        task, watermark_value=watermark_value, order_key_column=key_column,
+        columns=plan.columns, index_hint=plan.index_hint
+    )
+    explained = _explain(source_ds, query, params)
+    if explained is None:
+        return plan
+    plan.access_type = explained.get("type")
+    plan.index_used = explained.get("key")
+    plan.estimated_rows = int(explained["rows"]) if explained.get("rows") else None
+    plan.filesort = "filesort" in (explained.get("Extra") or "").lower()
+
+    incremental = bool(task.watermark_column and watermark_value is not None)
+    # Reading the whole table is expected for a full read; with a filter or a watermark it is not.
+    plan.full_scan = (compiled_filter is not None or incremental) and plan.access_type == "ALL"
+    if plan.full_scan and not plan.index_hint:
+        filter_columns = [c for c in (compiled_filter.columns if compiled_filter else ()) if known is None or c.lower() in known]
+        index_columns = list(dict.fromkeys(filter_columns + ([task.watermark_column] if incremental else [])))
+        if index_columns:
+            _recommend_index(plan, task, index_columns[:3], get_table_indexes(source_ds, task.source_entity_identifier), index_option)
+        if plan.index_hint:
+            # "auto" picked an index: report the access path the scan will actually use
+            query, params = build_extraction_query(
+                task, watermark_value=watermark_value, order_key_column=key_column,
+                columns=plan.columns, index_hint=plan.index_hint
+            )
+            explained = _explain(source_ds, query, params) or {}
+            plan.access_type = explained.get("type", plan.access_type)
+            plan.index_used = explained.get("key", plan.index_used)
+    elif plan.filesort and key_column and not (compiled_filter is not None or incremental):
+        # The checkpoint order sorts the whole table before the first row arrives
+        plan.recommendation = (
+            f"CREATE INDEX `idx_kg_{key_column.lower()}` ON {task.source_entity_identifier} (`{key_column}`)"
+        )
+    return plan
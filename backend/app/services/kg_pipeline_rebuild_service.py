@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.nebula_connector import get_nebula_session
+
+# Shadow-space rebuilds of a knowledge graph.
+# A rebuild run does not write into the live space: it clones the live space's schema into a shadow
+# space (CREATE SPACE ... AS), drops the shadow's tag/edge indexes so the bulk load does not maintain
+# them row by row, and loads every task into the shadow. Once all tasks succeeded the indexes are
+# created again and built with one REBUILD TAG/EDGE INDEX job each, and the caller switches the KG's
+# space alias (kg_space_aliases) to the shadow. Readers keep using the old space until that switch.
+# The shadow's name is derived from the run, so a resumed run continues loading the same space.
+
+INDEX_KINDS = ("TAG", "EDGE")
+
+class SpaceRebuildError(Exception):
+    """Raised when the shadow space cannot be prepared, indexed or switched to."""
+
+
+def shadow_space_name(alias: str, run_id: int) -> str:
+    return f"{alias}__rebuild_{run_id}"
+
+def _execute(session, statement: str):
+    resp = session.execute(statement)
+    if not resp.is_succeeded():
+        raise SpaceRebuildError(f"'{statement}' failed: {resp.error_msg()}")
+    return resp
+
+def _column_values(resp, index: int = 0) -> List[str]:
+    return [resp.row_values(i)[index].as_string() for i in range(resp.row_size())]
+
+def get_index_definitions(space_name: str) -> List[Tuple[str, str, str]]:
+    """(kind, index name, CREATE statement) of every tag and edge index in a space."""
+    definitions = []
+    with get_nebula_session(space_name=None) as session:
+        _execute(session, f"USE `{space_name}`;")
+        for kind in INDEX_KINDS:
+            for name in _column_values(_execute(session, f"SHOW {kind} INDEXES;")):
+                create_statement = _column_values(_execute(session, f"SHOW CREATE {kind} INDEX `{name}`;"), 1)[0]
+                definitions.append((kind, name, create_statement))
+    return definitions
+
+def prepare_shadow_space(live_space: str, shadow_space: str, log_prefix: str = "") -> List[Tuple[str, str, str]]:
+    """
+    Creates shadow_space with live_space's schema and without its indexes. A resumed run finds the space
+    already there and only drops indexes still left in it. Returns the index definitions to restore with
+    rebuild_shadow_indexes() after the load.
+    """
+    definitions = get_index_definitions(live_space)
+    with get_nebula_session(space_name=None) as session:
+        exists = shadow_space in _column_values(_execute(session, "SHOW SPACES;"))
+        if not exists:
+            _execute(session, f"CREATE SPACE IF NOT EXISTS `{shadow_space}` AS `{live_space}`;")
+    if not exists:
+        time.sleep(settings.KG_PIPELINE_REBUILD_SCHEMA_WAIT_SECONDS) # New schema reaches every graphd with the heartbeat
+        leftover = [(kind, name) for kind, name, _ in definitions]
+    else:
+        leftover = [(kind, name) for kind, name, _ in get_index_definitions(shadow_space)]
+    if leftover:
+        with get_nebula_session(space_name=None) as session:
+            _execute(session, f"USE `{shadow_space}`;")
+            for kind, name in leftover:
+                _execute(session, f"DROP {kind} INDEX IF EXISTS `{name}`;")
+        time.sleep(settings.KG_PIPELINE_REBUILD_SCHEMA_WAIT_SECONDS)
+    print(
+        f"{log_prefix} Shadow space {shadow_space} {'resumed' if exists else 'ready'} (schema of {live_space}; "
+        f"{len(definitions)} indexes deferred until after the load)."
+    )
+    return definitions
+
+def _wait_for_job(session, job_id: int, stop_event: threading.Event) -> str:
+    while True:
+        status = _execute(session, f"SHOW JOB {job_id};").row_values(0)[2].as_string()
+        if status not in ("QUEUE", "RUNNING") or stop_event.is_set():
+            return status
+        stop_event.wait(settings.KG_PIPELINE_REBUILD_POLL_SECONDS)
+
+def rebuild_shadow_indexes(
+    shadow_space: str, definitions: List[Tuple[str, str, str]], stop_event: threading.Event, log_prefix: str = ""
+):
+    """Creates the deferred indexes in the loaded shadow space and builds them with one job per kind."""
+    if not definitions:
+        return
+    with get_nebula_session(space_name=None) as session:
+        _execute(session, f"USE `{shadow_space}`;")
+        for _, _, create_statement in definitions:
+            _execute(session, create_statement)
+    time.sleep(settings.KG_PIPELINE_REBUILD_SCHEMA_WAIT_SECONDS)
+    with get_nebula_session(space_name=None) as session:
+        _execute(session, f"USE `{shadow_space}`;")
+        jobs: Dict[str, int] = {}
+        for kind in INDEX_KINDS:
+            names = [name for index_kind, name, _ in definitions if index_kind == kind]
+            if names:
+                resp = _execute(session, f"REBUILD {kind} INDEX {', '.join(f'`{n}`' for n in names)};")
+                jobs[kind] = resp.row_values(0)[0].as_int()
+                print(f"{log_prefix} REBUILD {kind} INDEX job {jobs[kind]} started for {len(names)} indexes.")
+        for kind, job_id in jobs.items():
+            status = _wait_for_job(session, job_id, stop_event)
+            if stop_event.is_set():
+                raise SpaceRebuildError(f"Run stopped while REBUILD {kind} INDEX job {job_id} was {status}.")
+            if status != "FINISHED":
+                raise SpaceRebuildError(f"REBUILD {kind} INDEX job {job_id} ended with status {status}.")
+    print(f"{log_prefix} Indexes of shadow space {shadow_space} rebuilt.")
+
+def drop_space(space_name: str, log_prefix: str = "") -> Optional[str]:
+    """Drops a space no longer served; returns the error message instead of raising."""
+    try:
+        with get_nebula_session(space_name=None) as session:
+            _execute(session, f"DROP SPACE IF EXISTS `{space_name}`;")
+    except Exception as e:
+        print(f"{log_prefix} Failed to drop space {space_name}: {e}")
+        return str(e)
+    print(f"{log_prefix} Dropped previous space {space_name}.")
+    return None
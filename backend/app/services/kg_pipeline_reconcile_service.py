@@ -0,0 +1,204 @@
+import glob
+import heapq
+import itertools
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.api.v1.schemas import kg_pipeline_task_schemas
+from app.core.config import settings
+from app.services.kg_pipeline_fingerprint_service import RowFingerprintStore, values_item_key
+from app.services.kg_pipeline_write_service import NebulaInsertBatcher, NebulaWriterPool, get_task_option
+
+# Deletion sync for KG pipeline tasks.
+# While a task runs, the key of every row it reads (VID, or "src -> dst@rank" for edges, as nGQL
+# literals) is appended to a spill file. When the task has read its whole source, the spill file is
+# sorted externally (sorted runs of a bounded size, then a k-way merge) into a sorted, de-duplicated
+# key file, and compared with the key file of the task's previous complete run into the same graph
+# space by a merge walk; a rebuild's shadow space or a new target KG starts its own baseline. Keys only
+# in the previous file belong to rows deleted from the source; they are deleted from Nebula in batches.
+# Memory stays bounded by the sort buffer, whatever the table size.
+
+class DeletionSyncError(Exception):
+    """Raised when the deletions of a task cannot be synced to Nebula."""
+
+
+def _task_key_dir(task, space_name: str) -> str:
+    return os.path.join(settings.KG_PIPELINE_STATE_DIR, "keys", space_name, f"task_{task.id}")
+
+def _encode_key(key: str) -> str:
+    # One key per line. Raw line breaks inside string literals become \n / \r escapes, which nGQL
+    # reads back as the same string, so keys are used in DELETE statements as they are stored.
+    return key.replace("\n", "\\n").replace("\r", "\\r") + "\n"
+
+_KEY_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+_KEY_LINE_BREAKS = {"n": "\n", "r": "\r"}
+
+def _decode_key(key: str) -> str:
+    # The key as the transformer produced it: literals escape backslashes, so every \n / \r is one of ours
+    if "\\" not in key:
+        return key
+    return _KEY_ESCAPE_RE.sub(lambda m: _KEY_LINE_BREAKS.get(m.group(1), m.group(0)), key)
+
+
+class SeenKeyRecorder:
+    """
+    Appends the keys of the rows a task reads to the spill file of the current run. The file survives
+    failed attempts, so a resumed task still ends up with every key of the run.
+    """
+
+    def __init__(self, task, space_name: str, run_id: int, fresh: bool):
+        self.directory = _task_key_dir(task, space_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.spill_path = os.path.join(self.directory, f"run_{run_id}.spill")
+        for stale in glob.glob(os.path.join(self.directory, "run_*.spill")):
+            if stale != self.spill_path:
+                os.remove(stale) # Left by runs that never completed
+        self._file = open(self.spill_path, "w" if fresh else "a", encoding="utf-8")
+
+    def record(self, items: Iterable[str]):
+        self._file.writelines(_encode_key(values_item_key(item)) for item in items)
+
+    def tap(self, transformed: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """Passes (prefix, item) pairs through, recording their keys."""
+        write = self._file.write
+        for prefix, item in transformed:
+            write(_encode_key(values_item_key(item)))
+            yield prefix, item
+
+    def sync(self):
+        """Makes the recorded keys durable; called before a checkpoint that covers them is saved."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+
+def sort_key_file(spill_path: str, sorted_path: str, buffer_keys: Optional[int] = None) -> int:
+    """External sort with de-duplication of a key file. Returns the number of distinct keys."""
+    buffer_keys = max(1000, int(buffer_keys or settings.KG_PIPELINE_DELETION_SYNC_SORT_BUFFER_KEYS))
+    run_paths: List[str] = []
+    try:
+        with open(spill_path, encoding="utf-8") as spill:
+            while True:
+                lines = list(itertools.islice(spill, buffer_keys))
+                if not lines:
+                    break
+                lines.sort()
+                run_path = f"{sorted_path}.run{len(run_paths)}"
+                with open(run_path, "w", encoding="utf-8") as run_file:
+                    run_file.writelines(lines)
+                run_paths.append(run_path)
+        run_files = [open(path, encoding="utf-8") for path in run_paths]
+        distinct = 0
+        try:
+            with open(sorted_path, "w", encoding="utf-8") as out:
+                previous = None
+                for line in heapq.merge(*run_files):
+                    if line != previous:
+                        out.write(line)
+                        distinct += 1
+                        previous = line
+        finally:
+            for run_file in run_files:
+                run_file.close()
+        return distinct
+    finally:
+        for path in run_paths:
+            os.remove(path)
+
+
+def iter_removed_keys(previous_path: str, current_path: str) -> Iterator[str]:
+    """Keys in the sorted previous file that are missing from the sorted current file (merge walk)."""
+    with open(previous_path, encoding="utf-8") as previous, open(current_path, encoding="utf-8") as current:
+        current_line = next(current, None)
+        for line in previous:
+            while current_line is not None and current_line < line:
+                current_line = next(current, None)
+            if current_line != line:
+                yield line[:-1]
+
+
+def _delete_prefix(task) -> str:
+    if task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+        # Only this task's tag: other tasks may write other tags on the same vertices
+        return f"DELETE TAG `{task.target_label_or_type}` FROM"
+    return f"DELETE EDGE `{task.target_label_or_type}`"
+
+
+def sync_task_deletions(
+    task, recorder: SeenKeyRecorder, space_name: str, log_prefix: str = "", rate_limiter=None,
+    fingerprint_store: Optional[RowFingerprintStore] = None
+) -> int:
+    """
+    Deletes the vertices' tag / the edges whose keys were seen by the task's previous complete run but
+    not by this one, then makes this run's keys the new baseline. Returns the number of deleted keys.
+    The deleted keys' fingerprints are dropped from fingerprint_store, so a row that comes back with the
+    same values is written again instead of being skipped as unchanged.
+    Refuses to delete more than max_delete_fraction of the previous keys, which usually means the
+    source was truncated or unreachable rather than cleaned up.
+    """
+    recorder.sync()
+    recorder.close()
+    current_path = os.path.join(recorder.directory, "current.keys")
+    previous_path = os.path.join(recorder.directory, "previous.keys")
+    key_count = sort_key_file(recorder.spill_path, current_path)
+    if not os.path.exists(previous_path):
+        os.replace(current_path, previous_path)
+        recorder.discard()
+        print(f"{log_prefix} Deletion sync: recorded {key_count} keys as the baseline for the next run.")
+        return 0
+
+    with open(previous_path, encoding="utf-8") as previous:
+        previous_count = sum(1 for _ in previous)
+    removed_count = sum(1 for _ in iter_removed_keys(previous_path, current_path))
+    max_fraction = float(get_task_option(task, "max_delete_fraction", settings.KG_PIPELINE_MAX_DELETE_FRACTION))
+    if previous_count and removed_count > max_fraction * previous_count:
+        os.remove(current_path) # Keep the previous baseline; nothing was deleted
+        raise DeletionSyncError(
+            f"{removed_count} of {previous_count} keys disappeared from the source, more than max_delete_fraction "
+            f"{max_fraction:g}. Not deleting; raise max_delete_fraction if this is intended."
+        )
+
+    if removed_count:
+        print(f"{log_prefix} Deletion sync: deleting {removed_count} keys no longer in the source.")
+        batcher = NebulaInsertBatcher(max_rows=get_task_option(task, "batch_max_rows"))
+        pool = NebulaWriterPool(
+            space_name=space_name, num_workers=get_task_option(task, "writer_workers"),
+            log_prefix=log_prefix, rate_limiter=rate_limiter, max_error_rate=0 # A failed delete leaves the baseline as it was
+        ).start()
+        prefix = _delete_prefix(task)
+        try:
+            for key in iter_removed_keys(previous_path, current_path):
+                for batch in batcher.add(prefix, key):
+                    if not pool.submit(batch):
+                        break
+                if pool.failed:
+                    break
+            for batch in batcher.flush():
+                pool.submit(batch)
+        finally:
+            try:
+                pool.close()
+            except Exception as e:
+                os.remove(current_path)
+                raise DeletionSyncError(f"Deleting removed keys failed: {e}")
+        if fingerprint_store is not None:
+            try:
+                fingerprint_store.forget(_decode_key(key) for key in iter_removed_keys(previous_path, current_path))
+            except Exception as e:
+                os.remove(current_path) # The next run deletes the keys again and retries
+                raise DeletionSyncError(f"Forgetting fingerprints of deleted keys failed: {e}")
+    os.replace(current_path, previous_path)
+    recorder.discard()
+    print(f"{log_prefix} Deletion sync: {removed_count} deleted, {key_count} keys in the new baseline.")
+    return removed_count
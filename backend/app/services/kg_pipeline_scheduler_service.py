@@ -0,0 +1,124 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+from zoneinfo import ZoneInfo
+
+from croniter import croniter
+from sqlalchemy.orm import Session
+
+from app.api.v1.schemas import kg_pipeline_schemas
+from app.core.config import settings
+from app.crud import crud_kg_pipeline, crud_kg_pipeline_run
+from app.db.session import SessionLocal
+from app.services.kg_pipeline_execution_service import run_kg_pipeline_background
+
+# Cron scheduler for KGPipeline.schedule.
+# Each pipeline stores its next trigger time (next_scheduled_run_at, UTC, with jitter applied).
+# A due trigger is claimed with a compare-and-set on that column, so several API/worker processes
+# can run the scheduler and each trigger still creates at most one run.
+# - Coalescing: after a trigger the next one is the first cron time after *now*, so triggers missed
+#   while the service was down, or while the scheduler waited, collapse into one run; a trigger while
+#   the pipeline already has max_runs_per_pipeline active runs is skipped instead of piling up.
+# - Global limit: while max_concurrent_runs runs are active, due triggers wait for a later tick.
+# - Jitter: each trigger is delayed by a random 0..jitter_seconds (capped at half the cron period).
+
+def _next_trigger(schedule: str, after_utc: datetime, jitter_seconds: float) -> datetime:
+    """First cron time after after_utc (naive UTC), plus jitter; cron is read in the scheduler time zone."""
+    tz = ZoneInfo(settings.KG_PIPELINE_SCHEDULER_TIMEZONE)
+    base = after_utc.replace(tzinfo=timezone.utc).astimezone(tz)
+    cron = croniter(schedule, base)
+    first = cron.get_next(datetime)
+    second = cron.get_next(datetime)
+    max_jitter = min(float(jitter_seconds), (second - first).total_seconds() / 2)
+    fire_at = first.astimezone(timezone.utc).replace(tzinfo=None)
+    return fire_at + timedelta(seconds=random.uniform(0, max_jitter) if max_jitter > 0 else 0)
+
+def _pipeline_option(pipeline, key: str, default):
+    value = (pipeline.execution_options or {}).get(key)
+    return default if value is None else value
+
+
+class KGPipelineScheduler:
+    """Creates runs for due pipeline schedules; run() polls until stop() is called."""
+
+    def __init__(self, poll_seconds: Optional[float] = None):
+        self.poll_seconds = poll_seconds or settings.KG_PIPELINE_SCHEDULER_POLL_SECONDS
+        self._stop_event = asyncio.Event()
+        self._background_runs: Set["asyncio.Task"] = set() # Runs executed in this process (background mode)
+
+    def stop(self):
+        self._stop_event.set()
+
+    async def run(self):
+        print(f"KG pipeline scheduler started (poll every {self.poll_seconds}s, time zone {settings.KG_PIPELINE_SCHEDULER_TIMEZONE}).")
+        while not self._stop_event.is_set():
+            try:
+                due_runs = await asyncio.to_thread(self._tick)
+                for pipeline_id, run_id in due_runs:
+                    self._dispatch(pipeline_id, run_id)
+            except Exception as e:
+                print(f"KG pipeline scheduler tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+        print("KG pipeline scheduler stopped.")
+
+    def _dispatch(self, pipeline_id: int, run_id: int):
+        if settings.KG_PIPELINE_EXECUTION_MODE == "queue":
+            return # A pipeline worker claims the PENDING run
+        run_task = asyncio.create_task(run_kg_pipeline_background(pipeline_id=pipeline_id, db_pipeline_run_id=run_id))
+        self._background_runs.add(run_task)
+        run_task.add_done_callback(self._background_runs.discard)
+
+    def _tick(self):
+        """Plans and fires due schedules. Returns [(pipeline_id, run_id)] of the runs it created."""
+        db: Session = SessionLocal()
+        created = []
+        try:
+            now = datetime.utcnow()
+            for pipeline in crud_kg_pipeline.get_scheduled_kg_pipelines(db):
+                run_id = self._check_pipeline(db, pipeline, now)
+                if run_id is not None:
+                    created.append((pipeline.id, run_id))
+        finally:
+            db.close()
+        return created
+
+    def _check_pipeline(self, db: Session, pipeline, now: datetime) -> Optional[int]:
+        jitter = _pipeline_option(pipeline, "schedule_jitter_seconds", settings.KG_PIPELINE_SCHEDULER_JITTER_SECONDS)
+        due_at = pipeline.next_scheduled_run_at
+        try:
+            next_at = _next_trigger(pipeline.schedule, now, jitter)
+        except Exception as e:
+            print(f"Pipeline {pipeline.id} has an invalid schedule '{pipeline.schedule}': {e}")
+            return None
+        if due_at is None:
+            # Newly scheduled (or schedule changed): plan the first trigger, don't fire now
+            if crud_kg_pipeline.claim_kg_pipeline_schedule_slot(db, pipeline.id, None, next_at):
+                print(f"Pipeline {pipeline.id} scheduled '{pipeline.schedule}', next run at {next_at} UTC.")
+            return None
+        if due_at > now:
+            return None
+        # Runs left PENDING/RUNNING by a process that died (no lease, no heartbeat) don't count
+        stale_before = now - timedelta(seconds=settings.KG_PIPELINE_SCHEDULER_STALE_RUN_SECONDS)
+        pending_never_stale = settings.KG_PIPELINE_EXECUTION_MODE == "queue" # Queued runs wait for a worker
+        if crud_kg_pipeline_run.count_active_kg_pipeline_runs(
+            db, stale_before=stale_before, pending_never_stale=pending_never_stale
+        ) >= settings.KG_PIPELINE_SCHEDULER_MAX_CONCURRENT_RUNS:
+            return None # Global limit reached: keep the trigger due and retry on the next tick
+        if not crud_kg_pipeline.claim_kg_pipeline_schedule_slot(db, pipeline.id, due_at, next_at):
+            return None # Another scheduler took this trigger
+        max_runs = int(_pipeline_option(pipeline, "max_concurrent_runs", settings.KG_PIPELINE_SCHEDULER_MAX_RUNS_PER_PIPELINE))
+        active_runs = crud_kg_pipeline_run.count_active_kg_pipeline_runs(
+            db, pipeline_id=pipeline.id, stale_before=stale_before, pending_never_stale=pending_never_stale
+        )
+        if active_runs >= max_runs:
+            print(f"Pipeline {pipeline.id} still has {active_runs} active run(s); coalescing the trigger due at {due_at}. Next run at {next_at} UTC.")
+            return None
+        db_run = crud_kg_pipeline_run.create_kg_pipeline_run(
+            db, run_create=kg_pipeline_schemas.KGPipelineRunCreate(pipeline_id=pipeline.id)
+        )
+        print(f"Pipeline {pipeline.id} triggered by schedule '{pipeline.schedule}' (due {due_at}): run {db_run.id}. Next run at {next_at} UTC.")
+        return db_run.id
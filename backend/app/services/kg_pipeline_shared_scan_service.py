@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.api.v1.schemas import data_source_schemas as ds_schemas
+from app.api.v1.schemas import kg_pipeline_task_schemas
+from app.core.config import settings
+from app.services.kg_pipeline_extract_service import KeyRange, SourceExtractionError, iter_partitioned_row_chunks
+from app.services.kg_pipeline_write_service import get_task_option
+
+# Shared source scans for KG pipeline tasks.
+# Tasks of a run that read the same table of the same data source with the same filter and watermark
+# form a scan group. The runner schedules a group as one unit, so its members start together. Each
+# member plans its scan as usual and then joins the group: one reader thread streams the table once,
+# with the union of the members' columns, and fans every chunk out to a bounded queue per member. The
+# member transforms, writes and checkpoints the chunks as if it had read them itself; the slowest
+# member paces the scan. Members that need a different scan (resuming from their own checkpoint,
+# another checkpoint key or chunk format) read the table on their own.
+
+_SCAN_DONE = object() # End of the shared scan on a member's queue
+
+
+def _scan_group_key(task, full_refresh: bool) -> Tuple[Any, ...]:
+    filter_conditions = " ".join((task.filter_conditions or "").split())
+    watermark_from = None if full_refresh else task.last_watermark_value
+    return (
+        task.source_data_source_id, task.source_entity_identifier.strip().lower(), filter_conditions,
+        task.watermark_column, watermark_from if task.watermark_column else None,
+    )
+
+def _depends_on(deps: Dict[int, Set[int]], start: Iterable[int], targets: Set[int]) -> bool:
+    """Whether any task reachable from start (following dependencies) is in targets."""
+    seen: Set[int] = set()
+    stack = list(start)
+    while stack:
+        task_id = stack.pop()
+        if task_id in targets:
+            return True
+        if task_id not in seen:
+            seen.add(task_id)
+            stack.extend(deps.get(task_id, ()))
+    return False
+
+def plan_shared_scans(tasks: List[Any], deps: Dict[int, Set[int]], full_refresh: bool) -> List[List[int]]:
+    """
+    Groups the tasks of a run that can share one scan of their source table. A task is left out when it
+    must see another candidate's result first: a later task writing the same tag/edge type, or a
+    RELATIONSHIP task checking its edges against the VID index a member NODE task builds. Merging a group
+    must also keep the dependency graph acyclic.
+    """
+    candidates: Dict[Tuple[Any, ...], List[Any]] = {}
+    for task in sorted(tasks, key=lambda t: t.task_order):
+        if get_task_option(task, "shared_scan", settings.KG_PIPELINE_SHARED_SCANS):
+            candidates.setdefault(_scan_group_key(task, full_refresh), []).append(task)
+
+    groups: List[List[int]] = []
+    for members in candidates.values():
+        group: List[Any] = []
+        for task in members:
+            group_ids = {t.id for t in group}
+            if any(t.mapping_type == task.mapping_type and t.target_label_or_type == task.target_label_or_type for t in group):
+                continue
+            if (
+                task.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.RELATIONSHIP
+                and get_task_option(task, "vid_index", settings.KG_PIPELINE_VID_INDEX)
+                and deps[task.id] & group_ids
+            ):
+                continue # Its dangling-edge check needs the member's finished VID index
+            # External dependencies must not lead back into the group once it runs as one unit
+            external = (deps[task.id] | set().union(*(deps[t.id] for t in group))) - group_ids - {task.id}
+            if _depends_on(deps, external, group_ids | {task.id}):
+                continue
+            group.append(task)
+        if len(group) > 1:
+            groups.append([t.id for t in group])
+    return groups
+
+
+class ScanSpec:
+    """The scan a member task would run on its own, compared to decide who can share."""
+
+    def __init__(
+        self, task, source_ds: ds_schemas.DataSource, key_column: Optional[str], partitions: List[KeyRange],
+        watermark_value: Optional[str], columnar: bool, chunk_size: int,
+        columns: Optional[List[str]], index_hint: Optional[str], resuming: bool
+    ):
+        # Only plain attributes: the task's ORM object belongs to the member's session and thread
+        self.task = SimpleNamespace(
+            source_entity_identifier=task.source_entity_identifier, filter_conditions=task.filter_conditions,
+            watermark_column=task.watermark_column,
+        )
+        self.source_ds = source_ds
+        self.key_column = key_column
+        self.partitions = partitions
+        self.watermark_value = watermark_value
+        self.columnar = columnar
+        self.chunk_size = chunk_size
+        self.columns = columns
+        self.index_hint = index_hint
+        self.resuming = resuming
+
+    def compatibility_key(self) -> Tuple[Any, ...]:
+        return (self.key_column, len(self.partitions), self.watermark_value, self.columnar)
+
+
+class SharedScanSubscription:
+    """
+    A member's view of a shared scan: the scan's key ranges, and an iterator over its (partition, chunk)
+    pairs that stands in for iter_partitioned_row_chunks. close() leaves the scan.
+    """
+
+    def __init__(self, scan: "SharedScan", task_id: int, partitions: List[KeyRange], members: int):
+        self.scan = scan
+        self.task_id = task_id
+        self.partitions = partitions
+        self.members = members
+        self.queue: "queue.Queue" = queue.Queue(maxsize=settings.KG_PIPELINE_SHARED_SCAN_QUEUE_CHUNKS)
+
+    def __iter__(self) -> Iterator[Tuple[int, Any]]:
+        return self
+
+    def __next__(self) -> Tuple[int, Any]:
+        item = self.queue.get()
+        if item is _SCAN_DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item if isinstance(item, SourceExtractionError) else SourceExtractionError(str(item))
+        return item
+
+    def close(self):
+        self.scan.leave(self.task_id) # The scan stops feeding this member
+
+
+class SharedScan:
+    """One scan group of a run; see plan_shared_scans."""
+
+    def __init__(self, task_ids: Iterable[int], log_prefix: str = ""):
+        self.log_prefix = log_prefix
+        self._cond = threading.Condition()
+        self._pending: Set[int] = set(task_ids) # Members that have neither joined nor left
+        self._specs: Dict[int, ScanSpec] = {}
+        self._subscriptions: Dict[int, SharedScanSubscription] = {}
+        self._decided = False
+
+    def join(self, task_id: int, spec: ScanSpec, stop_event: threading.Event) -> Optional[SharedScanSubscription]:
+        """
+        Waits until every member joined or left, then returns this member's subscription, or None if it
+        has to read the table on its own. Members still setting up after the join timeout are left out.
+        """
+        deadline = time.monotonic() + settings.KG_PIPELINE_SHARED_SCAN_JOIN_TIMEOUT_SECONDS
+        with self._cond:
+            if self._decided:
+                self._pending.discard(task_id)
+                return None
+            self._specs[task_id] = spec
+            self._pending.discard(task_id)
+            self._cond.notify_all()
+            while self._pending and not self._decided and not stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=min(remaining, 1.0))
+            if stop_event.is_set():
+                self._specs.pop(task_id, None)
+                return None
+            if not self._decided:
+                self._decide()
+            return self._subscriptions.get(task_id)
+
+    def leave(self, task_id: int):
+        """A member is not (or no longer) reading the shared scan."""
+        with self._cond:
+            self._pending.discard(task_id)
+            self._subscriptions.pop(task_id, None)
+            self._cond.notify_all()
+
+    def _decide(self):
+        self._decided = True
+        groups: Dict[Tuple[Any, ...], List[int]] = {}
+        for task_id, spec in self._specs.items():
+            if not spec.resuming:
+                groups.setdefault(spec.compatibility_key(), []).append(task_id)
+        members = max(groups.values(), key=len, default=[])
+        if len(members) < 2:
+            print(f"{self.log_prefix} Shared scan not possible; tasks {sorted(self._specs)} read their source separately.")
+            return
+        leader = self._specs[members[0]]
+        column_lists = [self._specs[task_id].columns for task_id in members]
+        columns = None if any(c is None for c in column_lists) else list(dict.fromkeys(c for cols in column_lists for c in cols))
+        for task_id in members:
+            self._subscriptions[task_id] = SharedScanSubscription(self, task_id, leader.partitions, len(members))
+        print(
+            f"{self.log_prefix} Tasks {members} share one scan of {leader.task.source_entity_identifier} "
+            f"({len(columns) if columns else 'all'} columns)."
+        )
+        threading.Thread(
+            target=self._read, args=(leader, columns), name=f"shared-scan-{members[0]}", daemon=True
+        ).start()
+
+    def _active(self) -> List[SharedScanSubscription]:
+        with self._cond:
+            return list(self._subscriptions.values())
+
+    def _deliver(self, item) -> bool:
+        """Puts item on every active member's queue; False once no member is left."""
+        pending = self._active()
+        while pending:
+            still_waiting = []
+            for subscription in pending:
+                try:
+                    subscription.queue.put(item, timeout=0.5)
+                except queue.Full:
+                    still_waiting.append(subscription)
+            active = self._active()
+            pending = [s for s in still_waiting if s in active] # Members that left are not waited for
+            if not active:
+                return False
+        return True
+
+    def _read(self, leader: ScanSpec, columns: Optional[List[str]]):
+        chunks = iter_partitioned_row_chunks(
+            leader.source_ds, leader.task, leader.key_column, leader.partitions, leader.chunk_size,
+            watermark_value=leader.watermark_value, columnar=leader.columnar,
+            columns=columns, index_hint=leader.index_hint
+        )
+        try:
+            for item in chunks:
+                if not self._deliver(item):
+                    return
+            self._deliver(_SCAN_DONE)
+        except Exception as e:
+            self._deliver(e)
+        finally:
+            chunks.close()
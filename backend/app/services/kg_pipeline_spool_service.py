@@ -0,0 +1,335 @@
+import glob
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.kg_pipeline_write_service import ChunkCommitTracker, NebulaInsertBatch
+
+# On-disk spool between a task's transform stage and its Nebula writers.
+# Transformed batches are appended to segment files in the state dir instead of the writers' in-memory
+# queue, and a feeder thread memory-maps the segments and hands the batches to the writer pool at
+# graphd's pace. The source scan only waits for the disk (and for max_bytes of not yet fed batches), so
+# it finishes and releases its connection while writes are still catching up.
+# Each chunk's batches are followed by a seal record holding the chunk's checkpoint. Segments are
+# deleted once the task's checkpoint covers them; after a failed or interrupted attempt, the next one
+# replays the spooled chunks the checkpoint does not cover yet and continues reading the source after
+# the last of them.
+#
+# Record: <length u32><kind u8><crc32 u32> then length bytes of payload.
+# Batch payload: <chunk seq u64><prefix length u32><item count u32>, prefix, item lengths (u32 each),
+# items, then 16 bytes per item of row fingerprints when the batch carries them.
+# Seal payload: <chunk seq u64> then the pickled checkpoint of the chunk.
+
+_RECORD_HEADER = struct.Struct("<IBI")
+_BATCH_HEADER = struct.Struct("<QII")
+_SEAL_HEADER = struct.Struct("<Q")
+_BATCH = 1
+_SEAL = 2
+_FINGERPRINT_SIZE = 16 # Two 8-byte digests, see kg_pipeline_fingerprint_service
+
+
+def _encode_batch(batch: NebulaInsertBatch) -> bytes:
+    prefix = batch.prefix.encode("utf-8")
+    items = [item.encode("utf-8") for item in batch.items]
+    parts = [
+        _BATCH_HEADER.pack(batch.chunk_seq, len(prefix), len(items)), prefix,
+        struct.pack(f"<{len(items)}I", *map(len, items)),
+    ]
+    parts.extend(items)
+    if batch.fingerprints:
+        parts.extend(key + row for key, row in batch.fingerprints)
+    return b"".join(parts)
+
+def _decode_batch(payload: bytes) -> NebulaInsertBatch:
+    chunk_seq, prefix_length, count = _BATCH_HEADER.unpack_from(payload)
+    offset = _BATCH_HEADER.size
+    batch = NebulaInsertBatch(payload[offset:offset + prefix_length].decode("utf-8"))
+    offset += prefix_length
+    lengths = struct.unpack_from(f"<{count}I", payload, offset)
+    offset += 4 * count
+    items = []
+    for length in lengths:
+        items.append(payload[offset:offset + length].decode("utf-8"))
+        offset += length
+    batch.items = items
+    batch.size_bytes += sum(lengths) + 2 * len(lengths)
+    batch.chunk_seq = chunk_seq
+    if len(payload) - offset == _FINGERPRINT_SIZE * count:
+        batch.fingerprints = [
+            (payload[o:o + 8], payload[o + 8:o + _FINGERPRINT_SIZE])
+            for o in range(offset, len(payload), _FINGERPRINT_SIZE)
+        ]
+    return batch
+
+def _record(kind: int, payload: bytes) -> bytes:
+    return _RECORD_HEADER.pack(len(payload), kind, zlib.crc32(payload)) + payload
+
+def _iter_records(view, offset: int, end: int) -> Iterator[Tuple[int, bytes, int]]:
+    """(kind, payload, end offset) of the complete, intact records in view[offset:end]."""
+    while offset + _RECORD_HEADER.size <= end:
+        length, kind, crc = _RECORD_HEADER.unpack_from(view, offset)
+        payload_end = offset + _RECORD_HEADER.size + length
+        if payload_end > end:
+            return # Torn write
+        payload = view[offset + _RECORD_HEADER.size:payload_end]
+        if zlib.crc32(payload) != crc or kind not in (_BATCH, _SEAL):
+            return
+        yield kind, payload, payload_end
+        offset = payload_end
+
+
+class _SpoolSegment:
+    def __init__(self, path: str, read_offset: int = 0, size: int = 0, rotated: bool = False):
+        self.path = path
+        self.size = size # Bytes of complete records
+        self.read_offset = read_offset # Where the feeder continues
+        self.rotated = rotated # No more records will be appended
+        self.last_rows = 0 # Rows read from the source up to the segment's last sealed chunk
+        self.deleted = False
+
+
+class SpooledChunk:
+    """A chunk found in the spool of an earlier attempt: its batch count and checkpoint."""
+
+    def __init__(self, seq: int, batches: int, checkpoint: Dict[str, Any], segment_index: int, offset: int):
+        self.seq = seq
+        self.batches = batches
+        self.checkpoint = checkpoint
+        self.segment_index = segment_index
+        self.offset = offset
+
+
+class SpoolReplay:
+    """The spooled chunks an attempt resends before reading the source again."""
+
+    def __init__(self, chunks: List[SpooledChunk]):
+        self.chunks = chunks
+        self.first_chunk_seq = chunks[0].seq
+        self.next_chunk_seq = chunks[-1].seq + 1
+        self.checkpoint = chunks[-1].checkpoint # Where extraction continues
+        self.rows = self.checkpoint["rows_transformed"] - chunks[0].checkpoint["rows_transformed"] + chunks[0].checkpoint["chunk_rows"]
+        self.batches = sum(chunk.batches for chunk in chunks)
+
+    def prime(self, commit_tracker: ChunkCommitTracker):
+        """Registers the replayed chunks as submitted and sealed; they commit once the feeder's writes finish."""
+        for chunk in self.chunks:
+            for _ in range(chunk.batches):
+                commit_tracker.batch_submitted(chunk.seq)
+            checkpoint = chunk.checkpoint
+            commit_tracker.seal(chunk.seq, (checkpoint["rows_transformed"], checkpoint["rows_submitted"], checkpoint["positions"]))
+
+
+class BatchSpool:
+    """
+    The spool of one task in one pipeline run. append_batch()/append_seal() run on the task's thread,
+    the feeder started by start_feeding() on its own thread.
+    """
+
+    def __init__(self, task, run_id: int, log_prefix: str = ""):
+        task_dir = os.path.join(settings.KG_PIPELINE_STATE_DIR, "spool", f"task_{task.id}")
+        self.directory = os.path.join(task_dir, f"run_{run_id}")
+        for stale in glob.glob(os.path.join(task_dir, "run_*")):
+            if stale != self.directory:
+                shutil.rmtree(stale, ignore_errors=True) # Left by runs that never completed
+        os.makedirs(self.directory, exist_ok=True)
+        self.log_prefix = log_prefix
+        self.segment_bytes = max(1 << 20, int(settings.KG_PIPELINE_SPOOL_SEGMENT_BYTES))
+        self.max_bytes = max(self.segment_bytes, int(settings.KG_PIPELINE_SPOOL_MAX_BYTES))
+        self.next_chunk_seq = 0
+        self._cond = threading.Condition()
+        self._segments: List[_SpoolSegment] = []
+        self._file = None
+        self._unfed_bytes = 0
+        self._finished = False # No more records will be appended
+        self._closed = False # The feeder stops, appends are dropped
+        self._feeder: Optional[threading.Thread] = None
+
+    def _segment_path(self, chunk_seq: int) -> str:
+        return os.path.join(self.directory, f"segment_{chunk_seq:012d}.spool")
+
+    def recover(self, committed_rows: int) -> Optional[SpoolReplay]:
+        """
+        Looks for chunks spooled by an earlier attempt that the checkpoint (committed_rows rows read)
+        does not cover. Keeps the spool from the first of them on and returns them, or empties the
+        spool and returns None when there is nothing to replay or the spool does not continue the checkpoint.
+        """
+        chunks: List[SpooledChunk] = []
+        segments: List[_SpoolSegment] = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "segment_*.spool"))):
+            size = os.path.getsize(path)
+            segment = _SpoolSegment(path, rotated=True)
+            segments.append(segment)
+            if not size:
+                continue
+            valid_end = 0
+            chunk_start, batches = 0, 0
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                for kind, payload, end in _iter_records(view, 0, size):
+                    if kind == _BATCH:
+                        batches += 1
+                        continue
+                    (seq,) = _SEAL_HEADER.unpack_from(payload)
+                    checkpoint = pickle.loads(payload[_SEAL_HEADER.size:])
+                    chunks.append(SpooledChunk(seq, batches, checkpoint, len(segments) - 1, chunk_start))
+                    segment.last_rows = checkpoint["rows_transformed"]
+                    chunk_start, batches, valid_end = end, 0, end
+            segment.size = valid_end
+            if valid_end < size:
+                # Interrupted while writing: the chunk without a seal is read from the source again
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+                for later in glob.glob(os.path.join(self.directory, "segment_*.spool")):
+                    if later > path:
+                        os.remove(later)
+                break
+
+        pending = [chunk for chunk in chunks if chunk.checkpoint["rows_transformed"] > committed_rows]
+        first = pending[0] if pending else None
+        if (
+            first is None
+            or first.checkpoint["rows_transformed"] - first.checkpoint["chunk_rows"] != committed_rows
+            or any(chunk.seq != first.seq + i for i, chunk in enumerate(pending))
+        ):
+            if chunks:
+                print(f"{self.log_prefix} Spooled batches do not continue the checkpoint; reading the source again.")
+            self.reset()
+            return None
+        for segment in segments[:first.segment_index]:
+            os.remove(segment.path)
+        self._segments = segments[first.segment_index:]
+        self._segments[0].read_offset = first.offset
+        self._unfed_bytes = sum(s.size for s in self._segments) - first.offset
+        self.next_chunk_seq = pending[-1].seq + 1
+        return SpoolReplay(pending)
+
+    def reset(self):
+        """Drops every spooled record; the next append starts a new spool."""
+        for path in glob.glob(os.path.join(self.directory, "segment_*.spool")):
+            os.remove(path)
+        self._segments = []
+        self._unfed_bytes = 0
+
+    def _append(self, data: bytes, chunk_seq: int):
+        with self._cond:
+            # Bounds the disk used by batches the writers have not taken yet
+            while self._unfed_bytes >= self.max_bytes and not self._closed:
+                self._cond.wait(timeout=1.0)
+            if self._closed:
+                return
+        if self._file is None:
+            path = self._segment_path(chunk_seq)
+            self._file = open(path, "wb")
+            with self._cond:
+                self._segments.append(_SpoolSegment(path))
+        self._file.write(data)
+        self._file.flush() # Visible to the feeder's next mapping
+        with self._cond:
+            segment = self._segments[-1]
+            segment.size += len(data)
+            self._unfed_bytes += len(data)
+            self._cond.notify_all()
+
+    def append_batch(self, batch: NebulaInsertBatch):
+        self._append(_record(_BATCH, _encode_batch(batch)), batch.chunk_seq)
+
+    def append_seal(self, chunk_seq: int, checkpoint: Dict[str, Any]):
+        """Ends a chunk; checkpoint is what the task stores once the chunk is written (see SpoolReplay)."""
+        payload = _SEAL_HEADER.pack(chunk_seq) + pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+        self._append(_record(_SEAL, payload), chunk_seq)
+        with self._cond:
+            if self._segments:
+                self._segments[-1].last_rows = checkpoint["rows_transformed"]
+        if self._file is not None and self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._file = None
+            with self._cond:
+                self._segments[-1].rotated = True
+                self._cond.notify_all()
+
+    def start_feeding(self, submit: Callable[[NebulaInsertBatch], bool]):
+        """Starts the feeder thread, which passes spooled batches to submit (the writer pool's) in order."""
+        self._feeder = threading.Thread(target=self._feed, args=(submit,), name="spool-feeder", daemon=True)
+        self._feeder.start()
+
+    def _feed(self, submit: Callable[[NebulaInsertBatch], bool]):
+        index = 0
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if index < len(self._segments):
+                        segment = self._segments[index]
+                        if segment.size > segment.read_offset or segment.rotated or self._finished:
+                            break
+                    elif self._finished:
+                        return
+                    self._cond.wait(timeout=1.0)
+                if self._closed:
+                    return
+                size = segment.size
+                done = segment.rotated or self._finished
+            if size > segment.read_offset:
+                with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                    for kind, payload, end in _iter_records(view, segment.read_offset, size):
+                        if kind == _BATCH and not submit(_decode_batch(payload)):
+                            with self._cond:
+                                self._closed = True # The writer pool failed
+                                self._cond.notify_all()
+                            return
+                        with self._cond:
+                            self._unfed_bytes -= end - segment.read_offset
+                            segment.read_offset = end
+                            self._cond.notify_all()
+            elif done:
+                index += 1
+
+    def finish(self):
+        """No more records will be appended; the feeder stops once it passed them all on."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        """Waits up to timeout seconds for the feeder to pass on every spooled batch after finish()."""
+        if self._feeder is None:
+            return True
+        self._feeder.join(timeout)
+        return not self._feeder.is_alive()
+
+    def close(self):
+        """Stops the feeder; spooled records stay for a later attempt until discard()."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._feeder is not None:
+            self._feeder.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def release(self, committed_rows: int):
+        """Deletes the rotated segments whose chunks are all written, according to the task's checkpoint."""
+        with self._cond:
+            done = [
+                s for s in self._segments
+                if s.rotated and not s.deleted and s.read_offset >= s.size and s.last_rows <= committed_rows
+            ]
+            for segment in done:
+                segment.deleted = True
+        for segment in done:
+            try:
+                os.remove(segment.path)
+            except OSError as e:
+                print(f"{self.log_prefix} Could not remove spool segment {segment.path}: {e}")
+
+    def discard(self):
+        """Removes the spool after the task finished."""
+        shutil.rmtree(self.directory, ignore_errors=True)
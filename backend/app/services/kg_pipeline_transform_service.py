@@ -0,0 +1,458 @@
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.api.v1.schemas import kg_pipeline_task_schemas
+from app.core.config import settings
+from app.services.kg_pipeline_write_service import NebulaInsertBatch, NebulaInsertBatcher
+
+# Row -> nGQL transformation for KG pipeline tasks.
+# A task's field_mappings are compiled once into a transformer: the value converter of every
+# mapped column is picked up front from the target Nebula type, and the statement prefixes
+# (property-name headers) are cached, so the per-row work is one converter call per cell
+# plus a single string join.
+# Optionally whole row chunks are transformed in a shared process pool, which returns ready
+# statement batches, so nGQL generation scales past the GIL and stays off the API process' CPU.
+# Chunks can also be fetched column-wise (ColumnChunk): every property column is then converted in
+# one pass, with fast paths for homogeneous int/float columns and memoized date/datetime/bool parsing.
+
+# A converter turns a non-NULL Python value into an nGQL literal, or None when it
+# cannot be represented (the property is then left out, like a NULL).
+ValueConverter = Callable[[Any], Optional[str]]
+
+INT_TYPES = ("INT", "INT8", "INT16", "INT32", "INT64")
+FLOAT_TYPES = ("FLOAT", "DOUBLE")
+_TRUE_STRINGS = frozenset(["true", "1", "yes", "t"])
+_FALSE_STRINGS = frozenset(["false", "0", "no", "f"])
+
+
+def _escape_string(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def _string_literal(value: Any) -> Optional[str]:
+    return f"\"{_escape_string(value if isinstance(value, str) else str(value))}\""
+
+def _int_literal(value: Any) -> Optional[str]:
+    try:
+        return str(int(value))
+    except (ValueError, TypeError):
+        return None
+
+def _float_literal(value: Any) -> Optional[str]:
+    try:
+        return str(float(value))
+    except (ValueError, TypeError):
+        return None
+
+def _bool_literal(value: Any) -> Optional[str]:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    # Attempt to infer bool from common string/int representations
+    val_lower = str(value).lower()
+    if val_lower in _TRUE_STRINGS:
+        return "true"
+    if val_lower in _FALSE_STRINGS:
+        return "false"
+    return None
+
+def _parse_date(value: Any) -> Optional[date]:
+    """Accepts date/datetime objects or 'YYYY-MM-DD[ ...]' strings."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).split(' ')[0]
+    try:
+        return date.fromisoformat(text) # C fast path for the common zero-padded form
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def _date_literal(value: Any) -> Optional[str]:
+    parsed_date = _parse_date(value)
+    return f"date(\"{parsed_date.isoformat()}\")" if parsed_date else None
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Accepts datetime objects or ISO strings; naive values are taken as UTC (Nebula expects UTC)."""
+    if isinstance(value, datetime):
+        dt_obj = value
+    else:
+        try:
+            dt_obj = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return dt_obj if dt_obj.tzinfo else dt_obj.replace(tzinfo=timezone.utc)
+
+def _datetime_literal(value: Any) -> Optional[str]:
+    dt_utc = _parse_datetime(value)
+    return f"datetime(\"{dt_utc.isoformat(timespec='microseconds')}\")" if dt_utc else None
+
+def _default_literal(value: Any) -> Optional[str]:
+    """Fallback when the mapping has no (known) Nebula type."""
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    return _string_literal(value)
+
+
+_LITERAL_CONVERTERS: Dict[str, ValueConverter] = {
+    "STRING": _string_literal,
+    "BOOL": _bool_literal,
+    "DATE": _date_literal,
+    "DATETIME": _datetime_literal,
+    "TIMESTAMP": _int_literal, # Nebula timestamps are integer seconds
+    **{t: _int_literal for t in INT_TYPES},
+    **{t: _float_literal for t in FLOAT_TYPES},
+}
+# Add other types like DURATION, TIME if needed
+
+def get_value_converter(target_nebula_type: Optional[str]) -> ValueConverter:
+    """Picks the nGQL literal converter for a Nebula type once, instead of dispatching per value."""
+    if not target_nebula_type:
+        return _default_literal
+    return _LITERAL_CONVERTERS.get(target_nebula_type, _default_literal)
+
+def format_nebula_value(value: Any, target_nebula_type: Optional[str] = None) -> str:
+    """Formats a Python value for nGQL, considering the target Nebula data type."""
+    if value is None:
+        return "NULL"
+    literal = get_value_converter(target_nebula_type)(value)
+    return "NULL" if literal is None else literal
+
+
+class ColumnChunk:
+    """A chunk of source rows stored column-wise: {column name: sequence of values}, all of equal length."""
+
+    def __init__(self, columns: Dict[str, Sequence[Any]], row_count: int):
+        self.columns = columns
+        self.row_count = row_count
+
+    def __len__(self):
+        return self.row_count
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Values of a column; a column missing from the source reads as all NULL."""
+        values = self.columns.get(name)
+        return values if values is not None else [None] * self.row_count
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+
+def chunk_column(chunk: Any, name: str) -> Sequence[Any]:
+    """Values of one column of a row chunk (list of row dicts) or a ColumnChunk."""
+    if isinstance(chunk, ColumnChunk):
+        return chunk.column(name)
+    return [row.get(name) for row in chunk]
+
+# Converters whose parsing is worth memoizing per distinct value within a column
+_MEMOIZED_CONVERTERS = frozenset([_date_literal, _datetime_literal, _bool_literal])
+
+def convert_column(values: Sequence[Any], converter: ValueConverter) -> List[Optional[str]]:
+    """Converts a whole column to nGQL literals (None for NULL/unconvertible values)."""
+    if converter is _int_literal and all(type(v) is int for v in values):
+        return list(map(str, values))
+    if converter is _float_literal and all(type(v) is float for v in values):
+        return list(map(str, values))
+    if converter in _MEMOIZED_CONVERTERS:
+        memo: Dict[Any, Optional[str]] = {}
+        literals = []
+        for v in values:
+            if v is None:
+                literals.append(None)
+                continue
+            try:
+                literal = memo.get(v, memo) # memo itself marks "not cached", since None is a valid result
+            except TypeError: # Unhashable value
+                literal = converter(v)
+            if literal is memo:
+                literal = converter(v)
+                memo[v] = literal
+            literals.append(literal)
+        return literals
+    return [None if v is None else converter(v) for v in values]
+
+
+def _parse_vid_mapping(vid_col_mapping: Any) -> Tuple[Optional[str], str]:
+    """A VID mapping is either a column name or {"name": ..., "type": "STRING"|"INT64"}."""
+    if isinstance(vid_col_mapping, str):
+        return vid_col_mapping, "STRING"
+    if isinstance(vid_col_mapping, dict):
+        return vid_col_mapping.get("name"), "INT64" if vid_col_mapping.get("type") == "INT64" else "STRING"
+    return None, "STRING"
+
+
+class CompiledRowTransformer:
+    """
+    Turns source row dicts into (statement prefix, VALUES item) pairs for NebulaInsertBatcher.
+    NULL (or unconvertible) properties are left out of a row, so the property header depends on which
+    properties are present; headers are cached per presence mask.
+    """
+
+    def __init__(self, task, log_prefix: str = ""):
+        self.log_prefix = log_prefix
+        self.rows_skipped = 0
+        field_mappings = task.field_mappings or {}
+        self.mapping_type = task.mapping_type
+        self.target_name = task.target_label_or_type
+
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            self.vid_col, vid_type = _parse_vid_mapping(field_mappings.get("vertex_id_column"))
+            if not self.vid_col:
+                raise ValueError("'vertex_id_column' not in field_mappings.")
+            self.vid_converter = get_value_converter(vid_type)
+            self._statement_head = f"INSERT VERTEX `{self.target_name}`"
+        elif self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.RELATIONSHIP:
+            self.src_vid_col, src_vid_type = _parse_vid_mapping(field_mappings.get("source_vid_column"))
+            self.dst_vid_col, dst_vid_type = _parse_vid_mapping(field_mappings.get("destination_vid_column"))
+            if not self.src_vid_col or not self.dst_vid_col:
+                raise ValueError("Missing source/destination VID column.")
+            self.src_vid_converter = get_value_converter(src_vid_type)
+            self.dst_vid_converter = get_value_converter(dst_vid_type)
+            self.rank_col, _ = _parse_vid_mapping(field_mappings.get("rank_column")) # rank is always INT64
+            self._statement_head = f"INSERT EDGE `{self.target_name}`"
+        else:
+            raise ValueError(f"Unsupported mapping type: {self.mapping_type}")
+
+        # (source column, quoted target property, converter) in mapping order
+        self.properties: List[Tuple[str, str, ValueConverter]] = [
+            (src_col, f"`{target_mapping.get('target_property')}`", get_value_converter(target_mapping.get("type")))
+            for src_col, target_mapping in (field_mappings.get("properties") or {}).items()
+        ]
+        self._prefix_cache: Dict[int, str] = {}
+
+    @property
+    def source_columns(self) -> List[str]:
+        """Columns of the source row this mapping reads."""
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            id_columns = [self.vid_col]
+        else:
+            id_columns = [self.src_vid_col, self.dst_vid_col] + ([self.rank_col] if self.rank_col else [])
+        return list(dict.fromkeys(id_columns + [src_col for src_col, _, _ in self.properties]))
+
+    def _prefix_for(self, mask: int) -> str:
+        prefix = self._prefix_cache.get(mask)
+        if prefix is None:
+            names = ", ".join(name for i, (_, name, _) in enumerate(self.properties) if mask & (1 << i))
+            prefix = f"{self._statement_head} ({names}) VALUES"
+            self._prefix_cache[mask] = prefix
+        return prefix
+
+    def _convert_properties(self, row: Dict[str, Any]) -> Tuple[int, List[str]]:
+        mask = 0
+        values = []
+        for i, (src_col, _, converter) in enumerate(self.properties):
+            value = row.get(src_col)
+            if value is None:
+                continue
+            literal = converter(value)
+            # Only include non-NULL properties, or handle as per schema requirements
+            if literal is not None:
+                mask |= 1 << i
+                values.append(literal)
+        return mask, values
+
+    def _column_keys(self, chunk: ColumnChunk) -> List[Optional[str]]:
+        """VALUES keys ('vid' or 'src -> dst@rank') per row, None for rows that must be skipped."""
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            raw_vids = chunk.column(self.vid_col)
+            vids = convert_column(raw_vids, self.vid_converter)
+            for raw_vid, vid in zip(raw_vids, vids):
+                if raw_vid is not None and vid is None:
+                    print(f"{self.log_prefix} NULL Vertex ID from column '{self.vid_col}' for value '{raw_vid}'. Skipping.")
+            return vids
+        src_vids = convert_column(chunk.column(self.src_vid_col), self.src_vid_converter)
+        dst_vids = convert_column(chunk.column(self.dst_vid_col), self.dst_vid_converter)
+        ranks = convert_column(chunk.column(self.rank_col), _int_literal) if self.rank_col else [None] * len(chunk)
+        return [
+            None if src_vid is None or dst_vid is None
+            else f"{src_vid} -> {dst_vid}@{rank}" if rank is not None
+            else f"{src_vid} -> {dst_vid}"
+            for src_vid, dst_vid, rank in zip(src_vids, dst_vids, ranks)
+        ]
+
+    def transform_columns(self, chunk: ColumnChunk) -> Iterator[Tuple[str, str]]:
+        """Column-wise equivalent of calling the transformer on every row of the chunk."""
+        keys = self._column_keys(chunk)
+        property_literals = [convert_column(chunk.column(src_col), converter) for src_col, _, converter in self.properties]
+        if all(None not in literals for literals in property_literals):
+            # Every property present in every row: one header, values zipped straight into items
+            prefix = self._prefix_for((1 << len(self.properties)) - 1)
+            row_values = zip(*property_literals) if property_literals else [()] * len(keys)
+            for key, values in zip(keys, row_values):
+                if key is None:
+                    self.rows_skipped += 1
+                    continue
+                yield prefix, f"{key}:({', '.join(values)})"
+            return
+        for i, key in enumerate(keys):
+            if key is None:
+                self.rows_skipped += 1
+                continue
+            mask = 0
+            values = []
+            for j, literals in enumerate(property_literals):
+                literal = literals[i]
+                if literal is not None:
+                    mask |= 1 << j
+                    values.append(literal)
+            yield self._prefix_for(mask), f"{key}:({', '.join(values)})"
+
+    @property
+    def export_header(self) -> List[str]:
+        """Column names of the rows iter_export_rows() yields: VID(s), rank if mapped, then properties."""
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            id_names = ["vid"]
+        else:
+            id_names = ["src", "dst"] + (["rank"] if self.rank_col else [])
+        return id_names + [name[1:-1] for _, name, _ in self.properties]
+
+    def iter_export_rows(self, chunk: Any) -> Iterator[List[Optional[str]]]:
+        """
+        The nGQL literals of every row of a chunk, one per export_header column (None for a NULL or
+        unconvertible property), for bulk file export. Uses the same converters and skips the same rows
+        as the INSERT path; a missing rank is 0, as for INSERT EDGE without @rank.
+        """
+        if not isinstance(chunk, ColumnChunk):
+            chunk = ColumnChunk({column: chunk_column(chunk, column) for column in self.source_columns}, len(chunk))
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            raw_vids = chunk.column(self.vid_col)
+            vids = convert_column(raw_vids, self.vid_converter)
+            for raw_vid, vid in zip(raw_vids, vids):
+                if raw_vid is not None and vid is None:
+                    print(f"{self.log_prefix} NULL Vertex ID from column '{self.vid_col}' for value '{raw_vid}'. Skipping.")
+            id_columns = [vids]
+        else:
+            id_columns = [
+                convert_column(chunk.column(self.src_vid_col), self.src_vid_converter),
+                convert_column(chunk.column(self.dst_vid_col), self.dst_vid_converter),
+            ]
+            if self.rank_col:
+                id_columns.append([rank or "0" for rank in convert_column(chunk.column(self.rank_col), _int_literal)])
+        property_literals = [convert_column(chunk.column(src_col), converter) for src_col, _, converter in self.properties]
+        for values in zip(*id_columns, *property_literals):
+            if values[0] is None or (len(id_columns) > 1 and values[1] is None):
+                self.rows_skipped += 1
+                continue
+            yield list(values)
+
+    def __call__(self, row: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        if self.mapping_type == kg_pipeline_task_schemas.KGPipelineTaskMappingType.NODE:
+            raw_vid = row.get(self.vid_col)
+            if raw_vid is None:
+                self.rows_skipped += 1
+                return None
+            vid = self.vid_converter(raw_vid)
+            if vid is None: # Cannot have NULL Vertex ID
+                print(f"{self.log_prefix} NULL Vertex ID from column '{self.vid_col}' for value '{raw_vid}'. Skipping.")
+                self.rows_skipped += 1
+                return None
+            key = vid
+        else:
+            raw_src_vid = row.get(self.src_vid_col)
+            raw_dst_vid = row.get(self.dst_vid_col)
+            if raw_src_vid is None or raw_dst_vid is None:
+                self.rows_skipped += 1
+                return None
+            src_vid = self.src_vid_converter(raw_src_vid)
+            dst_vid = self.dst_vid_converter(raw_dst_vid)
+            if src_vid is None or dst_vid is None:
+                print(f"{self.log_prefix} NULL source or destination Vertex ID after formatting. Skipping.")
+                self.rows_skipped += 1
+                return None
+            rank_str = ""
+            if self.rank_col:
+                raw_rank = row.get(self.rank_col)
+                rank_val = _int_literal(raw_rank) if raw_rank is not None else None # Nebula rank is int
+                if rank_val is not None:
+                    rank_str = f"@{rank_val}"
+            key = f"{src_vid} -> {dst_vid}{rank_str}"
+
+        mask, values = self._convert_properties(row)
+        return self._prefix_for(mask), f"{key}:({', '.join(values)})"
+
+
+def compile_row_transformer(task, log_prefix: str = "") -> CompiledRowTransformer:
+    """Compiles a task's field_mappings. Raises ValueError if the mapping is invalid."""
+    return CompiledRowTransformer(task, log_prefix=log_prefix)
+
+
+def iter_transformed(transformer: CompiledRowTransformer, chunk: Any) -> Iterator[Tuple[str, str]]:
+    """(prefix, item) pairs of a row chunk (list of row dicts) or a ColumnChunk, skipping unusable rows."""
+    if isinstance(chunk, ColumnChunk):
+        yield from transformer.transform_columns(chunk)
+        return
+    for row in chunk:
+        transformed = transformer(row)
+        if transformed is not None:
+            yield transformed
+
+
+class TransformSpec:
+    """Picklable copy of the task fields CompiledRowTransformer reads, sent to transform worker processes."""
+
+    def __init__(self, task, log_prefix: str = ""):
+        self.id = task.id
+        self.mapping_type = task.mapping_type
+        self.target_label_or_type = task.target_label_or_type
+        self.field_mappings = task.field_mappings
+        self.log_prefix = log_prefix
+        # Workers cache compiled transformers by this key; a changed mapping gets a new key
+        self.cache_key = (
+            task.id, str(task.mapping_type), task.target_label_or_type,
+            json.dumps(task.field_mappings, sort_keys=True, default=str),
+        )
+
+
+_WORKER_CACHE_SIZE = 64
+_worker_transformers: Dict[Tuple[Any, ...], CompiledRowTransformer] = {} # Per worker process
+
+def transform_rows_to_batches(
+    spec: TransformSpec, rows: Any, max_rows: Optional[int] = None, max_bytes: Optional[int] = None
+) -> Tuple[List[NebulaInsertBatch], int]:
+    """Runs in a transform worker process: turns one row chunk into complete batches. Returns (batches, rows skipped)."""
+    transformer = _worker_transformers.get(spec.cache_key)
+    if transformer is None:
+        if len(_worker_transformers) >= _WORKER_CACHE_SIZE:
+            _worker_transformers.clear()
+        transformer = compile_row_transformer(spec, log_prefix=spec.log_prefix)
+        _worker_transformers[spec.cache_key] = transformer
+    skipped_before = transformer.rows_skipped
+    batcher = NebulaInsertBatcher(max_rows=max_rows, max_bytes=max_bytes)
+    batches: List[NebulaInsertBatch] = []
+    for transformed in iter_transformed(transformer, rows):
+        batches.extend(batcher.add(*transformed))
+    batches.extend(batcher.flush())
+    return batches, transformer.rows_skipped - skipped_before
+
+
+_transform_executor: Optional[ProcessPoolExecutor] = None
+_transform_executor_lock = threading.Lock()
+
+def get_transform_executor() -> Optional[ProcessPoolExecutor]:
+    """The process pool shared by all pipeline tasks, or None when process transforms are disabled."""
+    global _transform_executor
+    if settings.KG_PIPELINE_TRANSFORM_PROCESSES <= 0:
+        return None
+    with _transform_executor_lock:
+        if _transform_executor is None:
+            # spawn, not fork: the API process runs threads (uvicorn, Nebula writers) that fork would copy mid-state
+            _transform_executor = ProcessPoolExecutor(
+                max_workers=settings.KG_PIPELINE_TRANSFORM_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _transform_executor
+
+def discard_transform_executor(executor: ProcessPoolExecutor):
+    """Drops a broken pool (e.g. a worker was killed) so the next task starts a fresh one."""
+    global _transform_executor
+    with _transform_executor_lock:
+        if _transform_executor is executor:
+            _transform_executor = None
+    executor.shutdown(wait=False)
@@ -0,0 +1,261 @@
+import glob
+import hashlib
+import math
+import os
+import struct
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.kg_pipeline_fingerprint_service import values_item_key
+from app.services.kg_pipeline_write_service import DeadLetter
+
+# VID index of the vertices loaded per tag, so RELATIONSHIP tasks don't write dangling edges.
+# NODE tasks log an 8-byte digest of every VID they load; after a successful run the task's log is
+# turned into a Bloom filter, stored next to the filters of the other NODE tasks of the same tag.
+# RELATIONSHIP tasks whose VID mappings declare a "tag" load those filters and check both ends of
+# every edge in memory; edges whose source or destination vertex was never loaded are recorded as
+# dead letters instead of being sent to graphd. A Bloom filter has no false negatives, so only edges
+# with a surely missing vertex are held back; at the configured false-positive rate a few dangling
+# edges still get through. Vertices inserted outside the pipeline are unknown to the index.
+
+_BLOOM_MAGIC = b"KGVIDBF1"
+_BLOOM_HEADER = struct.Struct("<8sQQI") # magic, bits, keys, hash functions
+_DIGEST_SIZE = 8
+_READ_BLOCK_DIGESTS = 65536
+
+
+def vid_digest(vid_literal: str) -> bytes:
+    return hashlib.blake2b(vid_literal.encode("utf-8"), digest_size=_DIGEST_SIZE).digest()
+
+
+def get_referenced_vid_tag(vid_col_mapping: Any) -> Optional[str]:
+    """Tag declared on a RELATIONSHIP task's source/destination VID mapping, e.g. {"name": "user_id", "tag": "User"}."""
+    if isinstance(vid_col_mapping, dict):
+        return vid_col_mapping.get("tag")
+    return None
+
+
+def _literal_end(text: str, start: int, terminator: str) -> int:
+    if text.startswith('"', start):
+        i = start + 1
+        while True:
+            quote = text.find('"', i)
+            if quote == -1:
+                return len(text)
+            backslashes = quote
+            while text[backslashes - 1] == "\\":
+                backslashes -= 1
+            if (quote - backslashes) % 2 == 0: # Not escaped
+                return quote + 1
+            i = quote + 1
+    end = text.find(terminator, start)
+    return len(text) if end == -1 else end
+
+def split_edge_key(key: str) -> Tuple[str, str]:
+    """'"a" -> "b"@0' -> ('"a"', '"b"'); string literals may contain ' -> ' or '@'."""
+    src_end = _literal_end(key, 0, " -> ")
+    dst_start = src_end + len(" -> ")
+    return key[:src_end], key[dst_start:_literal_end(key, dst_start, "@")]
+
+
+def _unpack_digest(digest: bytes) -> Tuple[int, int]:
+    # Double hashing: probe i is h1 + i * h2; an odd h2 keeps the probes distinct
+    h1, h2 = struct.unpack("<II", digest)
+    return h1, h2 | 1
+
+
+class VidBloomFilter:
+    """Bloom filter over VID digests."""
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[bytearray] = None, num_keys: int = 0):
+        self.num_bits = max(64, int(num_bits))
+        self.num_hashes = max(1, int(num_hashes))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.num_keys = num_keys
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float) -> "VidBloomFilter":
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        return cls(num_bits, round(num_bits / capacity * math.log(2)))
+
+    def add(self, digest: bytes):
+        bits, num_bits = self.bits, self.num_bits
+        position, step = _unpack_digest(digest)
+        for _ in range(self.num_hashes):
+            position %= num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+            position += step
+        self.num_keys += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        # Called for both ends of every edge, so the probe loop is kept inline
+        bits, num_bits = self.bits, self.num_bits
+        position, step = _unpack_digest(digest)
+        for _ in range(self.num_hashes):
+            position %= num_bits
+            if not bits[position >> 3] >> (position & 7) & 1:
+                return False
+            position += step
+        return True
+
+    def save(self, path: str):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.num_bits, self.num_keys, self.num_hashes))
+            f.write(self.bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "VidBloomFilter":
+        with open(path, "rb") as f:
+            magic, num_bits, num_keys, num_hashes = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+            if magic != _BLOOM_MAGIC:
+                raise ValueError(f"{path} is not a VID index file")
+            bits = bytearray(f.read())
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{path} is truncated")
+        return cls(num_bits, num_hashes, bits=bits, num_keys=num_keys)
+
+
+def _tag_index_dir(space_name: str, tag: str) -> str:
+    return os.path.join(settings.KG_PIPELINE_STATE_DIR, "vid_index", space_name, tag)
+
+
+class VidIndexRecorder:
+    """
+    Logs the VID digests a NODE task loads in the current run. The spill file survives failed attempts,
+    so a resumed task still ends up with every VID of the run; commit() folds it into the task's index.
+    """
+
+    def __init__(self, task, space_name: str, run_id: int, fresh: bool):
+        self.directory = _tag_index_dir(space_name, task.target_label_or_type)
+        os.makedirs(self.directory, exist_ok=True)
+        self.log_path = os.path.join(self.directory, f"task_{task.id}.vids")
+        self.bloom_path = os.path.join(self.directory, f"task_{task.id}.bloom")
+        self.spill_path = os.path.join(self.directory, f"task_{task.id}.run_{run_id}.spill")
+        for stale in glob.glob(os.path.join(self.directory, f"task_{task.id}.run_*.spill")):
+            if stale != self.spill_path:
+                os.remove(stale) # Left by runs that never completed
+        self._file = open(self.spill_path, "wb" if fresh else "ab")
+
+    def record(self, items: Iterable[str]):
+        self._file.write(b"".join(vid_digest(values_item_key(item)) for item in items))
+
+    def tap(self, transformed: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """Passes (prefix, item) pairs through, logging their VIDs."""
+        write = self._file.write
+        for prefix, item in transformed:
+            write(vid_digest(values_item_key(item)))
+            yield prefix, item
+
+    def sync(self):
+        """Makes the logged VIDs durable; called before a checkpoint that covers them is saved."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def commit(self, replace: bool) -> int:
+        """
+        Folds this run's VIDs into the task's log (replace=True after a full read, which saw every VID
+        of the task) and rebuilds the task's Bloom filter from it. Returns the number of logged VIDs.
+        """
+        self.sync()
+        self.close()
+        if replace or not os.path.exists(self.log_path):
+            os.replace(self.spill_path, self.log_path)
+        else:
+            # Incremental read: VIDs loaded by earlier runs are still in the graph
+            with open(self.spill_path, "rb") as spill, open(self.log_path, "ab") as log:
+                while True:
+                    block = spill.read(_READ_BLOCK_DIGESTS * _DIGEST_SIZE)
+                    if not block:
+                        break
+                    log.write(block)
+            os.remove(self.spill_path)
+        # Sized for the logged digests; VIDs re-loaded by incremental runs only make the filter sparser
+        num_digests = os.path.getsize(self.log_path) // _DIGEST_SIZE
+        bloom = VidBloomFilter.for_capacity(num_digests, settings.KG_PIPELINE_VID_INDEX_FALSE_POSITIVE_RATE)
+        with open(self.log_path, "rb") as log:
+            while True:
+                block = log.read(_READ_BLOCK_DIGESTS * _DIGEST_SIZE)
+                if not block:
+                    break
+                for offset in range(0, len(block) - _DIGEST_SIZE + 1, _DIGEST_SIZE):
+                    bloom.add(block[offset:offset + _DIGEST_SIZE])
+        bloom.save(self.bloom_path)
+        return num_digests
+
+
+def load_tag_index(space_name: str, tag: str) -> List[VidBloomFilter]:
+    """The Bloom filters of all NODE tasks that loaded a tag into a space (empty if none did)."""
+    filters = []
+    for path in sorted(glob.glob(os.path.join(_tag_index_dir(space_name, tag), "task_*.bloom"))):
+        try:
+            filters.append(VidBloomFilter.load(path))
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring VID index file {path}: {e}")
+    return filters
+
+
+class DanglingEdgeFilter:
+    """
+    Checks both ends of a RELATIONSHIP task's edges against the VID index of the tags they reference.
+    Used on the task's thread only; edges with a missing vertex are kept as dead letters.
+    """
+
+    def __init__(self, src_tag: Optional[str], src_filters: List[VidBloomFilter],
+                 dst_tag: Optional[str], dst_filters: List[VidBloomFilter]):
+        self.src_tag = src_tag
+        self.src_filters = src_filters
+        self.dst_tag = dst_tag
+        self.dst_filters = dst_filters
+        self.rows_dangling = 0
+        self._dead_letters: List[DeadLetter] = []
+
+    def _missing(self, filters: List[VidBloomFilter], vid: str) -> bool:
+        if not filters:
+            return False # Tag not indexed: nothing to check against
+        digest = vid_digest(vid)
+        return not any(digest in bloom for bloom in filters)
+
+    def filter(self, transformed: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+        """Yields the (prefix, item) pairs whose source and destination vertices are both indexed."""
+        for prefix, item in transformed:
+            src_vid, dst_vid = split_edge_key(values_item_key(item))
+            if self._missing(self.src_filters, src_vid):
+                message = f"Source vertex {src_vid} not loaded as tag `{self.src_tag}`; edge not written."
+            elif self._missing(self.dst_filters, dst_vid):
+                message = f"Destination vertex {dst_vid} not loaded as tag `{self.dst_tag}`; edge not written."
+            else:
+                yield prefix, item
+                continue
+            self.rows_dangling += 1
+            self._dead_letters.append(DeadLetter(prefix, item, message))
+
+    def pop_dead_letters(self) -> List[DeadLetter]:
+        letters, self._dead_letters = self._dead_letters, []
+        return letters
+
+
+def open_dangling_edge_filter(task, space_name: str, log_prefix: str = "") -> Optional[DanglingEdgeFilter]:
+    """
+    Loads the VID index of the tags a RELATIONSHIP task's VID mappings declare. Returns None when
+    neither side declares a tag or no NODE task has indexed them yet.
+    """
+    field_mappings = task.field_mappings or {}
+    src_tag = get_referenced_vid_tag(field_mappings.get("source_vid_column"))
+    dst_tag = get_referenced_vid_tag(field_mappings.get("destination_vid_column"))
+    src_filters = load_tag_index(space_name, src_tag) if src_tag else []
+    dst_filters = src_filters if dst_tag == src_tag else (load_tag_index(space_name, dst_tag) if dst_tag else [])
+    for tag, filters in ((src_tag, src_filters), (dst_tag, dst_filters)):
+        if tag and not filters:
+            print(f"{log_prefix} No VID index for tag `{tag}` in {space_name}; its vertices are not checked.")
+    if not src_filters and not dst_filters:
+        return None
+    return DanglingEdgeFilter(src_tag, src_filters, dst_tag, dst_filters)
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.crud import crud_kg_pipeline_run
+from app.db.session import SessionLocal
+from app.services.kg_pipeline_execution_service import run_kg_pipeline_background
+
+# Pipeline worker: executes runs queued in kg_pipeline_runs (KG_PIPELINE_EXECUTION_MODE = "queue").
+# Any number of worker processes on any number of hosts poll the table; a run is claimed with
+# SELECT ... FOR UPDATE SKIP LOCKED and held by a lease that the worker renews while the run executes.
+# If a worker dies, its lease expires and another worker takes the run over, resuming from the
+# task checkpoints.
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def _claim_next_run(worker_id: str):
+    db = SessionLocal()
+    try:
+        db_run = crud_kg_pipeline_run.claim_next_kg_pipeline_run(
+            db, worker_id=worker_id, lease_seconds=settings.KG_PIPELINE_RUN_LEASE_SECONDS
+        )
+        return (db_run.id, db_run.pipeline_id) if db_run else None
+    finally:
+        db.close()
+
+def _renew_lease(run_id: int, worker_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return crud_kg_pipeline_run.renew_kg_pipeline_run_lease(
+            db, run_id=run_id, worker_id=worker_id, lease_seconds=settings.KG_PIPELINE_RUN_LEASE_SECONDS
+        )
+    finally:
+        db.close()
+
+async def _keep_lease(
+    run_id: int, worker_id: str, done_event: asyncio.Event, stop_event: threading.Event, lease_lost: threading.Event
+):
+    """
+    Renews the run's lease every third of the lease time until the run is done. When the lease is lost
+    (taken over, or not renewed for a whole lease time) the run is stopped, so two workers never run it.
+    """
+    interval = max(1.0, settings.KG_PIPELINE_RUN_LEASE_SECONDS / 3)
+    last_renewed = time.monotonic()
+    while not done_event.is_set():
+        try:
+            await asyncio.wait_for(done_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        if done_event.is_set():
+            break
+        try:
+            renewed = await asyncio.to_thread(_renew_lease, run_id, worker_id)
+        except Exception as e:
+            print(f"[Worker {worker_id}] Could not renew the lease of run {run_id}: {e}")
+            if time.monotonic() - last_renewed < settings.KG_PIPELINE_RUN_LEASE_SECONDS:
+                continue
+            renewed = False # The lease has expired by now; another worker may claim the run
+        if not renewed:
+            print(f"[Worker {worker_id}] Lost the lease of run {run_id}; stopping it, another worker may take it over.")
+            lease_lost.set()
+            stop_event.set()
+            return
+        last_renewed = time.monotonic()
+
+async def _execute_claimed_run(run_id: int, pipeline_id: int, worker_id: str):
+    done_event = asyncio.Event()
+    stop_event = threading.Event() # The run's stop signal, also set by cancellation and task failures
+    lease_lost = threading.Event()
+    lease_keeper = asyncio.create_task(_keep_lease(run_id, worker_id, done_event, stop_event, lease_lost))
+    try:
+        await run_kg_pipeline_background(
+            pipeline_id=pipeline_id, db_pipeline_run_id=run_id, stop_event=stop_event, lease_lost=lease_lost
+        )
+    finally:
+        done_event.set()
+        await lease_keeper
+
+async def run_pipeline_worker(
+    worker_id: Optional[str] = None, concurrency: Optional[int] = None, stop_event: Optional[asyncio.Event] = None
+):
+    """
+    Claims and executes queued runs, up to `concurrency` at a time, until stop_event is set.
+    After stop_event is set no new runs are claimed and the worker returns once its current runs finish.
+    """
+    worker_id = worker_id or default_worker_id()
+    concurrency = max(1, int(concurrency or settings.KG_PIPELINE_WORKER_CONCURRENCY))
+    stop_event = stop_event or asyncio.Event()
+    running: Dict[int, "asyncio.Task"] = {}
+    print(f"[Worker {worker_id}] Started, executing up to {concurrency} pipeline runs at a time.")
+
+    while not stop_event.is_set():
+        claimed = None
+        if len(running) < concurrency:
+            try:
+                claimed = await asyncio.to_thread(_claim_next_run, worker_id)
+            except Exception as e:
+                print(f"[Worker {worker_id}] Failed to poll the run queue: {e}")
+        if claimed:
+            run_id, pipeline_id = claimed
+            print(f"[Worker {worker_id}] Claimed run {run_id} of pipeline {pipeline_id}.")
+            run_task = asyncio.create_task(_execute_claimed_run(run_id, pipeline_id, worker_id))
+            running[run_id] = run_task
+            run_task.add_done_callback(lambda _t, rid=run_id: running.pop(rid, None))
+            continue # Look for more work right away while slots are free
+        # Idle or full: wait for the poll interval, a finished run or a stop request
+        waiters = [asyncio.create_task(stop_event.wait())] + list(running.values())
+        await asyncio.wait(waiters, timeout=settings.KG_PIPELINE_WORKER_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+        waiters[0].cancel()
+
+    if running:
+        print(f"[Worker {worker_id}] Stopping; waiting for {len(running)} running pipeline run(s) to finish.")
+        await asyncio.gather(*running.values(), return_exceptions=True)
+    print(f"[Worker {worker_id}] Stopped.")
@@ -0,0 +1,446 @@
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.db.nebula_connector import get_nebula_session
+from app.services.kg_pipeline_metrics_service import TaskRunMetrics
+
+# Helpers for writing KG pipeline output to Nebula Graph.
+# Rows that share the same tag/edge type and property list are packed into one
+# multi-value statement, e.g. INSERT VERTEX `t` (`p1`) VALUES "v1":(1), "v2":(2);
+# so a task costs one graphd round trip per batch instead of one per row.
+
+class NebulaInsertBatch:
+    """A multi-value INSERT VERTEX / INSERT EDGE statement."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix # e.g. 'INSERT VERTEX `tag` (`p1`, `p2`) VALUES'
+        self.items: List[str] = [] # e.g. '"v1":(1, "a")' or '"s" -> "d"@0:(1)'
+        self.size_bytes = len(prefix.encode("utf-8")) + 1
+        self.chunk_seq: Optional[int] = None # Extraction chunk the rows came from (for checkpointing)
+        self.fingerprints: List[Any] = [] # Row fingerprints aligned with items, when the task keeps them
+        self.rejected_items: List[str] = [] # Items Nebula rejected (dead letters), set by the writer pool
+
+    @property
+    def row_count(self) -> int:
+        return len(self.items)
+
+    def add(self, item: str, item_bytes: int, fingerprint: Any = None):
+        self.items.append(item)
+        self.size_bytes += item_bytes
+        if fingerprint is not None:
+            self.fingerprints.append(fingerprint)
+
+    def accepted_fingerprints(self) -> List[Any]:
+        """Fingerprints of the rows Nebula accepted."""
+        if not self.rejected_items:
+            return self.fingerprints
+        rejected = set(self.rejected_items)
+        return [fp for item, fp in zip(self.items, self.fingerprints) if item not in rejected]
+
+    def to_ngql(self) -> str:
+        return f"{self.prefix} {', '.join(self.items)};"
+
+
+class AdaptiveWriteController:
+    """
+    AIMD tuning of statement size and statement concurrency from observed graphd latency.
+    - A write faster than target_latency_ms grows the batch size additively (+1/10 of the ceiling);
+      every in_flight such writes in a row also allow one more statement in flight.
+    - A slower write, a failure or a timeout halves both, at most once per cooldown, so a burst of slow
+      replies to statements sent before the decrease does not collapse them to the floor.
+    Ceilings are the configured batch_max_rows and the number of writer workers.
+    """
+
+    def __init__(
+        self, max_batch_rows: int, max_in_flight: int,
+        min_batch_rows: Optional[int] = None, target_latency_ms: Optional[float] = None
+    ):
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.min_batch_rows = max(1, min(int(min_batch_rows or settings.KG_PIPELINE_ADAPTIVE_MIN_BATCH_ROWS), self.max_batch_rows))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.target_latency = float(target_latency_ms or settings.KG_PIPELINE_ADAPTIVE_TARGET_LATENCY_MS) / 1000
+        self.batch_rows = max(self.min_batch_rows, self.max_batch_rows // 4) # Start low and probe upwards
+        self.in_flight_limit = max(1, self.max_in_flight // 2)
+        self.decreases = 0
+        self._step = max(1, self.max_batch_rows // 10)
+        self._cooldown = max(1.0, 2 * self.target_latency)
+        self._last_decrease = 0.0
+        self._good_streak = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire_slot(self):
+        """Blocks until a statement may be sent under the current in-flight limit."""
+        with self._condition:
+            while self._in_flight >= self.in_flight_limit:
+                self._condition.wait(timeout=0.5)
+            self._in_flight += 1
+
+    def release_slot(self, latency_seconds: Optional[float], succeeded: bool, timed_out: bool = False):
+        """Frees the slot and adapts to the outcome of the statement."""
+        with self._condition:
+            self._in_flight -= 1
+            if succeeded and not timed_out and latency_seconds is not None and latency_seconds <= self.target_latency:
+                self._good_streak += 1
+                self.batch_rows = min(self.max_batch_rows, self.batch_rows + self._step)
+                if self._good_streak >= self.in_flight_limit and self.in_flight_limit < self.max_in_flight:
+                    self.in_flight_limit += 1
+                    self._good_streak = 0
+            else:
+                self._good_streak = 0
+                now = time.monotonic()
+                if now - self._last_decrease >= self._cooldown:
+                    self._last_decrease = now
+                    self.decreases += 1
+                    self.batch_rows = max(self.min_batch_rows, self.batch_rows // 2)
+                    self.in_flight_limit = max(1, self.in_flight_limit // 2)
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {"batch_rows": self.batch_rows, "in_flight_limit": self.in_flight_limit, "decreases": self.decreases}
+
+
+class RowRateLimiter:
+    """
+    Token bucket capping the rows per second written by all tasks of one pipeline run.
+    A batch larger than the bucket is let through by going into debt, so it never blocks forever.
+    """
+
+    def __init__(self, rows_per_second: float):
+        self.rows_per_second = float(rows_per_second)
+        self._capacity = self.rows_per_second # At most one second of burst
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, rows: int):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self.rows_per_second)
+            self._updated = now
+            self._tokens -= rows
+            wait = -self._tokens / self.rows_per_second if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class NebulaInsertBatcher:
+    """
+    Groups VALUES items by statement prefix and emits a batch as soon as it reaches
+    the rows-per-statement or bytes-per-statement cap. With a controller, the row cap
+    follows the controller's current batch size.
+    """
+
+    def __init__(
+        self, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+        controller: Optional[AdaptiveWriteController] = None
+    ):
+        self.max_rows = max(1, int(max_rows or settings.KG_PIPELINE_BATCH_MAX_ROWS))
+        self.max_bytes = max(1, int(max_bytes or settings.KG_PIPELINE_BATCH_MAX_BYTES))
+        self.controller = controller
+        self._open_batches: Dict[str, NebulaInsertBatch] = {}
+
+    def add(self, prefix: str, item: str, fingerprint: Any = None) -> List[NebulaInsertBatch]:
+        """Adds one VALUES item. Returns the batches that became full and must be sent (usually none)."""
+        item_bytes = len(item.encode("utf-8")) + 2 # + ", " separator
+        ready = []
+        batch = self._open_batches.get(prefix)
+        if batch is not None and batch.items and batch.size_bytes + item_bytes > self.max_bytes:
+            # Adding this item would exceed the byte cap: ship what we have and start over.
+            ready.append(self._open_batches.pop(prefix))
+            batch = None
+        if batch is None:
+            batch = NebulaInsertBatch(prefix)
+            self._open_batches[prefix] = batch
+        batch.add(item, item_bytes, fingerprint)
+        if batch.row_count >= (self.controller.batch_rows if self.controller else self.max_rows):
+            ready.append(self._open_batches.pop(prefix))
+        return ready
+
+    def flush(self) -> List[NebulaInsertBatch]:
+        """Returns all partially filled batches and resets the batcher."""
+        batches = [b for b in self._open_batches.values() if b.items]
+        self._open_batches = {}
+        return batches
+
+
+def get_task_option(task, key: str, default=None):
+    """Reads a per-task execution option (KGPipelineTask.execution_options), falling back to default."""
+    options = getattr(task, "execution_options", None) or {}
+    value = options.get(key)
+    return default if value is None else value
+
+
+class ChunkCommitTracker:
+    """
+    Tracks which extraction chunks are completely written to Nebula. Batches of several chunks are
+    in flight at once and finish out of order; a chunk's checkpoint only becomes committable once the
+    chunk is sealed (all its batches submitted), all its batches are written, and so are all earlier chunks.
+    """
+
+    def __init__(self, first_seq: int = 0):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = {} # chunk seq -> batches submitted but not yet written
+        self._sealed: Dict[int, Any] = {} # chunk seq -> checkpoint payload
+        self._next_seq = first_seq
+        self._committed: Any = None
+        self._has_new_commit = False
+
+    def batch_submitted(self, chunk_seq: int):
+        with self._lock:
+            self._pending[chunk_seq] = self._pending.get(chunk_seq, 0) + 1
+
+    def batch_written(self, batch: NebulaInsertBatch):
+        with self._lock:
+            self._pending[batch.chunk_seq] -= 1
+            self._advance()
+
+    def seal(self, chunk_seq: int, payload: Any):
+        with self._lock:
+            self._sealed[chunk_seq] = payload
+            self._advance()
+
+    def _advance(self):
+        while self._next_seq in self._sealed and not self._pending.get(self._next_seq):
+            self._committed = self._sealed.pop(self._next_seq)
+            self._pending.pop(self._next_seq, None)
+            self._has_new_commit = True
+            self._next_seq += 1
+
+    def pop_committed(self) -> Any:
+        """Returns the payload of the newest fully written chunk if it changed since the last call, else None."""
+        with self._lock:
+            if not self._has_new_commit:
+                return None
+            self._has_new_commit = False
+            return self._committed
+
+
+class NebulaWriteError(Exception):
+    """Raised when one or more writer workers failed; carries every worker's error."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+class DeadLetter:
+    """A VALUES row Nebula rejected on its own, kept with the statement prefix and the error."""
+
+    def __init__(self, prefix: str, item: str, error_message: str):
+        self.prefix = prefix
+        self.item = item
+        self.error_message = error_message
+
+
+# Errors worth retrying unchanged: graphd/storaged overload, leader changes and connection trouble.
+# Anything else (semantic errors, type mismatches, bad VIDs) is caused by the rows themselves.
+_TRANSIENT_ERROR_MARKERS = ("timeout", "timed out", "leader", "rpc failure", "connection", "busy", "too many")
+
+def is_transient_nebula_error(message: str) -> bool:
+    message = (message or "").lower()
+    return any(marker in message for marker in _TRANSIENT_ERROR_MARKERS)
+
+
+_STOP = object() # Queue sentinel telling a writer worker to exit
+
+
+class NebulaWriterPool:
+    """
+    A pool of writer threads for one pipeline task. Each worker owns its own Nebula session and
+    executes batches taken from a bounded queue. When the queue is full, submit() blocks, which
+    pushes back on the extractor. The first failure stops all workers; errors from every worker
+    are collected and raised together by close().
+    A batch failing with a transient error is retried with exponential backoff; if it still fails the
+    pool fails, so the chunk is not checkpointed and a resumed run writes it again. A batch Nebula
+    rejects is split in halves until the offending rows are isolated. Those rows become dead letters
+    (collected with pop_dead_letters()) and the rest of the batch is written; the pool only fails once
+    dead letters exceed max_error_rate of the rows written.
+    Optionally statements are sent under an AdaptiveWriteController's in-flight limit and a
+    RowRateLimiter's rows-per-second cap.
+    """
+
+    def __init__(
+        self, space_name: str, num_workers: Optional[int] = None, queue_size: Optional[int] = None,
+        log_prefix: str = "", on_batch_written: Optional[Callable[[NebulaInsertBatch], None]] = None,
+        metrics: Optional[TaskRunMetrics] = None, rate_limiter: Optional[RowRateLimiter] = None,
+        max_retries: Optional[int] = None, max_error_rate: Optional[float] = None
+    ):
+        self.space_name = space_name
+        self.on_batch_written = on_batch_written
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.controller: Optional[AdaptiveWriteController] = None # Set with enable_adaptive()
+        self.num_workers = max(1, min(
+            int(num_workers or settings.KG_PIPELINE_WRITER_WORKERS),
+            settings.NEBULA_MAX_CONNECTION_POOL_SIZE, # each worker holds one pooled connection
+        ))
+        self.log_prefix = log_prefix
+        self.max_retries = max(0, int(settings.KG_PIPELINE_WRITE_MAX_RETRIES if max_retries is None else max_retries))
+        self.max_error_rate = float(settings.KG_PIPELINE_MAX_ERROR_RATE if max_error_rate is None else max_error_rate)
+        self.rows_written = 0
+        self.statements_sent = 0
+        self.rows_dead_lettered = 0
+        self._dead_letters: List[DeadLetter] = []
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size or settings.KG_PIPELINE_WRITER_QUEUE_SIZE)))
+        self._errors: List[str] = []
+        self._lock = threading.Lock()
+        self._failed = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def enable_adaptive(self, max_batch_rows: int) -> AdaptiveWriteController:
+        """Lets an AIMD controller tune batch size (up to max_batch_rows) and in-flight statements (up to num_workers)."""
+        self.controller = AdaptiveWriteController(max_batch_rows=max_batch_rows, max_in_flight=self.num_workers)
+        return self.controller
+
+    def start(self) -> "NebulaWriterPool":
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, args=(i,), name=f"nebula-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def failed(self) -> bool:
+        return self._failed.is_set()
+
+    def submit(self, batch: NebulaInsertBatch) -> bool:
+        """Queues a batch, blocking while the queue is full. Returns False once the pool has failed."""
+        while not self._failed.is_set():
+            try:
+                self._queue.put(batch, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """Waits for all queued batches to be written. Raises NebulaWriteError if any worker failed."""
+        for _ in self._threads:
+            while any(t.is_alive() for t in self._threads):
+                try:
+                    self._queue.put(_STOP, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise NebulaWriteError(self._errors)
+
+    def pop_dead_letters(self) -> List[DeadLetter]:
+        """Returns and forgets the dead letters collected so far."""
+        with self._lock:
+            letters, self._dead_letters = self._dead_letters, []
+        return letters
+
+    def _record_error(self, message: str):
+        with self._lock:
+            self._errors.append(message)
+        self._failed.set()
+
+    def _execute(self, nebula_session, prefix: str, items: List[str]):
+        """Sends one statement under the rate limit and adaptive in-flight limit. Returns (resp, latency)."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(len(items))
+        if self.controller is not None:
+            self.controller.acquire_slot()
+        started = time.perf_counter()
+        try:
+            resp = nebula_session.execute(f"{prefix} {', '.join(items)};")
+        except Exception:
+            if self.controller is not None:
+                self.controller.release_slot(None, succeeded=False, timed_out=True)
+            raise
+        latency = time.perf_counter() - started
+        if self.controller is not None:
+            self.controller.release_slot(
+                latency, resp.is_succeeded(),
+                timed_out=not resp.is_succeeded() and "timeout" in (resp.error_msg() or "").lower()
+            )
+        return resp, latency
+
+    def _execute_with_retry(self, nebula_session, prefix: str, items: List[str]) -> Optional[str]:
+        """Writes items, retrying transient errors with exponential backoff. Returns None or the final error."""
+        attempt = 0
+        while True:
+            try:
+                resp, latency = self._execute(nebula_session, prefix, items)
+                error = None if resp.is_succeeded() else resp.error_msg() or "unknown error"
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise # The session itself is broken
+                latency, error = None, str(e)
+            if error is None:
+                with self._lock:
+                    self.rows_written += len(items)
+                    self.statements_sent += 1
+                if self.metrics is not None:
+                    self.metrics.record_nebula_write(
+                        latency, len(items), len(prefix.encode("utf-8")) + 1 + sum(len(i.encode("utf-8")) + 2 for i in items)
+                    )
+                return None
+            if self.metrics is not None:
+                self.metrics.record_nebula_error(latency)
+            if attempt >= self.max_retries or not is_transient_nebula_error(error) or self._failed.is_set():
+                return error
+            attempt += 1
+            if self.metrics is not None:
+                self.metrics.incr("write_retries")
+            time.sleep(min(30.0, settings.KG_PIPELINE_WRITE_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+    def _write_items(self, nebula_session, batch: NebulaInsertBatch, items: List[str], worker_index: int):
+        """Writes items of a batch, bisecting on failure so only the rows Nebula rejects become dead letters."""
+        prefix = batch.prefix
+        error = self._execute_with_retry(nebula_session, prefix, items)
+        if error is None or self._failed.is_set():
+            return
+        if is_transient_nebula_error(error):
+            # Out of retries on a timeout/leader change: the rows are fine, graphd is not. Bisecting would
+            # multiply the statements and dead-letter valid rows, so fail and let a resume retry the chunk.
+            self._record_error(f"writer {worker_index}: transient Nebula error persisted after {self.max_retries} retries: {error}")
+            return
+        if len(items) > 1:
+            middle = len(items) // 2
+            self._write_items(nebula_session, batch, items[:middle], worker_index)
+            self._write_items(nebula_session, batch, items[middle:], worker_index)
+            return
+        print(f"{self.log_prefix} Dead-lettering row rejected by Nebula: {prefix} {items[0][:200]} Error: {error}")
+        with self._lock:
+            self._dead_letters.append(DeadLetter(prefix, items[0], error))
+            batch.rejected_items.append(items[0])
+            self.rows_dead_lettered += 1
+            dead, attempted = self.rows_dead_lettered, self.rows_written + self.rows_dead_lettered
+        if self.metrics is not None:
+            self.metrics.incr("rows_dead_lettered")
+        # Judge the rate over at least a few batches' worth of rows so early dirty rows don't fail the task
+        if dead > self.max_error_rate * max(attempted, settings.KG_PIPELINE_ERROR_RATE_MIN_ROWS):
+            self._record_error(
+                f"writer {worker_index}: {dead} of {attempted} rows rejected by Nebula, more than the allowed "
+                f"error rate {self.max_error_rate:g}. Last error: {error}"
+            )
+
+    def _worker(self, worker_index: int):
+        try:
+            with get_nebula_session(space_name=self.space_name) as nebula_session:
+                while True:
+                    batch = self._queue.get()
+                    if batch is _STOP:
+                        break
+                    if self._failed.is_set():
+                        continue # Keep draining so producers never block on a dead pool
+                    self._write_items(nebula_session, batch, batch.items, worker_index)
+                    if self._failed.is_set():
+                        continue # The batch may be partly unwritten; its chunk must not be checkpointed
+                    if self.on_batch_written is not None:
+                        self.on_batch_written(batch)
+        except Exception as e:
+            print(f"{self.log_prefix} Nebula writer {worker_index} failed: {e}")
+            if self.metrics is not None:
+                self.metrics.record_nebula_error()
+            self._record_error(f"writer {worker_index}: {e}")
@@ -1,5 +1,5 @@
 from typing import List, Dict, Any, Tuple, Set, Optional
-from app.db.nebula_connector import get_nebula_session
+from app.db.nebula_connector import NebulaBusyError, run_in_nebula_session
 from app.api.v1.schemas import kg_visualization_schemas as schemas
 from app.core.config import settings # For default space name
 from nebula3.data.DataObject import ValueWrapper, Node, Relationship, PathWrapper
@@ -138,65 +138,69 @@ async def get_graph_neighbors(
     
     print(f"Executing KG Neighbor Query: {match_query}")
 
-    try:
-        with get_nebula_session(space_name=space_name) as session:
-            # Using execute_json_query to get structured data if possible,
-            # or fallback to execute and parse ResultSet if more control is needed.
-            # The structure of execute_json_query for paths needs to be handled carefully.
-            # It returns a list of paths, where each path contains nodes and relationships.
-            # Example result for a path: {"meta": [...], "row": [{"nodes": [...], "relationships": [...]}]}
-            # Let's use execute() and manual parsing for more robust handling of PathWrapper
-            
-            result_set = session.execute(match_query)
-            if not result_set.is_succeeded():
-                print(f"Error executing neighbor query: {result_set.error_msg()}")
-                return schemas.KGGraphData(nodes=[], edges=[])
+    def collect_paths(session):
+        # Runs on the Nebula query thread pool: executes the MATCH and parses the paths.
+        # Using execute_json_query to get structured data if possible,
+        # or fallback to execute and parse ResultSet if more control is needed.
+        # The structure of execute_json_query for paths needs to be handled carefully.
+        # It returns a list of paths, where each path contains nodes and relationships.
+        # Example result for a path: {"meta": [...], "row": [{"nodes": [...], "relationships": [...]}]}
+        # Let's use execute() and manual parsing for more robust handling of PathWrapper
+        
+        result_set = session.execute(match_query)
+        if not result_set.is_succeeded():
+            print(f"Error executing neighbor query: {result_set.error_msg()}")
+            return
 
-            for i in range(result_set.row_size()):
-                row_value = result_set.row_values(i)
-                if not row_value: continue
+        for i in range(result_set.row_size()):
+            row_value = result_set.row_values(i)
+            if not row_value: continue
+            
+            path_wrapper = row_value[0] # Path is typically the first (and only) yielded item
+            
+            if isinstance(path_wrapper, ValueWrapper) and path_wrapper.is_path():
+                path = path_wrapper.as_path()
                 
-                path_wrapper = row_value[0] # Path is typically the first (and only) yielded item
+                # Process nodes in the path
+                for node_obj in path.nodes():
+                    parsed_node = parse_nebula_node(node_obj)
+                    if parsed_node.id not in nodes_map:
+                        nodes_map[parsed_node.id] = parsed_node
                 
-                if isinstance(path_wrapper, ValueWrapper) and path_wrapper.is_path():
-                    path = path_wrapper.as_path()
+                # Process relationships in the path
+                for edge_obj in path.relationships():
+                    # Ensure edge directionality or uniqueness is handled.
+                    # The parse_nebula_edge creates an ID based on src,type,rank,dst
+                    parsed_edge = parse_nebula_edge(edge_obj, edge_id_counter)
                     
-                    # Process nodes in the path
-                    for node_obj in path.nodes():
-                        parsed_node = parse_nebula_node(node_obj)
-                        if parsed_node.id not in nodes_map:
-                            nodes_map[parsed_node.id] = parsed_node
+                    # Check if this specific edge (by its unique Nebula properties) is already added
+                    # This avoids duplicate edges if paths overlap.
+                    # We need a way to uniquely identify an edge from edge_obj before parsing if final_edges stores parsed_edge
+                    # A set of edge_keys (src_type_rank_dst) can track added edges.
+                    edge_key = f"{parsed_edge.source}_{parsed_edge.label}_{edge_obj.ranking()}_{parsed_edge.target}"
                     
-                    # Process relationships in the path
-                    for edge_obj in path.relationships():
-                        # Ensure edge directionality or uniqueness is handled.
-                        # The parse_nebula_edge creates an ID based on src,type,rank,dst
-                        parsed_edge = parse_nebula_edge(edge_obj, edge_id_counter)
-                        
-                        # Check if this specific edge (by its unique Nebula properties) is already added
-                        # This avoids duplicate edges if paths overlap.
-                        # We need a way to uniquely identify an edge from edge_obj before parsing if final_edges stores parsed_edge
-                        # A set of edge_keys (src_type_rank_dst) can track added edges.
-                        edge_key = f"{parsed_edge.source}_{parsed_edge.label}_{edge_obj.ranking()}_{parsed_edge.target}"
-                        
-                        is_new_edge = True
-                        for fe in final_edges:
-                            if fe.id == parsed_edge.id : # parsed_edge.id is already unique key
-                                is_new_edge = False
-                                break
-                        if is_new_edge:
-                            final_edges.append(parsed_edge)
+                    is_new_edge = True
+                    for fe in final_edges:
+                        if fe.id == parsed_edge.id : # parsed_edge.id is already unique key
+                            is_new_edge = False
+                            break
+                    if is_new_edge:
+                        final_edges.append(parsed_edge)
 
-                            # Ensure source and target nodes of this edge are in nodes_map (should be, as they are from path)
-                            if parsed_edge.source not in nodes_map and path.start_node().get_id().as_string() != parsed_edge.source:
-                                # This might happen for edges where one node is outside the immediate path segments but connected.
-                                # For simplicity, current parsing relies on path.nodes().
-                                print(f"Warning: Source node {parsed_edge.source} of edge {parsed_edge.id} not found in path nodes.")
-                            if parsed_edge.target not in nodes_map:
-                                print(f"Warning: Target node {parsed_edge.target} of edge {parsed_edge.id} not found in path nodes.")
-                else:
-                    print(f"Warning: Expected PathWrapper, got {type(path_wrapper)} for row item.")
-    
+                        # Ensure source and target nodes of this edge are in nodes_map (should be, as they are from path)
+                        if parsed_edge.source not in nodes_map and path.start_node().get_id().as_string() != parsed_edge.source:
+                            # This might happen for edges where one node is outside the immediate path segments but connected.
+                            # For simplicity, current parsing relies on path.nodes().
+                            print(f"Warning: Source node {parsed_edge.source} of edge {parsed_edge.id} not found in path nodes.")
+                        if parsed_edge.target not in nodes_map:
+                            print(f"Warning: Target node {parsed_edge.target} of edge {parsed_edge.id} not found in path nodes.")
+            else:
+                print(f"Warning: Expected PathWrapper, got {type(path_wrapper)} for row item.")
+
+    try:
+        await run_in_nebula_session(collect_paths, space_name=space_name)
+    except NebulaBusyError:
+        raise # Surfaced as 503 by the endpoint
     except Exception as e:
         print(f"Exception in get_graph_neighbors: {e}")
         # Optionally re-raise or return empty graph on critical error
@@ -262,27 +266,31 @@ async def search_kg_nodes(
 
     print(f"Executing KG Node Search Query: {search_gql}")
     
-    try:
-        with get_nebula_session(space_name=space_name) as session:
-            result_set = session.execute(search_gql)
+    def collect_matches(session):
+        # Runs on the Nebula query thread pool: executes the search and parses the vertices.
+        result_set = session.execute(search_gql)
 
-            if not result_set.is_succeeded():
-                print(f"Error executing search query: {result_set.error_msg()}")
-                return schemas.KGGraphData(nodes=[], edges=[])
+        if not result_set.is_succeeded():
+            print(f"Error executing search query: {result_set.error_msg()}")
+            return
 
-            for i in range(result_set.row_size()):
-                row_value = result_set.row_values(i)
-                if not row_value: continue
-                
-                vertex_wrapper = row_value[0] # Expecting a vertex in the result
-                if isinstance(vertex_wrapper, ValueWrapper) and vertex_wrapper.is_vertex():
-                    node_obj = vertex_wrapper.as_node()
-                    parsed_node = parse_nebula_node(node_obj)
-                    if parsed_node.id not in nodes_map:
-                        nodes_map[parsed_node.id] = parsed_node
-                else:
-                    print(f"Warning: Expected Vertex in search result, got {type(vertex_wrapper)}")
-    
+        for i in range(result_set.row_size()):
+            row_value = result_set.row_values(i)
+            if not row_value: continue
+            
+            vertex_wrapper = row_value[0] # Expecting a vertex in the result
+            if isinstance(vertex_wrapper, ValueWrapper) and vertex_wrapper.is_vertex():
+                node_obj = vertex_wrapper.as_node()
+                parsed_node = parse_nebula_node(node_obj)
+                if parsed_node.id not in nodes_map:
+                    nodes_map[parsed_node.id] = parsed_node
+            else:
+                print(f"Warning: Expected Vertex in search result, got {type(vertex_wrapper)}")
+
+    try:
+        await run_in_nebula_session(collect_matches, space_name=space_name)
+    except NebulaBusyError:
+        raise # Surfaced as 503 by the endpoint
     except Exception as e:
         print(f"Exception in search_kg_nodes: {e}")
         return schemas.KGGraphData(nodes=[], edges=[])
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+知识图谱智能问答系统 - 知识图谱构建流程 worker 启动脚本
+
+在 service_config.yaml 中设置 kg_pipeline.execution_mode: "queue" 后，API 只把运行写入
+kg_pipeline_runs 表，由本脚本启动的 worker 进程领取并执行。可在任意多台机器上启动任意多个 worker。
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from app.core.config import settings  # 导入配置，这会加载service_config.yaml
+
+
+async def run_worker(worker_id, concurrency, with_scheduler=False):
+    """
+    启动 worker：收到 SIGINT/SIGTERM 后不再领取新的运行，等待当前运行结束后退出
+    """
+    from app.db import base
+    from app.db.session import engine
+    from app.db.nebula_connector import init_nebula_connection_pool, close_nebula_connection_pool
+    from app.services.kg_pipeline_worker_service import run_pipeline_worker
+    from app.services.kg_pipeline_scheduler_service import KGPipelineScheduler
+
+    base.Base.metadata.create_all(bind=engine)
+    init_nebula_connection_pool()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    scheduler = KGPipelineScheduler() if with_scheduler else None
+    scheduler_task = asyncio.create_task(scheduler.run()) if scheduler else None
+    try:
+        await run_pipeline_worker(worker_id=worker_id, concurrency=concurrency, stop_event=stop_event)
+    finally:
+        if scheduler:
+            scheduler.stop()
+            await scheduler_task
+        await close_nebula_connection_pool()
+
+
+if __name__ == "__main__":
+    # 在启动前确保工作目录设置为backend/
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(backend_dir)
+
+    parser = argparse.ArgumentParser(description="知识图谱构建流程 worker")
+    parser.add_argument("--worker-id", default=None, help="worker 标识，默认为 主机名-进程号-随机后缀")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help=f"同时执行的运行数，默认 {settings.KG_PIPELINE_WORKER_CONCURRENCY}")
+    parser.add_argument("--scheduler", action="store_true",
+                        help="同时运行定时调度器（API 进程关闭了 kg_pipeline.scheduler.enabled 时使用）")
+    args = parser.parse_args()
+
+    try:
+        print("==============================================")
+        print("知识图谱智能问答系统 - 知识图谱构建 worker")
+        print("==============================================")
+        if settings.KG_PIPELINE_EXECUTION_MODE != "queue":
+            # background 模式下 API 会自行执行新运行，worker 再领取会重复执行
+            print("kg_pipeline.execution_mode 不是 \"queue\"，worker 未启动。")
+            sys.exit(1)
+        asyncio.run(run_worker(args.worker_id, args.concurrency, with_scheduler=args.scheduler))
+    except KeyboardInterrupt:
+        print("\nworker已停止")
+        sys.exit(0)
+    except Exception as e:
+        print(f"启动worker时出错: {e}")
+        sys.exit(1)